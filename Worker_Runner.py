@@ -9,25 +9,35 @@ import radio_service as radio
 
 
 class Visualizer_Process:
+    # Seconds to wait for a clean shutdown before terminating the process
+    STOP_TIMEOUT = 5
+
     def __init__(self):
         self.process = None
         self.running = False
+        # Ask the render loop to shut down cleanly or to restart
+        self.stop_event = multiprocessing.Event()
+        self.restart_event = multiprocessing.Event()
 
-    def visualizer_function(self, config, joystick_data):
+    def visualizer_function(self, config, joystick_data, stop_event, restart_event):
         # This function will be run in the new process
         # Here, you'll need to call the main function or equivalent of visualizer.py
         # For this example, I'm assuming visualizer.py has a function called run_visualizer_script
-        visualizer.main(config, joystick_data)
+        visualizer.main(config, joystick_data, stop_event, restart_event)
 
     def run_visualizer(self, config, joystick_data):
         if not self.running:
             try:
                 # Start the visualizer script as a new process
+                self.stop_event.clear()
+                self.restart_event.clear()
                 self.process = multiprocessing.Process(
                     target=self.visualizer_function,
                     args=(
                         config,
                         joystick_data,
+                        self.stop_event,
+                        self.restart_event,
                     ),
                 )
                 self.process.start()
@@ -38,14 +48,27 @@ class Visualizer_Process:
     def stop_visualizer(self):
         if self.running and self.process:
             try:
-                # Terminate the process
-                self.process.terminate()
-                self.process.join()  # Wait for the process to finish
+                # Let the render loop release its GPU resources and exit, and
+                # only terminate the process if it does not
+                self.stop_event.set()
+                self.process.join(self.STOP_TIMEOUT)
+                if self.process.is_alive():
+                    print("Visualizer did not stop, terminating it")
+                    self.process.terminate()
+                    self.process.join()  # Wait for the process to finish
                 self.process = None
                 self.running = False
             except Exception as e:
                 print(f"Error stopping visualizer: {e}")
 
+    def restart_visualizer(self):
+        """
+        Restart the render loop with the current config file, keeping the
+        window and the loaded textures.
+        """
+        if self.running and self.process:
+            self.restart_event.set()
+
     def retrieve_data(self):
         while not self.queue.empty():
             print(self.queue.get())
@@ -89,16 +112,32 @@ class Joystick_Process:
         )
 
         self.lock = manager.Lock()
+        # Set by the joystick process whenever it publishes changed data
+        self.updated = manager.Event()
 
     def get_data(self):
+        """
+        A plain dict copy of the joystick data, taken under the lock so it
+        never sees the process between clearing and refilling the data.
+        """
         with self.lock:
-            return self.data
-
-    def joystick_function(self, config, data, lock):
+            return self.data.copy()
+
+    def wait_for_update(self, timeout=None):
+        """
+        Block until the joystick process publishes new data or timeout
+        seconds pass. Returns True if there is new data.
+        """
+        if self.updated.wait(timeout):
+            self.updated.clear()
+            return True
+        return False
+
+    def joystick_function(self, config, data, lock, updated):
         # This function will be run in the new process
         # Here, you'll need to call the main function or equivalent of visualizer.py
         # For this example, I'm assuming visualizer.py has a function called run_visualizer_script
-        joystick.main(config, data, lock)
+        joystick.main(config, data, lock, updated)
 
     def run_joystick(self, config):
         print("Starting joystick process")
@@ -111,6 +150,7 @@ class Joystick_Process:
                         config,
                         self.data,
                         self.lock,
+                        self.updated,
                     ),
                 )
                 self.process.start()
@@ -0,0 +1,323 @@
+import hashlib
+import json
+import os
+from collections import namedtuple
+import numpy as np
+from PIL import Image
+from OpenGL.GL import *
+from gpu_resources import resources, TEXTURE
+
+DEBUG = "Visualizer: "
+
+# Decoded images are stored here as raw RGBA .npy files, which np.load can
+# memory-map instead of decoding the PNG again
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+
+# Bump when the cached format changes, old files are then simply not found
+CACHE_VERSION = 1
+
+# Part of the HUD atlas holding one image, as texture coordinates
+AtlasRegion = namedtuple("AtlasRegion", ["texture", "u0", "v0", "u1", "v1"])
+
+
+def region_tex_coords(region):
+    """
+    Corners of an atlas region counter-clockwise from bottom-left, the order
+    Batch2D.quad expects.
+    """
+    return (
+        (region.u0, region.v0),
+        (region.u1, region.v0),
+        (region.u1, region.v1),
+        (region.u0, region.v1),
+    )
+
+
+def _file_hash(*paths):
+    digest = hashlib.sha1(str(CACHE_VERSION).encode())
+    for path in paths:
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+def _cache_path(name, key, extension=".npy"):
+    return os.path.join(CACHE_DIR, f"{name}-{key}{extension}")
+
+
+def _save(path, array):
+    """
+    Write a cache file atomically, so an interrupted start never leaves a
+    truncated file behind. Failing to write only costs the cache.
+    """
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        temporary = path + ".tmp"
+        with open(temporary, "wb") as f:
+            np.save(f, array)
+        os.replace(temporary, path)
+    except OSError as e:
+        print(DEBUG + f"Could not write asset cache {path}: {e}")
+
+
+def load_pixels(filename):
+    """
+    Return the image as a (height, width, 4) uint8 RGBA array with the
+    bottom row first, as OpenGL expects. The PNG is decoded once, later calls
+    memory-map the cached copy.
+    """
+    name = os.path.splitext(os.path.basename(filename))[0]
+    path = _cache_path(name, _file_hash(filename))
+    if os.path.exists(path):
+        return np.load(path, mmap_mode="r")
+
+    image = Image.open(filename).convert("RGBA")
+    image = image.transpose(Image.FLIP_TOP_BOTTOM)
+    pixels = np.asarray(image, dtype=np.uint8)
+    _save(path, pixels)
+    return pixels
+
+
+def pack_atlas(filenames, padding=2, max_width=2048):
+    """
+    Pack the images into one RGBA array with a simple shelf packer, tallest
+    images first. Returns the pixels and a dict of name -> (x, y, width,
+    height) in pixels. The result is cached under the hash of all inputs.
+    """
+    key = _file_hash(*filenames)
+    pixels_path = _cache_path("atlas", key)
+    rects_path = _cache_path("atlas", key, ".json")
+    if os.path.exists(pixels_path) and os.path.exists(rects_path):
+        with open(rects_path) as f:
+            rects = json.load(f)
+        return np.load(pixels_path, mmap_mode="r"), rects
+
+    images = {
+        os.path.splitext(os.path.basename(filename))[0]: load_pixels(filename)
+        for filename in filenames
+    }
+    order = sorted(images, key=lambda name: images[name].shape[0], reverse=True)
+
+    rects = {}
+    x = y = shelf_height = width = 0
+    for name in order:
+        image_height, image_width = images[name].shape[:2]
+        cell_width = image_width + 2 * padding
+        cell_height = image_height + 2 * padding
+        if x and x + cell_width > max_width:
+            x = 0
+            y += shelf_height
+            shelf_height = 0
+        rects[name] = (x + padding, y + padding, image_width, image_height)
+        x += cell_width
+        width = max(width, x)
+        shelf_height = max(shelf_height, cell_height)
+    height = y + shelf_height
+
+    pixels = np.zeros((height, width, 4), dtype=np.uint8)
+    for name, (left, bottom, image_width, image_height) in rects.items():
+        # Repeat the edge pixels into the padding, like GL_CLAMP_TO_EDGE
+        pixels[
+            bottom - padding : bottom + image_height + padding,
+            left - padding : left + image_width + padding,
+        ] = np.pad(
+            images[name], ((padding, padding), (padding, padding), (0, 0)), "edge"
+        )
+
+    _save(pixels_path, pixels)
+    try:
+        with open(rects_path, "w") as f:
+            json.dump(rects, f)
+    except OSError as e:
+        print(DEBUG + f"Could not write asset cache {rects_path}: {e}")
+    return pixels, rects
+
+
+def upload_texture(pixels, mipmaps=True, name="", key=None):
+    """
+    Upload an RGBA array straight from its (possibly memory-mapped) buffer
+    and return the texture id. The texture is registered with the GPU
+    resource manager, see GpuResources.add for key.
+    """
+    height, width = pixels.shape[:2]
+    tex_id = glGenTextures(1)
+    glBindTexture(GL_TEXTURE_2D, tex_id)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_CLAMP_TO_EDGE)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_CLAMP_TO_EDGE)
+    glTexImage2D(
+        GL_TEXTURE_2D,
+        0,
+        GL_RGBA,
+        width,
+        height,
+        0,
+        GL_RGBA,
+        GL_UNSIGNED_BYTE,
+        np.ascontiguousarray(pixels),
+    )
+
+    # Mipmaps keep the downscaled Interior smooth; glGenerateMipmap is core
+    # from OpenGL 3.0
+    size = width * height * 4
+    if mipmaps and bool(glGenerateMipmap):
+        glGenerateMipmap(GL_TEXTURE_2D)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR_MIPMAP_LINEAR)
+        # The mip chain adds a third
+        size = size * 4 // 3
+    else:
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
+    glBindTexture(GL_TEXTURE_2D, 0)
+    return resources.add(TEXTURE, tex_id, size, name, key)
+
+
+def load_atlas(filenames):
+    """
+    Load the images into one texture and return a dict of name ->
+    AtlasRegion, named after the files without extension. The texture is
+    shared and cached by the resource manager, release it with
+    release_atlas.
+    """
+    pixels, rects = pack_atlas(filenames)
+    key = ("atlas",) + tuple(filenames)
+    texture = resources.acquire(
+        key, lambda: upload_texture(pixels, name="HUD atlas", key=key)
+    )
+    height, width = pixels.shape[:2]
+    return {
+        name: AtlasRegion(
+            texture,
+            left / width,
+            bottom / height,
+            (left + image_width) / width,
+            (bottom + image_height) / height,
+        )
+        for name, (left, bottom, image_width, image_height) in rects.items()
+    }
+
+
+def release_atlas(regions):
+    """
+    Drop the reference taken by load_atlas.
+    """
+    textures = {region.texture for region in regions.values()}
+    for texture in textures:
+        resources.release(TEXTURE, texture)
+
+
+def _read_materials(filename):
+    """
+    Diffuse colours of the materials in an MTL file, name -> (r, g, b).
+    """
+    colors = {}
+    name = None
+    with open(filename) as f:
+        for line in f:
+            parts = line.split()
+            if not parts:
+                continue
+            if parts[0] == "newmtl":
+                name = parts[1]
+            elif parts[0] == "Kd" and name is not None:
+                colors[name] = tuple(float(value) for value in parts[1:4])
+    return colors
+
+
+def _material_files(filename):
+    # The MTL files an OBJ file refers to, the missing ones left out
+    folder = os.path.dirname(filename)
+    with open(filename) as f:
+        paths = [
+            os.path.join(folder, line.split(None, 1)[1].strip())
+            for line in f
+            if line.startswith("mtllib ")
+        ]
+    return [path for path in paths if os.path.exists(path)]
+
+
+def parse_obj(filename):
+    """
+    Parse a Wavefront OBJ file with its MTL materials into an indexed
+    triangle mesh. Returns (vertices, indices): an (n, 9) float32 array of
+    position, normal and diffuse colour per vertex, and a uint32 array of
+    triangle indices. Polygons are split into fans; faces without normals
+    get their flat face normal.
+    """
+    colors = {}
+    for material_file in _material_files(filename):
+        colors.update(_read_materials(material_file))
+
+    positions = []
+    normals = []
+    vertices = []
+    indices = []
+    lookup = {}
+    color = (0.8, 0.8, 0.8)
+    with open(filename) as f:
+        for line in f:
+            parts = line.split()
+            if not parts:
+                continue
+            if parts[0] == "v":
+                positions.append(tuple(float(value) for value in parts[1:4]))
+            elif parts[0] == "vn":
+                normals.append(tuple(float(value) for value in parts[1:4]))
+            elif parts[0] == "usemtl":
+                color = colors.get(parts[1], (0.8, 0.8, 0.8))
+            elif parts[0] == "f":
+                # v, v/vt, v//vn or v/vt/vn, with negative indices relative
+                # to the end
+                corners = []
+                for corner in parts[1:]:
+                    fields = corner.split("/")
+                    position = int(fields[0])
+                    position += len(positions) if position < 0 else -1
+                    normal = None
+                    if len(fields) > 2 and fields[2]:
+                        normal = int(fields[2])
+                        normal += len(normals) if normal < 0 else -1
+                    corners.append((position, normal))
+
+                if any(normal is None for _, normal in corners):
+                    a, b, c = (np.array(positions[p]) for p, _ in corners[:3])
+                    face_normal = np.cross(b - a, c - a)
+                    length = np.linalg.norm(face_normal)
+                    face_normal = tuple(face_normal / length if length else face_normal)
+
+                face = []
+                for position, normal in corners:
+                    normal = normals[normal] if normal is not None else face_normal
+                    key = (position, normal, color)
+                    index = lookup.get(key)
+                    if index is None:
+                        index = lookup[key] = len(vertices)
+                        vertices.append(positions[position] + normal + color)
+                    face.append(index)
+                for i in range(1, len(face) - 1):
+                    indices.extend((face[0], face[i], face[i + 1]))
+
+    return (
+        np.array(vertices, dtype=np.float32).reshape(-1, 9),
+        np.array(indices, dtype=np.uint32),
+    )
+
+
+def load_mesh(filename):
+    """
+    Return the mesh of an OBJ file as parse_obj does. The file is parsed
+    once, later calls memory-map the cached arrays.
+    """
+    name = os.path.splitext(os.path.basename(filename))[0]
+    key = _file_hash(filename, *_material_files(filename))
+    vertices_path = _cache_path(name + "-vertices", key)
+    indices_path = _cache_path(name + "-indices", key)
+    if os.path.exists(vertices_path) and os.path.exists(indices_path):
+        return (
+            np.load(vertices_path, mmap_mode="r"),
+            np.load(indices_path, mmap_mode="r"),
+        )
+
+    vertices, indices = parse_obj(filename)
+    _save(vertices_path, vertices)
+    _save(indices_path, indices)
+    return vertices, indices
@@ -0,0 +1,146 @@
+import numpy as np
+from OpenGL.GL import *
+
+# Two triangles per quad, corners given counter-clockwise from bottom-left
+QUAD_INDICES = np.array([0, 1, 2, 0, 2, 3])
+
+
+class Batch2D:
+    """
+    Accumulates 2D lines, rectangles and textured quads into NumPy vertex
+    arrays and draws them with as few glDrawArrays calls as possible.
+
+    Vertices are kept in submission order. Consecutive primitives that share
+    a mode and texture are merged into one run, flush() binds the arrays once
+    and issues one glDrawArrays per run.
+    """
+
+    def __init__(self, capacity=4096):
+        self.positions = np.empty((capacity, 2), dtype=np.float32)
+        self.tex_coords = np.zeros((capacity, 2), dtype=np.float32)
+        self.colors = np.empty((capacity, 4), dtype=np.float32)
+        self.count = 0
+        self.runs = []
+        self.current_color = (1.0, 1.0, 1.0, 1.0)
+        self.line_width = 1.0
+
+    def color(self, r, g, b, a=1.0):
+        """
+        Set the colour used by following primitives, like glColor4f.
+        """
+        self.current_color = (r, g, b, a)
+
+    def _reserve(self, mode, texture, count):
+        needed = self.count + count
+        if needed > len(self.positions):
+            capacity = len(self.positions)
+            while capacity < needed:
+                capacity *= 2
+            self.positions = np.resize(self.positions, (capacity, 2))
+            self.tex_coords = np.resize(self.tex_coords, (capacity, 2))
+            self.colors = np.resize(self.colors, (capacity, 4))
+
+        start = self.count
+        if self.runs and self.runs[-1][0] == mode and self.runs[-1][1] == texture:
+            self.runs[-1][3] += count
+        else:
+            self.runs.append([mode, texture, start, count])
+        self.count = needed
+        return start, needed
+
+    def line(self, x0, y0, x1, y1):
+        start, end = self._reserve(GL_LINES, 0, 2)
+        self.positions[start:end] = ((x0, y0), (x1, y1))
+        self.colors[start:end] = self.current_color
+
+    def rect(self, x0, y0, x1, y1):
+        start, end = self._reserve(GL_TRIANGLES, 0, 6)
+        corners = np.array(((x0, y0), (x1, y0), (x1, y1), (x0, y1)), np.float32)
+        self.positions[start:end] = corners[QUAD_INDICES]
+        self.colors[start:end] = self.current_color
+
+    def polygon(self, vertices):
+        """
+        Add a convex polygon given as an (N, 2) array of its outline.
+        """
+        vertices = np.asarray(vertices, dtype=np.float32)
+        fan = np.empty((len(vertices) - 2, 3), dtype=np.intp)
+        fan[:, 0] = 0
+        fan[:, 1] = np.arange(1, len(vertices) - 1)
+        fan[:, 2] = fan[:, 1] + 1
+
+        start, end = self._reserve(GL_TRIANGLES, 0, fan.size)
+        self.positions[start:end] = vertices[fan.ravel()]
+        self.colors[start:end] = self.current_color
+
+    def quad(self, corners, tex_coords, texture):
+        """
+        Add one textured quad. corners and tex_coords are 4x2, ordered
+        counter-clockwise from the bottom-left corner.
+        """
+        corners = np.asarray(corners, dtype=np.float32)
+        tex_coords = np.asarray(tex_coords, dtype=np.float32)
+        start, end = self._reserve(GL_TRIANGLES, texture, 6)
+        self.positions[start:end] = corners[QUAD_INDICES]
+        self.tex_coords[start:end] = tex_coords[QUAD_INDICES]
+        self.colors[start:end] = self.current_color
+
+    def triangles(self, positions, tex_coords, color, texture):
+        """
+        Add pre-built textured triangles, used by the text engine for whole
+        strings. color is an RGBA tuple applied to every vertex.
+        """
+        start, end = self._reserve(GL_TRIANGLES, texture, len(positions))
+        self.positions[start:end] = positions
+        self.tex_coords[start:end] = tex_coords
+        self.colors[start:end] = color
+
+    def flush(self, premultiplied=False):
+        """
+        Draw everything submitted since the last flush and reset the batch.
+        Set premultiplied when the textures hold premultiplied alpha, like
+        the HUD layers.
+        """
+        if not self.runs:
+            return
+
+        glEnable(GL_BLEND)
+        if premultiplied:
+            glBlendFunc(GL_ONE, GL_ONE_MINUS_SRC_ALPHA)
+        else:
+            # Keep destination alpha meaningful when drawing into HUD layers
+            glBlendFuncSeparate(
+                GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA, GL_ONE, GL_ONE_MINUS_SRC_ALPHA
+            )
+        glLineWidth(self.line_width)
+
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glEnableClientState(GL_TEXTURE_COORD_ARRAY)
+        glEnableClientState(GL_COLOR_ARRAY)
+        glVertexPointer(2, GL_FLOAT, 0, self.positions)
+        glTexCoordPointer(2, GL_FLOAT, 0, self.tex_coords)
+        glColorPointer(4, GL_FLOAT, 0, self.colors)
+
+        bound = None
+        for mode, texture, start, count in self.runs:
+            if texture != bound:
+                if texture:
+                    glEnable(GL_TEXTURE_2D)
+                else:
+                    glDisable(GL_TEXTURE_2D)
+                glBindTexture(GL_TEXTURE_2D, texture)
+                bound = texture
+            glDrawArrays(mode, start, count)
+
+        glDisableClientState(GL_COLOR_ARRAY)
+        glDisableClientState(GL_TEXTURE_COORD_ARRAY)
+        glDisableClientState(GL_VERTEX_ARRAY)
+        glBindTexture(GL_TEXTURE_2D, 0)
+        glEnable(GL_TEXTURE_2D)
+
+        self.count = 0
+        self.runs.clear()
+
+
+# Shared batch for the whole HUD
+batch = Batch2D()
@@ -0,0 +1,189 @@
+"""
+Headless visualizer benchmark.
+
+Renders the HUD into an offscreen GL context with synthetic pitch, roll and
+yaw sweeps for a fixed number of frames at every supported resolution, and
+writes per-frame and per-stage timings as JSON:
+
+    python benchmark.py --frames 300 --output benchmark.json
+
+With --baseline the results are compared against an earlier run, and the
+exit code is 1 when the median frame time of any resolution regressed by
+more than --tolerance.
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import sys
+import time
+
+# Render without a display: SDL's offscreen driver, with EGL providing the
+# GL context (Mesa's software rasterizer when there is no GPU)
+os.environ.setdefault("SDL_VIDEODRIVER", "offscreen")
+if sys.platform.startswith("linux"):
+    os.environ.setdefault("PYOPENGL_PLATFORM", "egl")
+
+import pygame
+from OpenGL.GL import glGetString, GL_RENDERER, GL_VERSION
+from launcher import Config
+from frame_profiler import profiler
+import visualizer
+
+DEBUG = "Benchmark: "
+
+# Resolutions offered in the launcher
+RESOLUTIONS = ((1280, 800), (1920, 1200), (2560, 1600))
+
+
+class SyntheticSweep:
+    """
+    Drives the HUD with smooth attitude sweeps for a fixed number of frames.
+    Roll and pitch follow sines of different periods, yaw turns full
+    circles, so every value-bound HUD node is redrawn every frame.
+    """
+
+    def __init__(self, frames, warmup=10):
+        self.frames = frames
+        self.warmup = warmup
+        self.frame = 0
+        self.gl_info = {}
+
+    @property
+    def done(self):
+        return self.frame >= self.warmup + self.frames
+
+    def attitude(self):
+        t = self.frame / 60.0
+        roll = 60 * math.sin(2 * math.pi * t / 4.0)
+        pitch = 30 * math.sin(2 * math.pi * t / 7.0)
+        yaw = (t * 45.0) % 360 - 180
+        return (roll, pitch, yaw)
+
+    def frame_done(self):
+        self.frame += 1
+        if self.frame == 1:
+            self.gl_info = {
+                "renderer": glGetString(GL_RENDERER).decode(),
+                "version": glGetString(GL_VERSION).decode(),
+            }
+        # The first frames build the HUD layers and glyph atlases
+        if self.frame == self.warmup:
+            profiler.reset()
+
+
+def run(resolution, frames, warmup):
+    """
+    Benchmark one resolution and return its results.
+    """
+    config = Config()
+    config.resolution = resolution
+    config.fullscreen = False
+    config.idle_mode = False
+    # Fixed quality so runs are comparable
+    config.adaptive_quality = False
+    config.profile = True
+    config.profile_output = ""
+
+    sweep = SyntheticSweep(frames, warmup)
+    profiler.reset()
+    start = time.perf_counter()
+    visualizer.main(config, benchmark=sweep)
+    elapsed = time.perf_counter() - start
+
+    stages = profiler.summary()
+    frame_times = [
+        round(stages_ms.get("frame", 0.0), 4) for _, stages_ms in profiler.frames
+    ]
+    return {
+        "resolution": f"{resolution[0]}x{resolution[1]}",
+        "frames": len(frame_times),
+        "wall_seconds": elapsed,
+        "fps": 1000 / stages["frame"]["mean"],
+        "frame": stages.pop("frame"),
+        "stages": stages,
+        "frame_times_ms": frame_times,
+        "gl": sweep.gl_info,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """
+    Print the median frame time change per resolution. Returns False when
+    any resolution regressed by more than tolerance.
+    """
+    previous = {run["resolution"]: run for run in baseline["runs"]}
+    ok = True
+    for run in results["runs"]:
+        old = previous.get(run["resolution"])
+        if old is None:
+            continue
+        change = run["frame"]["p50"] / old["frame"]["p50"] - 1
+        regressed = change > tolerance
+        ok = ok and not regressed
+        print(
+            DEBUG
+            + f"{run['resolution']}: p50 {old['frame']['p50']:.2f} -> "
+            + f"{run['frame']['p50']:.2f} ms ({change:+.1%})"
+            + (" REGRESSION" if regressed else "")
+        )
+    return ok
+
+
+def parse_resolution(text):
+    width, height = text.lower().split("x")
+    return (int(width), int(height))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument(
+        "--resolution",
+        action="append",
+        type=parse_resolution,
+        help="WIDTHxHEIGHT, can be repeated (default: all supported)",
+    )
+    parser.add_argument("--output", default="benchmark.json")
+    parser.add_argument("--baseline", help="earlier results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    args = parser.parse_args(argv)
+
+    # The visualizer loads its assets relative to the repository
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    results = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "pygame": pygame.version.ver,
+        "platform": platform.platform(),
+        "runs": [],
+    }
+    for resolution in args.resolution or RESOLUTIONS:
+        print(DEBUG + f"{resolution[0]}x{resolution[1]}, {args.frames} frames")
+        run_results = run(resolution, args.frames, args.warmup)
+        frame = run_results["frame"]
+        print(
+            DEBUG
+            + f"mean {frame['mean']:.2f} ms, p50 {frame['p50']:.2f} ms, "
+            + f"p99 {frame['p99']:.2f} ms, {run_results['fps']:.1f} FPS"
+        )
+        results["runs"].append(run_results)
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(DEBUG + f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if not compare(results, baseline, args.tolerance):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
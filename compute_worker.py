@@ -0,0 +1,199 @@
+import threading
+import time
+import traceback
+from collections import namedtuple
+
+DEBUG = "Visualizer: "
+
+# Smoothing of the timing counters, like the frame governor's frame time
+SMOOTHING = 0.1
+
+# Seconds the worker waits for new input before calling its idle function
+IDLE_INTERVAL = 0.1
+
+# What the render loop needs from one round of input processing. Built by
+# the worker and never changed after it is published, so the render loop
+# can read it without locks.
+#   sequence       counts the published states, 0 before any input
+#   data           the input the state was computed from
+#   samples        SampleBuffer copy to interpolate the attitude from
+#   chart_samples  (index, timestamp, values) strip chart samples the render
+#                  loop has not acknowledged yet
+#   position       (latitude, longitude) of the map
+#   path           PathSnapshot of the flight path
+#   path_chunks    number of path chunks closed by the PathChunker
+#   path_status    distance flown, lap and geofence figures of the path
+#   compute_ms     time spent computing this state
+FrameState = namedtuple(
+    "FrameState",
+    [
+        "sequence",
+        "data",
+        "samples",
+        "chart_samples",
+        "position",
+        "path",
+        "path_chunks",
+        "path_status",
+        "compute_ms",
+    ],
+)
+
+
+class DoubleBuffer:
+    """
+    Hands immutable states from one producer to the render loop.
+
+    The producer fills the back slot and swaps it to the front; the reader
+    takes the front state. Both only exchange a reference, under a lock
+    held for no longer than that.
+    """
+
+    def __init__(self, initial):
+        self.front = initial
+        self.back = None
+        self.condition = threading.Condition()
+
+    def publish(self, state):
+        self.back = state
+        with self.condition:
+            self.front, self.back = self.back, self.front
+            self.condition.notify_all()
+
+    def read(self):
+        with self.condition:
+            return self.front
+
+    def wait(self, sequence, timeout):
+        """
+        Wait up to timeout seconds for a state newer than sequence and
+        return the front state.
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: self.front.sequence > sequence, timeout)
+            return self.front
+
+
+class ComputeWorker:
+    """
+    Processes input on a background thread and publishes the results for
+    the render loop as FrameStates.
+
+    process(data, state) is called for every new input with the previous
+    state and returns the fields of the next one, the sequence and timing
+    are filled in here. Work added there runs beside the render loop
+    instead of inside it.
+
+    compute_ms is the smoothed time per state and rate the states published
+    per second; set them against the render loop's frame time to see which
+    side is the bottleneck.
+
+    idle(data, state), when given, is called the same way when no new
+    input arrived within IDLE_INTERVAL, for work that goes on while the
+    input holds still; it returns None when there is nothing to publish.
+
+    An exception in process() is logged and counted in errors, and the
+    round is skipped: the worker keeps going with the next input.
+    """
+
+    def __init__(self, initial, read, wait, process, idle=None, name="compute"):
+        self.read = read
+        self.wait_for_input = wait
+        self.process = process
+        self.idle = idle
+        self.buffer = DoubleBuffer(initial)
+        self.stopped = threading.Event()
+        self.compute_ms = 0.0
+        self.max_compute_ms = 0.0
+        self.rate = 0.0
+        self.published = 0
+        self.last_publish = None
+        self.errors = 0
+        self.last_error = None
+        self.thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self.thread.start()
+
+    @property
+    def state(self):
+        """
+        The newest published state.
+        """
+        return self.buffer.read()
+
+    def wait(self, sequence, timeout):
+        return self.buffer.wait(sequence, timeout)
+
+    def _run(self):
+        last_data = None
+        while not self.stopped.is_set():
+            # Reading the input can fail as well, e.g. when the joystick
+            # process goes away; the worker keeps running either way
+            try:
+                self.wait_for_input(IDLE_INTERVAL)
+                data = self.read()
+            except Exception as e:
+                self._failed(e)
+                # Do not spin while the input keeps failing
+                self.stopped.wait(IDLE_INTERVAL)
+                continue
+            if data == last_data:
+                process = self.idle
+            else:
+                process = self.process
+                last_data = data
+            if process is None:
+                continue
+
+            start = time.perf_counter()
+            previous = self.buffer.read()
+            try:
+                fields = process(data, previous)
+            except Exception as e:
+                self._failed(e)
+                continue
+            if fields is None:
+                continue
+            compute_ms = (time.perf_counter() - start) * 1000
+            self.buffer.publish(
+                FrameState(
+                    sequence=previous.sequence + 1, compute_ms=compute_ms, **fields
+                )
+            )
+            self._count(compute_ms)
+
+    def _failed(self, error):
+        # The whole traceback the first time, one line for repeats
+        self.errors += 1
+        message = f"{type(error).__name__}: {error}"
+        if self.errors == 1:
+            print(DEBUG + "Input processing failed:")
+            traceback.print_exc()
+        elif message != self.last_error:
+            print(DEBUG + f"Input processing failed: {message}")
+        self.last_error = message
+
+    def _count(self, compute_ms):
+        now = time.monotonic()
+        if self.last_publish is not None and now > self.last_publish:
+            rate = 1 / (now - self.last_publish)
+            self.rate += SMOOTHING * (rate - self.rate)
+        self.last_publish = now
+        if self.published:
+            self.compute_ms += SMOOTHING * (compute_ms - self.compute_ms)
+        else:
+            self.compute_ms = compute_ms
+        self.max_compute_ms = max(self.max_compute_ms, compute_ms)
+        self.published += 1
+
+    def report(self):
+        report = (
+            f"{self.published} states, {self.compute_ms:.2f} ms each "
+            f"(max {self.max_compute_ms:.2f} ms)"
+        )
+        if self.errors:
+            report += f", {self.errors} failed, last: {self.last_error}"
+        return report
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
@@ -0,0 +1,107 @@
+import ctypes
+import numpy as np
+from OpenGL.GL import *
+from asset_cache import load_mesh
+from gpu_resources import resources, BUFFER
+
+# Bytes per vertex: position, normal and colour as float32
+STRIDE = 9 * 4
+
+# Light from the upper left, in front of the model
+LIGHT_DIRECTION = (-0.4, 1.0, 0.8, 0.0)
+
+
+def _upload_buffer(target, array, name, key):
+    buffer = glGenBuffers(1)
+    glBindBuffer(target, buffer)
+    glBufferData(target, np.ascontiguousarray(array), GL_STATIC_DRAW)
+    glBindBuffer(target, 0)
+    return resources.add(BUFFER, buffer, array.nbytes, name, key)
+
+
+class DroneModel:
+    """
+    A mesh loaded once into a vertex and an index buffer and drawn with the
+    current attitude. The buffers are cached by the resource manager under
+    the file name, so a restarted render loop draws from them again.
+
+    The model is in OpenGL axes: forward is -Z, up +Y and right +X.
+    """
+
+    def __init__(self, filename, size=2.0):
+        vertices, indices = load_mesh(filename)
+        self.count = len(indices)
+        # Scale to a fixed size, whatever units the file is in
+        extent = np.abs(vertices[:, :3]).max() if len(vertices) else 1.0
+        self.scale = size / 2 / extent
+
+        vertex_key = ("mesh", filename, "vertices")
+        index_key = ("mesh", filename, "indices")
+        self.vbo = resources.acquire(
+            vertex_key,
+            lambda: _upload_buffer(GL_ARRAY_BUFFER, vertices, "drone", vertex_key),
+        )
+        self.ibo = resources.acquire(
+            index_key,
+            lambda: _upload_buffer(
+                GL_ELEMENT_ARRAY_BUFFER, indices, "drone", index_key
+            ),
+        )
+
+    def draw(self, roll, pitch, yaw):
+        """
+        Draw the model at the attitude in degrees, in the current projection
+        and modelview. Positive roll banks right, positive pitch raises the
+        nose and positive yaw turns right.
+        """
+        glPushMatrix()
+        glRotatef(-yaw, 0, 1, 0)
+        glRotatef(pitch, 1, 0, 0)
+        glRotatef(-roll, 0, 0, 1)
+        glScalef(self.scale, self.scale, self.scale)
+
+        glEnable(GL_DEPTH_TEST)
+        glEnable(GL_LIGHTING)
+        glEnable(GL_LIGHT0)
+        glEnable(GL_NORMALIZE)
+        glEnable(GL_COLOR_MATERIAL)
+        glColorMaterial(GL_FRONT_AND_BACK, GL_AMBIENT_AND_DIFFUSE)
+        glDisable(GL_TEXTURE_2D)
+        glDisable(GL_BLEND)
+
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.ibo)
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glEnableClientState(GL_NORMAL_ARRAY)
+        glEnableClientState(GL_COLOR_ARRAY)
+        glVertexPointer(3, GL_FLOAT, STRIDE, ctypes.c_void_p(0))
+        glNormalPointer(GL_FLOAT, STRIDE, ctypes.c_void_p(12))
+        glColorPointer(3, GL_FLOAT, STRIDE, ctypes.c_void_p(24))
+        glDrawElements(GL_TRIANGLES, self.count, GL_UNSIGNED_INT, ctypes.c_void_p(0))
+        glDisableClientState(GL_COLOR_ARRAY)
+        glDisableClientState(GL_NORMAL_ARRAY)
+        glDisableClientState(GL_VERTEX_ARRAY)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+        glDisable(GL_COLOR_MATERIAL)
+        glDisable(GL_NORMALIZE)
+        glDisable(GL_LIGHT0)
+        glDisable(GL_LIGHTING)
+        glDisable(GL_DEPTH_TEST)
+        glEnable(GL_TEXTURE_2D)
+        glEnable(GL_BLEND)
+        glPopMatrix()
+
+    def release(self):
+        resources.release(BUFFER, self.vbo)
+        resources.release(BUFFER, self.ibo)
+
+
+def set_light():
+    """
+    Place the light in eye space; call with the view transform loaded.
+    """
+    glLightfv(GL_LIGHT0, GL_POSITION, LIGHT_DIRECTION)
+    glLightfv(GL_LIGHT0, GL_DIFFUSE, (0.9, 0.9, 0.9, 1.0))
+    glLightfv(GL_LIGHT0, GL_AMBIENT, (0.25, 0.25, 0.25, 1.0))
@@ -0,0 +1,315 @@
+from collections import namedtuple
+import numpy as np
+from geodesy import local_frame
+
+# How a path point was obtained
+MEASURED, DEAD_RECKONED = 0, 1
+
+GRAVITY = 9.81
+
+# Dead reckoning model: the drone flies at the speed where drag balances
+# the horizontal thrust of its tilt, v = sqrt(g tan(tilt) / DRAG), about
+# 10 m/s at 30 degrees, and climbs CLIMB_RATE m/s at full throttle
+DRAG = 0.05
+CLIMB_RATE = 5.0
+
+# Attitude samples staged before they are integrated in one batch
+STAGE_SIZE = 256
+
+# Read-only views of the path columns at one moment
+PathSnapshot = namedtuple(
+    "PathSnapshot", ["times", "positions", "distances", "sources"]
+)
+
+
+def tilt_speed(tilt):
+    """
+    Steady horizontal speed in m/s for tilt angles in degrees, signed like
+    the tilt.
+    """
+    tilt = np.radians(np.clip(tilt, -80.0, 80.0))
+    return np.sign(tilt) * np.sqrt(GRAVITY * np.abs(np.tan(tilt)) / DRAG)
+
+
+class FlightPath:
+    """
+    The flight path as columnar arrays: time, position in metres east,
+    north and up of the home point, distance flown and how each point was
+    obtained.
+
+    The arrays grow by doubling, so appending is amortised O(1), and
+    samples are processed as arrays, never as one object per sample.
+    Measured positions come from add_positions. Without them the path is
+    dead reckoned from the attitude: push() stages single live samples and
+    flush() integrates the staged block, add_attitude() takes whole arrays,
+    e.g. of a recording.
+
+    Rows are only ever appended, never rewritten, so the views returned by
+    the properties stay valid, and unchanged, on any thread while the path
+    grows.
+    """
+
+    def __init__(self, capacity=4096):
+        self.count = 0
+        self._allocate(capacity)
+        # Latitude, longitude and altitude of the first measured position,
+        # and the east-north-up frame anchored there
+        self.home = None
+        self.frame = None
+        # Velocity east, north and up after the last point
+        self.velocity = np.zeros(3)
+
+        self.stage = np.empty((STAGE_SIZE, 5))
+        self.staged = 0
+
+    def _allocate(self, capacity):
+        self._times = np.empty(capacity)
+        self._positions = np.empty((capacity, 3))
+        self._distances = np.empty(capacity)
+        self._sources = np.empty(capacity, np.uint8)
+
+    def _reserve(self, count):
+        needed = self.count + count
+        capacity = len(self._times)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        old = (self._times, self._positions, self._distances, self._sources)
+        self._allocate(capacity)
+        for new, array in zip(
+            (self._times, self._positions, self._distances, self._sources), old
+        ):
+            new[: self.count] = array[: self.count]
+
+    def __len__(self):
+        return self.count
+
+    def _view(self, array):
+        view = array[: self.count]
+        view.flags.writeable = False
+        return view
+
+    @property
+    def times(self):
+        return self._view(self._times)
+
+    @property
+    def positions(self):
+        """
+        (n, 3) metres east, north and up of home.
+        """
+        return self._view(self._positions)
+
+    @property
+    def distances(self):
+        """
+        Distance flown up to each point in metres.
+        """
+        return self._view(self._distances)
+
+    @property
+    def sources(self):
+        return self._view(self._sources)
+
+    @property
+    def latest_time(self):
+        return self._times[self.count - 1] if self.count else None
+
+    @property
+    def distance(self):
+        return self._distances[self.count - 1] if self.count else 0.0
+
+    def _append(self, times, positions, source):
+        # Samples not newer than the last point are dropped
+        if self.count:
+            keep = times > self._times[self.count - 1]
+            if not keep.all():
+                times = times[keep]
+                positions = positions[keep]
+        n = len(times)
+        if not n:
+            return 0
+        self._reserve(n)
+        start, end = self.count, self.count + n
+
+        steps = np.empty(n)
+        if start:
+            steps[0] = np.linalg.norm(positions[0] - self._positions[start - 1])
+            previous = self._distances[start - 1]
+        else:
+            steps[0] = 0.0
+            previous = 0.0
+        steps[1:] = np.linalg.norm(np.diff(positions, axis=0), axis=1)
+
+        self._times[start:end] = times
+        self._positions[start:end] = positions
+        np.cumsum(steps, out=self._distances[start:end])
+        self._distances[start:end] += previous
+        self._sources[start:end] = source
+        self.count = end
+        return n
+
+    def local(self, latitudes, longitudes, altitudes):
+        """
+        (n, 3) metres east, north and up of home, on the WGS84 ellipsoid.
+        """
+        return self.frame.to_enu(latitudes, longitudes, altitudes)
+
+    def add_positions(self, times, latitudes, longitudes, altitudes=0.0):
+        """
+        Append measured positions. The first one becomes home. Returns the
+        number of points added.
+        """
+        self.flush()
+        times = np.atleast_1d(np.asarray(times, dtype=np.float64))
+        latitudes = np.atleast_1d(latitudes)
+        longitudes = np.atleast_1d(longitudes)
+        altitudes = np.broadcast_to(np.asarray(altitudes, np.float64), times.shape)
+        if self.home is None:
+            self.home = (float(latitudes[0]), float(longitudes[0]), float(altitudes[0]))
+            self.frame = local_frame(*self.home)
+        if len(times) == 1:
+            # A single live fix takes the scalar path
+            positions = np.array(
+                [
+                    self.frame.enu_point(
+                        float(latitudes[0]), float(longitudes[0]), float(altitudes[0])
+                    )
+                ]
+            )
+        else:
+            positions = self.local(latitudes, longitudes, altitudes)
+
+        added = self._append(times, positions, MEASURED)
+        # Dead reckoning after the fixes carries on at their last velocity
+        if added and self.count >= 2:
+            dt = self._times[self.count - 1] - self._times[self.count - 2]
+            step = self._positions[self.count - 1] - self._positions[self.count - 2]
+            self.velocity = step / dt
+        return added
+
+    def velocities(self, roll, pitch, yaw, throttle):
+        """
+        Modelled (n, 3) velocities east, north and up for attitudes in
+        degrees and throttle in [-1, 1], 0 holding the altitude.
+        """
+        forward = tilt_speed(-np.asarray(pitch, dtype=np.float64))
+        right = tilt_speed(np.asarray(roll, dtype=np.float64))
+        heading = np.radians(yaw)
+        sin, cos = np.sin(heading), np.cos(heading)
+        return np.stack(
+            np.broadcast_arrays(
+                forward * sin + right * cos,
+                forward * cos - right * sin,
+                np.asarray(throttle, dtype=np.float64) * CLIMB_RATE,
+            ),
+            axis=-1,
+        )
+
+    def add_attitude(self, times, roll, pitch, yaw, throttle=0.0):
+        """
+        Dead reckon the path through arrays of attitude samples. Between two
+        samples the drone flies at the velocity of the earlier one, input
+        is held until it changes. Returns the number of points added.
+        """
+        times = np.atleast_1d(np.asarray(times, dtype=np.float64))
+        velocities = np.broadcast_to(
+            self.velocities(roll, pitch, yaw, throttle), times.shape + (3,)
+        )
+        if not len(times):
+            return 0
+        added = 0
+        if not self.count:
+            # Without a fix the path starts at home, at the first sample
+            added = self._append(times[:1], np.zeros((1, 3)), DEAD_RECKONED)
+            self.velocity = velocities[0]
+            times, velocities = times[1:], velocities[1:]
+
+        keep = times > self._times[self.count - 1]
+        if len(velocities) and not keep[-1]:
+            # Late samples, e.g. behind advance(), still set the velocity
+            # held from now on
+            self.velocity = velocities[-1]
+        times, velocities = times[keep], velocities[keep]
+        if not len(times):
+            return added
+        dt = np.diff(times, prepend=self._times[self.count - 1])
+        held = np.concatenate((self.velocity[None, :], velocities[:-1]))
+        positions = self._positions[self.count - 1] + np.cumsum(
+            held * dt[:, None], axis=0
+        )
+        self.velocity = velocities[-1]
+        return added + self._append(times, positions, DEAD_RECKONED)
+
+    def push(self, timestamp, roll, pitch, yaw, throttle=0.0):
+        """
+        Stage one live attitude sample; the stage is integrated when it is
+        full or on flush().
+        """
+        if self.staged == STAGE_SIZE:
+            self.flush()
+        row = self.stage[self.staged]
+        row[0] = timestamp
+        row[1] = roll
+        row[2] = pitch
+        row[3] = yaw
+        row[4] = throttle
+        self.staged += 1
+
+    def flush(self):
+        """
+        Integrate the staged attitude samples. Returns the number of points
+        added.
+        """
+        if not self.staged:
+            return 0
+        block = self.stage[: self.staged]
+        self.staged = 0
+        return self.add_attitude(
+            block[:, 0], block[:, 1], block[:, 2], block[:, 3], block[:, 4]
+        )
+
+    def advance(self, t):
+        """
+        Dead reckon the path on to time t at the held velocity, for input
+        that has not changed since its last sample. Staged samples are
+        integrated first. At rest nothing is added, the last point already
+        holds the position. Returns the number of points added.
+        """
+        added = self.flush()
+        if not self.count or t <= self._times[self.count - 1]:
+            return added
+        if not self.velocity.any():
+            return added
+        dt = t - self._times[self.count - 1]
+        position = self._positions[self.count - 1] + self.velocity * dt
+        return added + self._append(np.array([t]), position[None, :], DEAD_RECKONED)
+
+    def snapshot(self):
+        """
+        Views of the columns as they are now, unchanged as the path grows.
+        """
+        return PathSnapshot(self.times, self.positions, self.distances, self.sources)
+
+    def position_at(self, t):
+        """
+        Interpolated position at time t, None while the path is empty.
+        """
+        if not self.count:
+            return None
+        times = self._times[: self.count]
+        positions = self._positions[: self.count]
+        return np.array([np.interp(t, times, positions[:, axis]) for axis in range(3)])
+
+    def clear(self):
+        """
+        Start a new path. Fresh arrays are allocated, views of the old path
+        stay valid.
+        """
+        self.count = 0
+        self._allocate(len(self._times))
+        self.home = None
+        self.frame = None
+        self.velocity = np.zeros(3)
+        self.staged = 0
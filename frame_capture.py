@@ -0,0 +1,420 @@
+import ctypes
+import os
+import queue
+import shutil
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from PIL import Image
+from OpenGL.GL import *
+from OpenGL.raw.GL.VERSION.GL_1_0 import glReadPixels as glReadPixelsRaw
+from gpu_resources import resources, BUFFER, FRAMEBUFFER, RENDERBUFFER
+
+DEBUG = "Visualizer: "
+
+# Formats written as one image per frame, the others are encoded to video
+IMAGE_FORMATS = ("png", "jpg", "bmp")
+VIDEO_FORMATS = ("mp4", "mkv", "avi")
+
+# Seconds close() waits for the video writer thread and for ffmpeg to exit
+CLOSE_TIMEOUT = 10.0
+
+
+class ImageSequenceEncoder:
+    """
+    Writes frames as numbered image files from a pool of worker threads.
+    Image encoding releases the GIL, so the workers run alongside the
+    render loop. Frames are only rendered when something changes in idle
+    mode, so timestamps.csv next to them holds the time of each frame in
+    seconds from the first.
+    """
+
+    def __init__(self, directory, extension="png", workers=2, max_pending=8):
+        self.directory = directory
+        self.extension = extension
+        self.max_pending = max_pending
+        self.pending = 0
+        self.lock = threading.Lock()
+        self.errors = 0
+        os.makedirs(directory, exist_ok=True)
+        self.pool = ThreadPoolExecutor(workers, thread_name_prefix="capture")
+        self.timestamps = open(os.path.join(directory, "timestamps.csv"), "w")
+        self.timestamps.write("frame,seconds\n")
+        self.start = None
+
+    @property
+    def full(self):
+        return self.pending >= self.max_pending
+
+    def submit(self, index, pixels, timestamp):
+        """
+        Queue a frame captured at timestamp, in time.monotonic() seconds,
+        for writing. Returns False, dropping the frame, while max_pending
+        frames are still waiting.
+        """
+        with self.lock:
+            if self.pending >= self.max_pending:
+                return False
+            self.pending += 1
+        if self.start is None:
+            self.start = timestamp
+        self.timestamps.write(f"{index},{timestamp - self.start:.6f}\n")
+        self.pool.submit(self._write, index, pixels)
+        return True
+
+    def _write(self, index, pixels):
+        try:
+            image = frame_image(pixels)
+            if self.extension == "jpg":
+                image = image.convert("RGB")
+            path = os.path.join(self.directory, f"frame_{index:06d}.{self.extension}")
+            image.save(path)
+        except OSError as e:
+            self.errors += 1
+            print(DEBUG + f"Could not write captured frame {index}: {e}")
+        finally:
+            with self.lock:
+                self.pending -= 1
+
+    def close(self):
+        self.pool.shutdown(wait=True)
+        self.timestamps.close()
+
+
+class VideoEncoder:
+    """
+    Pipes frames into an ffmpeg process from a writer thread. Frames have to
+    stay in order, so there is one writer and ffmpeg does the encoding on
+    its own threads. Frames of another size, e.g. after a window resize,
+    are scaled to the size of the first.
+
+    The video has a constant frame rate, but frames are not rendered at
+    one: idle mode only renders on change and slow frames or full queues
+    drop some. Each frame goes in the slot of its capture time and gaps
+    repeat the frame before, so the video plays in real time.
+    """
+
+    def __init__(self, path, resolution, fps, max_pending=8):
+        self.resolution = tuple(resolution)
+        self.fps = fps
+        self.frames = queue.Queue(max_pending)
+        self.errors = 0
+        # Set by the writer thread when ffmpeg stops taking frames
+        self.failed = False
+        self.process = subprocess.Popen(
+            [
+                shutil.which("ffmpeg"),
+                "-loglevel", "error",
+                "-y",
+                "-f", "rawvideo",
+                "-pix_fmt", "rgb24",
+                "-s", f"{self.resolution[0]}x{self.resolution[1]}",
+                "-r", str(fps),
+                "-i", "-",
+                "-pix_fmt", "yuv420p",
+                path,
+            ],
+            stdin=subprocess.PIPE,
+        )  # fmt: skip
+        self.thread = threading.Thread(target=self._run, name="capture", daemon=True)
+        self.thread.start()
+
+    @property
+    def full(self):
+        return self.failed or self.frames.full()
+
+    def submit(self, index, pixels, timestamp):
+        if self.failed:
+            return False
+        try:
+            self.frames.put_nowait((pixels, timestamp))
+            return True
+        except queue.Full:
+            return False
+
+    def _run(self):
+        start = None
+        written = 0
+        previous = None
+        while True:
+            pixels, timestamp = self.frames.get()
+            if start is None:
+                start = timestamp
+            slot = round((timestamp - start) * self.fps)
+            if pixels is None:
+                # Hold the last frame until the capture was closed
+                frame = None
+            elif slot < written:
+                # A newer frame in a slot already written
+                continue
+            else:
+                image = frame_image(pixels).convert("RGB")
+                if image.size != self.resolution:
+                    image = image.resize(self.resolution, Image.BILINEAR)
+                frame = image.tobytes()
+            try:
+                if previous is not None:
+                    for _ in range(slot - written):
+                        self.process.stdin.write(previous)
+                if frame is None:
+                    break
+                self.process.stdin.write(frame)
+            except OSError as e:
+                self.errors += 1
+                self.failed = True
+                print(DEBUG + f"Video encoder stopped: {e}")
+                break
+            written = slot + 1
+            previous = frame
+
+    def close(self):
+        # The writer thread stops when ffmpeg does, maybe with the queue
+        # full, so it is never waited for without a timeout
+        if not self.failed:
+            try:
+                self.frames.put((None, time.monotonic()), timeout=CLOSE_TIMEOUT)
+            except queue.Full:
+                pass
+        self.thread.join(CLOSE_TIMEOUT)
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+        try:
+            self.process.wait(CLOSE_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            print(DEBUG + "Video encoder did not exit, stopping it")
+            self.process.kill()
+            self.process.wait()
+
+
+def frame_image(pixels):
+    """
+    PIL image of pixels read back by FrameCapture, which are bottom-up in
+    BGRA order.
+    """
+    height, width, _ = pixels.shape
+    return Image.frombuffer("RGBA", (width, height), pixels, "raw", "BGRA", 0, -1)
+
+
+def open_encoder(output, image_format, resolution, fps, workers=2):
+    """
+    Encoder writing to output: a video file for the video formats, a
+    directory of images otherwise. Falls back to PNG images when ffmpeg is
+    not installed.
+    """
+    image_format = image_format.lower()
+    if image_format in VIDEO_FORMATS:
+        if shutil.which("ffmpeg") is not None:
+            if not output.endswith("." + image_format):
+                output += "." + image_format
+            return VideoEncoder(output, resolution, fps), output
+        print(DEBUG + "ffmpeg not found, capturing PNG images instead")
+        image_format = "png"
+    elif image_format not in IMAGE_FORMATS:
+        raise ValueError(f"Unknown capture format {image_format}")
+    return ImageSequenceEncoder(output, image_format, workers), output
+
+
+class FrameCapture:
+    """
+    Reads rendered frames back without stalling the render loop.
+
+    glReadPixels into a pixel buffer object returns immediately, the copy
+    runs on the GPU. A fence after each read tells when the copy has
+    finished; poll() then maps the buffer and hands the pixels to the
+    encoder. With a ring of ring_size buffers a frame only has to be waited
+    for when all of them are still in flight. When the encoder falls behind
+    frames are dropped instead of waiting for it.
+
+    With an output size the frame is first scaled to it on the GPU, blitted
+    into an offscreen framebuffer with linear filtering, and only that is
+    read back.
+    """
+
+    def __init__(self, resolution, encoder, ring_size=3, output=None):
+        self.encoder = encoder
+        self.ring_size = ring_size
+        self.output = tuple(output) if output is not None else None
+        self.fbo = None
+        self.color = None
+        self.buffers = []
+        # (frame index, capture time, fence) of the read into each buffer,
+        # None while free
+        self.slots = [None] * ring_size
+        self.head = 0
+        self.frame = 0
+        self.captured = 0
+        self.dropped = 0
+        self.resize(resolution)
+
+    def resize(self, resolution):
+        """
+        Reallocate the buffers for a new window size. Frames still in
+        flight are handed to the encoder first.
+        """
+        if self.buffers:
+            self.flush()
+            self._release_buffers()
+        self.resolution = tuple(resolution)
+        # Size of the frames read back
+        self.read_size = self.output or self.resolution
+        if self.read_size != self.resolution and self.fbo is None:
+            self._create_framebuffer()
+        self.size = self.read_size[0] * self.read_size[1] * 4
+        self.buffers = list(glGenBuffers(self.ring_size))
+        for pbo in self.buffers:
+            glBindBuffer(GL_PIXEL_PACK_BUFFER, pbo)
+            glBufferData(GL_PIXEL_PACK_BUFFER, self.size, None, GL_STREAM_READ)
+            resources.add(BUFFER, pbo, self.size, "capture")
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+
+    def _create_framebuffer(self):
+        # Target of the scaling blit, at the output size
+        width, height = self.output
+        self.color = glGenRenderbuffers(1)
+        glBindRenderbuffer(GL_RENDERBUFFER, self.color)
+        glRenderbufferStorage(GL_RENDERBUFFER, GL_RGBA8, width, height)
+        glBindRenderbuffer(GL_RENDERBUFFER, 0)
+        resources.add(RENDERBUFFER, self.color, width * height * 4, "capture")
+
+        previous = glGetIntegerv(GL_FRAMEBUFFER_BINDING)
+        self.fbo = glGenFramebuffers(1)
+        resources.add(FRAMEBUFFER, self.fbo, 0, "capture")
+        glBindFramebuffer(GL_FRAMEBUFFER, self.fbo)
+        glFramebufferRenderbuffer(
+            GL_FRAMEBUFFER, GL_COLOR_ATTACHMENT0, GL_RENDERBUFFER, self.color
+        )
+        status = glCheckFramebufferStatus(GL_FRAMEBUFFER)
+        glBindFramebuffer(GL_FRAMEBUFFER, previous)
+        if status != GL_FRAMEBUFFER_COMPLETE:
+            self._release_framebuffer()
+            raise RuntimeError(f"Incomplete capture framebuffer: {status}")
+
+    def _release_framebuffer(self):
+        if self.fbo is not None:
+            resources.release(FRAMEBUFFER, self.fbo)
+            resources.release(RENDERBUFFER, self.color)
+            self.fbo = self.color = None
+
+    def capture(self):
+        """
+        Start reading back the frame in the back buffer. Call after
+        rendering, before the flip; the frame is stamped with the time of
+        the call.
+        """
+        timestamp = time.monotonic()
+        self.poll()
+        slot = self.head
+        if self.slots[slot] is not None:
+            # Every buffer is still in flight, wait for the oldest
+            self._retire(slot)
+
+        glBindFramebuffer(GL_READ_FRAMEBUFFER, 0)
+        glReadBuffer(GL_BACK)
+        width, height = self.read_size
+        if self.read_size != self.resolution:
+            # Scale on the GPU so only the output size is read back
+            previous = glGetIntegerv(GL_DRAW_FRAMEBUFFER_BINDING)
+            glBindFramebuffer(GL_DRAW_FRAMEBUFFER, self.fbo)
+            glBlitFramebuffer(
+                0,
+                0,
+                self.resolution[0],
+                self.resolution[1],
+                0,
+                0,
+                width,
+                height,
+                GL_COLOR_BUFFER_BIT,
+                GL_LINEAR,
+            )
+            glBindFramebuffer(GL_DRAW_FRAMEBUFFER, previous)
+            glBindFramebuffer(GL_READ_FRAMEBUFFER, self.fbo)
+            glReadBuffer(GL_COLOR_ATTACHMENT0)
+        glPixelStorei(GL_PACK_ALIGNMENT, 4)
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, self.buffers[slot])
+        glReadPixelsRaw(
+            0, 0, width, height, GL_BGRA, GL_UNSIGNED_BYTE, ctypes.c_void_p(0)
+        )
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+        glBindFramebuffer(GL_READ_FRAMEBUFFER, 0)
+        fence = glFenceSync(GL_SYNC_GPU_COMMANDS_COMPLETE, 0)
+
+        self.slots[slot] = (self.frame, timestamp, fence)
+        self.frame += 1
+        self.head = (slot + 1) % self.ring_size
+
+    def poll(self):
+        """
+        Hand the frames whose copy has finished to the encoder, oldest
+        first. Cheap enough to call on every loop iteration.
+        """
+        for slot in self._in_flight():
+            _, _, fence = self.slots[slot]
+            status = glClientWaitSync(fence, GL_SYNC_FLUSH_COMMANDS_BIT, 0)
+            if status not in (GL_ALREADY_SIGNALED, GL_CONDITION_SATISFIED):
+                break
+            self._retire(slot)
+
+    def _in_flight(self):
+        # Occupied slots in the order they were read
+        for offset in range(self.ring_size):
+            slot = (self.head + offset) % self.ring_size
+            if self.slots[slot] is not None:
+                yield slot
+
+    def _retire(self, slot):
+        index, timestamp, fence = self.slots[slot]
+        self.slots[slot] = None
+        glDeleteSync(fence)
+        # Dropped without mapping, so a full encoder costs nothing here
+        if self.encoder.full:
+            self.dropped += 1
+            return
+
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, self.buffers[slot])
+        address = glMapBufferRange(GL_PIXEL_PACK_BUFFER, 0, self.size, GL_MAP_READ_BIT)
+        if not address:
+            glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+            self.dropped += 1
+            return
+        width, height = self.read_size
+        mapped = (ctypes.c_ubyte * self.size).from_address(address)
+        pixels = np.ctypeslib.as_array(mapped).reshape(height, width, 4).copy()
+        glUnmapBuffer(GL_PIXEL_PACK_BUFFER)
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+
+        if self.encoder.submit(index, pixels, timestamp):
+            self.captured += 1
+        else:
+            self.dropped += 1
+
+    def flush(self):
+        """
+        Hand every frame still in flight to the encoder, oldest first.
+        """
+        for slot in list(self._in_flight()):
+            self._retire(slot)
+
+    def report(self):
+        return f"{self.captured} frames captured, {self.dropped} dropped"
+
+    def _release_buffers(self):
+        for pbo in self.buffers:
+            resources.release(BUFFER, pbo)
+        self.buffers = []
+        self.slots = [None] * self.ring_size
+        self.head = 0
+
+    def close(self):
+        """
+        Finish the frames in flight, wait for the encoder and release the
+        buffers.
+        """
+        self.flush()
+        self._release_buffers()
+        self._release_framebuffer()
+        self.encoder.close()
@@ -0,0 +1,166 @@
+import time
+from collections import namedtuple
+from OpenGL.GL import *
+from batch_renderer import batch
+from hud import FramebufferLayer
+
+# scale: internal render resolution relative to the window
+# circle_segments: tessellation of the horizon mask on the stencil path
+# labels: draw the non-essential tick labels on the sliders
+QualityLevel = namedtuple("QualityLevel", ["scale", "circle_segments", "labels"])
+
+QUALITY_LEVELS = [
+    QualityLevel(1.0, 360, True),
+    QualityLevel(0.85, 180, True),
+    QualityLevel(0.7, 96, True),
+    QualityLevel(0.7, 64, False),
+    QualityLevel(0.5, 48, False),
+]
+
+
+class FrameGovernor:
+    """
+    Keeps frame render time inside a budget by stepping through
+    QUALITY_LEVELS. A level is dropped after the smoothed render time has
+    been over budget for downgrade_frames frames, and restored after it has
+    been under headroom * budget for upgrade_frames frames.
+    """
+
+    def __init__(
+        self,
+        budget_ms,
+        levels=QUALITY_LEVELS,
+        smoothing=0.1,
+        downgrade_frames=10,
+        upgrade_frames=90,
+        headroom=0.6,
+    ):
+        self.budget_ms = budget_ms
+        self.levels = levels
+        self.smoothing = smoothing
+        self.downgrade_frames = downgrade_frames
+        self.upgrade_frames = upgrade_frames
+        self.headroom = headroom
+
+        self.level = 0
+        self.frame_ms = 0.0
+        self._over = 0
+        self._under = 0
+        self._start = None
+
+    @property
+    def quality(self):
+        return self.levels[self.level]
+
+    def begin_frame(self):
+        self._start = time.perf_counter()
+
+    def end_frame(self):
+        """
+        Record the render time of the frame. Returns True when the quality
+        level changed.
+        """
+        if self._start is None:
+            return False
+        elapsed = (time.perf_counter() - self._start) * 1000
+        self._start = None
+
+        if self.frame_ms == 0.0:
+            self.frame_ms = elapsed
+        else:
+            self.frame_ms += self.smoothing * (elapsed - self.frame_ms)
+
+        if self.frame_ms > self.budget_ms:
+            self._over += 1
+            self._under = 0
+        elif self.frame_ms < self.budget_ms * self.headroom:
+            self._under += 1
+            self._over = 0
+        else:
+            self._over = 0
+            self._under = 0
+
+        if self._over >= self.downgrade_frames and self.level < len(self.levels) - 1:
+            self.level += 1
+        elif self._under >= self.upgrade_frames and self.level > 0:
+            self.level -= 1
+        else:
+            return False
+
+        self._over = 0
+        self._under = 0
+        return True
+
+
+class ScaledRenderTarget:
+    """
+    Offscreen target the frame is rendered into at a reduced resolution, and
+    then stretched over the window.
+    """
+
+    def __init__(self, resolution):
+        self.resolution = resolution
+        self.scale = 1.0
+        self.layer = None
+
+    def resize(self, resolution):
+        self.resolution = resolution
+        self.release()
+
+    def release(self):
+        if self.layer is not None:
+            self.layer.delete()
+            self.layer = None
+
+    def begin(self, scale):
+        """
+        Start rendering the frame. At full scale this draws straight to the
+        window; otherwise into the offscreen layer.
+        """
+        if scale != self.scale:
+            self.scale = scale
+            self.release()
+        if scale >= 1.0:
+            return
+
+        if self.layer is None:
+            self.layer = FramebufferLayer(
+                max(1, int(self.resolution[0] * scale)),
+                max(1, int(self.resolution[1] * scale)),
+            )
+        glBindFramebuffer(GL_FRAMEBUFFER, self.layer.fbo)
+        glViewport(0, 0, self.layer.width, self.layer.height)
+        glClearColor(0, 0, 0, 0)
+        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT | GL_STENCIL_BUFFER_BIT)
+
+    def end(self):
+        """
+        Upscale the offscreen layer onto the window.
+        """
+        if self.scale >= 1.0 or self.layer is None:
+            return
+
+        width, height = self.resolution
+        glBindFramebuffer(GL_FRAMEBUFFER, 0)
+        glViewport(0, 0, width, height)
+
+        glMatrixMode(GL_PROJECTION)
+        glPushMatrix()
+        glLoadIdentity()
+        glOrtho(0, width, 0, height, -1, 1)
+        glMatrixMode(GL_MODELVIEW)
+        glPushMatrix()
+        glLoadIdentity()
+
+        batch.color(1, 1, 1, 1)
+        batch.quad(
+            ((0, 0), (width, 0), (width, height), (0, height)),
+            ((0, 0), (1, 0), (1, 1), (0, 1)),
+            self.layer.texture,
+        )
+        batch.flush(premultiplied=True)
+
+        glPopMatrix()
+        glMatrixMode(GL_PROJECTION)
+        glPopMatrix()
+        glMatrixMode(GL_MODELVIEW)
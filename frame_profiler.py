@@ -0,0 +1,193 @@
+import csv
+import functools
+import json
+import time
+from collections import deque
+import numpy as np
+
+DEBUG = "Visualizer: "
+
+# Percentiles shown in the overlay and written to the JSON summary
+PERCENTILES = (50, 95, 99)
+
+
+class _NullStage:
+    """
+    Returned by stage() while profiling is disabled, so the hot path only
+    pays for one attribute check and an empty with block.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.add(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class FrameProfiler:
+    """
+    Times the stages of each frame.
+
+    Stage times are summed per frame, so a helper called many times in one
+    frame shows up once. The last window frames of every stage are kept for
+    the rolling percentiles, and up to history frames for the dump on exit.
+    """
+
+    def __init__(self, enabled=False, window=300, history=100000):
+        self.enabled = enabled
+        self.window = window
+        self.frames = deque(maxlen=history)
+        self.samples = {}
+        self.current = {}
+        self.frame_start = None
+        self.frame_count = 0
+
+    def reset(self):
+        """
+        Forget everything recorded so far.
+        """
+        self.frames.clear()
+        self.samples = {}
+        self.current = {}
+        self.frame_start = None
+        self.frame_count = 0
+
+    def stage(self, name):
+        """
+        Context manager timing a block as stage name.
+        """
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name)
+
+    def timed(self, name):
+        """
+        Decorator timing every call of a function as stage name.
+        """
+
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return function(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    self.add(name, time.perf_counter() - start)
+
+            return wrapper
+
+        return decorator
+
+    def add(self, name, seconds):
+        self.current[name] = self.current.get(name, 0.0) + seconds * 1000
+
+    def begin_frame(self):
+        """
+        Start a frame, dropping stages timed since the last frame that was
+        not finished, e.g. an idle loop iteration that drew nothing.
+        """
+        if not self.enabled:
+            return
+        self.current = {}
+        self.frame_start = time.perf_counter()
+
+    def end_frame(self):
+        if not self.enabled or self.frame_start is None:
+            return
+        self.add("frame", time.perf_counter() - self.frame_start)
+        self.frame_start = None
+
+        for name, value in self.current.items():
+            samples = self.samples.get(name)
+            if samples is None:
+                samples = self.samples[name] = deque(maxlen=self.window)
+            samples.append(value)
+        self.frames.append((self.frame_count, self.current))
+        self.frame_count += 1
+        self.current = {}
+
+    def percentiles(self, name):
+        """
+        Rolling percentiles of a stage in milliseconds, as a dict.
+        """
+        values = np.fromiter(self.samples[name], dtype=np.float64)
+        return dict(zip(PERCENTILES, np.percentile(values, PERCENTILES)))
+
+    def overlay_rows(self, limit=12):
+        """
+        (stage, [percentiles]) rows for the overlay, the slowest stages by
+        median first.
+        """
+        rows = []
+        for name in self.samples:
+            p = self.percentiles(name)
+            rows.append((name, [p[q] for q in PERCENTILES]))
+        rows.sort(key=lambda row: row[1][0], reverse=True)
+        return rows[:limit]
+
+    def summary(self):
+        """
+        Statistics over the whole recorded history, per stage in
+        milliseconds.
+        """
+        values = {}
+        for _, stages in self.frames:
+            for name, value in stages.items():
+                values.setdefault(name, []).append(value)
+
+        summary = {}
+        for name, samples in values.items():
+            samples = np.asarray(samples)
+            summary[name] = {
+                "count": len(samples),
+                "mean": float(samples.mean()),
+                "max": float(samples.max()),
+                **{f"p{q}": float(np.percentile(samples, q)) for q in PERCENTILES},
+            }
+        return summary
+
+    def dump(self, path):
+        """
+        Write every recorded frame to path.csv, one column per stage, and the
+        summary to path.json.
+        """
+        names = sorted({name for _, stages in self.frames for name in stages})
+        with open(path + ".csv", "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["index"] + names)
+            for frame, stages in self.frames:
+                writer.writerow(
+                    [frame]
+                    + [
+                        f"{stages[name]:.4f}" if name in stages else ""
+                        for name in names
+                    ]
+                )
+        with open(path + ".json", "w") as f:
+            json.dump(
+                {"frames": len(self.frames), "stages": self.summary()}, f, indent=2
+            )
+        print(DEBUG + f"Frame profile written to {path}.csv and {path}.json")
+
+
+# Shared profiler for the visualizer process, enabled from the config
+profiler = FrameProfiler()
@@ -0,0 +1,77 @@
+"""
+Throughput benchmark of the geodesy conversions.
+
+Converts random positions around a home point between latitude,
+longitude and altitude and the local east-north-up frame, as whole arrays
+and one live sample at a time:
+
+    python geodesy_benchmark.py --count 1000000
+"""
+
+import argparse
+import sys
+import time
+import numpy as np
+from geodesy import local_frame
+
+DEBUG = "Benchmark: "
+
+# Home point and the spread of the positions around it in degrees
+HOME = (47.3769, 8.5417, 408.0)
+SPREAD = 0.25
+
+
+def rate(function, count):
+    """
+    Points per second of function, which converts count points.
+    """
+    start = time.perf_counter()
+    function()
+    return count / (time.perf_counter() - start)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--count", type=int, default=1000000, help="array size")
+    parser.add_argument(
+        "--samples", type=int, default=100000, help="single samples converted"
+    )
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(1)
+    frame = local_frame(*HOME)
+    latitude = HOME[0] + rng.uniform(-SPREAD, SPREAD, args.count)
+    longitude = HOME[1] + rng.uniform(-SPREAD, SPREAD, args.count)
+    altitude = HOME[2] + rng.uniform(0, 400, args.count)
+    enu = frame.to_enu(latitude, longitude, altitude)
+    samples = list(
+        zip(
+            latitude[: args.samples].tolist(),
+            longitude[: args.samples].tolist(),
+            altitude[: args.samples].tolist(),
+        )
+    )
+
+    def one_at_a_time(convert):
+        for sample in samples:
+            convert(*sample)
+
+    results = (
+        (
+            "to_enu",
+            rate(lambda: frame.to_enu(latitude, longitude, altitude), args.count),
+        ),
+        ("from_enu", rate(lambda: frame.from_enu(enu), args.count)),
+        ("enu_point", rate(lambda: one_at_a_time(frame.enu_point), len(samples))),
+        (
+            "to_enu, one point at a time",
+            rate(lambda: one_at_a_time(frame.to_enu), len(samples)),
+        ),
+    )
+    for name, points_per_second in results:
+        print(DEBUG + f"{name}: {points_per_second / 1e6:.2f} M points/s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
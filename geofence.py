@@ -0,0 +1,119 @@
+import numpy as np
+
+# Points checked at once by Geofence.check, bounding the (points x edges)
+# temporary arrays of polygon fences
+CHECK_BATCH = 16384
+
+
+def _vertical_margin(points, floor, ceiling):
+    # Metres inside the altitude band, negative outside
+    margin = np.full(len(points), np.inf)
+    if floor is not None:
+        margin = np.minimum(margin, points[:, 2] - floor)
+    if ceiling is not None:
+        margin = np.minimum(margin, ceiling - points[:, 2])
+    return margin
+
+
+class PolygonFence:
+    """
+    A polygon in metres east and north of home, optionally limited to an
+    altitude band. The edges are precomputed when the fence is created.
+    """
+
+    def __init__(self, vertices, floor=None, ceiling=None, exclusion=False):
+        self.vertices = np.asarray(vertices, dtype=np.float64)
+        self.floor = floor
+        self.ceiling = ceiling
+        self.exclusion = exclusion
+        self.starts = self.vertices
+        self.ends = np.roll(self.vertices, -1, axis=0)
+        self.edges = self.ends - self.starts
+        self.lengths = np.maximum(np.einsum("ij,ij->i", self.edges, self.edges), 1e-12)
+
+    def margin(self, points):
+        """
+        Signed distance in metres of each of the (n, 3) points to the fence
+        boundary, positive inside.
+        """
+        xy = points[:, None, :2]
+        # Crossing number: edges straddling the point's y whose crossing is
+        # to its right
+        y0 = self.starts[None, :, 1]
+        y1 = self.ends[None, :, 1]
+        straddles = (y0 > xy[..., 1]) != (y1 > xy[..., 1])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            crossing = self.starts[None, :, 0] + (xy[..., 1] - y0) / (y1 - y0) * (
+                self.edges[None, :, 0]
+            )
+        inside = (straddles & (xy[..., 0] < crossing)).sum(axis=1) % 2 == 1
+
+        # Distance to the nearest edge
+        offsets = xy - self.starts[None]
+        along = np.clip(
+            np.einsum("nij,ij->ni", offsets, self.edges) / self.lengths, 0.0, 1.0
+        )
+        nearest = offsets - along[..., None] * self.edges[None]
+        distance = np.sqrt(np.einsum("nij,nij->ni", nearest, nearest).min(axis=1))
+
+        horizontal = np.where(inside, distance, -distance)
+        return np.minimum(
+            horizontal, _vertical_margin(points, self.floor, self.ceiling)
+        )
+
+
+class CylinderFence:
+    """
+    A circle of radius metres around center, metres east and north of home,
+    optionally limited to an altitude band.
+    """
+
+    def __init__(self, center, radius, floor=None, ceiling=None, exclusion=False):
+        self.center = np.asarray(center, dtype=np.float64)
+        self.radius = radius
+        self.floor = floor
+        self.ceiling = ceiling
+        self.exclusion = exclusion
+
+    def margin(self, points):
+        offsets = points[:, :2] - self.center
+        horizontal = self.radius - np.hypot(offsets[:, 0], offsets[:, 1])
+        return np.minimum(
+            horizontal, _vertical_margin(points, self.floor, self.ceiling)
+        )
+
+
+class Geofence:
+    """
+    A set of fences the drone has to stay inside, and exclusion zones it
+    has to stay out of. Positions are metres east, north and up of home.
+    """
+
+    def __init__(self, fences):
+        self.fences = list(fences)
+
+    def check(self, points):
+        """
+        Check (n, 3) positions, e.g. a whole replay, at once. Returns an
+        array of whether each is allowed and one of its margin in metres to
+        the nearest fence boundary, negative when it is not allowed.
+        """
+        points = np.atleast_2d(np.asarray(points, dtype=np.float64))
+        margin = np.full(len(points), np.inf)
+        for start in range(0, len(points), CHECK_BATCH):
+            batch = points[start : start + CHECK_BATCH]
+            for fence in self.fences:
+                fence_margin = fence.margin(batch)
+                if fence.exclusion:
+                    fence_margin = -fence_margin
+                margin[start : start + CHECK_BATCH] = np.minimum(
+                    margin[start : start + CHECK_BATCH], fence_margin
+                )
+        return margin >= 0, margin
+
+    def check_point(self, point):
+        """
+        (allowed, margin) of a single position.
+        """
+        allowed, margin = self.check(point)
+        return bool(allowed[0]), float(margin[0])
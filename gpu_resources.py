@@ -0,0 +1,149 @@
+from OpenGL.GL import *
+
+DEBUG = "Visualizer: "
+
+TEXTURE = "texture"
+BUFFER = "buffer"
+FRAMEBUFFER = "framebuffer"
+RENDERBUFFER = "renderbuffer"
+
+
+def _delete(kind, handle):
+    if kind == TEXTURE:
+        glDeleteTextures([handle])
+    elif kind == BUFFER:
+        glDeleteBuffers(1, [handle])
+    elif kind == FRAMEBUFFER:
+        glDeleteFramebuffers(1, [handle])
+    elif kind == RENDERBUFFER:
+        glDeleteRenderbuffers(1, [handle])
+    else:
+        raise ValueError(f"Unknown GPU resource type {kind}")
+
+
+class GpuResource:
+    """
+    One GL object owned by the resource manager. size is the estimated GPU
+    memory in bytes, refs the number of users holding it.
+    """
+
+    def __init__(self, kind, handle, size, name):
+        self.kind = kind
+        self.handle = handle
+        self.size = size
+        self.name = name
+        self.refs = 1
+
+
+class GpuResources:
+    """
+    Owns the textures, buffers and framebuffers of the visualizer.
+
+    Resources are reference counted. A resource created under a key is
+    shared: acquire() with the same key returns it again instead of
+    creating a new one. Keyed resources stay cached when their count drops
+    to zero, so a soft restart of the render loop reuses them; collect()
+    deletes them. Unkeyed resources are deleted as soon as they are
+    released. shutdown() deletes everything and reports leaks.
+    """
+
+    def __init__(self):
+        self.resources = {}
+        self.keys = {}
+
+    def add(self, kind, handle, size=0, name="", key=None):
+        """
+        Register a GL object that was just created, with one reference.
+        """
+        resource = GpuResource(kind, handle, size, name)
+        self.resources[(kind, handle)] = resource
+        if key is not None:
+            self.keys[key] = resource
+        return handle
+
+    def acquire(self, key, create):
+        """
+        Return the resource cached under key with one more reference. When
+        there is none, create() is called and must return the handle of an
+        object it registered with add(..., key=key).
+        """
+        resource = self.keys.get(key)
+        if resource is not None:
+            resource.refs += 1
+            return resource.handle
+
+        handle = create()
+        if key not in self.keys:
+            raise RuntimeError(f"GPU resource {key} was not registered")
+        return handle
+
+    def resize(self, kind, handle, size):
+        """
+        Update the size of a registered object whose storage was replaced.
+        """
+        resource = self.resources.get((kind, handle))
+        if resource is not None:
+            resource.size = size
+
+    def release(self, kind, handle):
+        resource = self.resources.get((kind, handle))
+        if resource is None:
+            return
+        resource.refs -= 1
+        if resource.refs <= 0 and resource not in self.keys.values():
+            self._delete(resource)
+
+    def collect(self):
+        """
+        Delete the cached resources nobody holds anymore.
+        """
+        for key, resource in list(self.keys.items()):
+            if resource.refs <= 0:
+                self._delete(resource)
+
+    def shutdown(self):
+        """
+        Delete every resource, reporting the ones still referenced as leaks.
+        Must be called while the GL context is still current.
+        """
+        leaks = [r for r in self.resources.values() if r.refs > 0]
+        for resource in leaks:
+            print(
+                DEBUG
+                + f"Leaked {resource.kind} {resource.name or resource.handle} "
+                + f"({resource.refs} references, {resource.size / 1024:.0f} KiB)"
+            )
+        for resource in list(self.resources.values()):
+            self._delete(resource)
+
+    def _delete(self, resource):
+        _delete(resource.kind, resource.handle)
+        del self.resources[(resource.kind, resource.handle)]
+        for key, cached in list(self.keys.items()):
+            if cached is resource:
+                del self.keys[key]
+
+    def memory_usage(self):
+        """
+        Estimated GPU memory in bytes per resource type.
+        """
+        usage = {TEXTURE: 0, BUFFER: 0, FRAMEBUFFER: 0, RENDERBUFFER: 0}
+        for resource in self.resources.values():
+            usage[resource.kind] += resource.size
+        return usage
+
+    def report(self):
+        """
+        One line summary of the resource counts and memory estimates.
+        """
+        counts = {}
+        for resource in self.resources.values():
+            counts[resource.kind] = counts.get(resource.kind, 0) + 1
+        return ", ".join(
+            f"{kind}s: {counts.get(kind, 0)} ({size / (1024 * 1024):.1f} MiB)"
+            for kind, size in self.memory_usage().items()
+        )
+
+
+# Shared manager for the visualizer process
+resources = GpuResources()
@@ -0,0 +1,170 @@
+from OpenGL.GL import *
+from OpenGL.GL.shaders import compileProgram, compileShader
+from batch_renderer import batch
+
+DEBUG = "Visualizer: "
+
+VERTEX_SHADER = """
+#version 120
+uniform vec2 center;
+varying vec2 local;
+
+void main() {
+    local = gl_Vertex.xy - center;
+    gl_Position = gl_ModelViewProjectionMatrix * gl_Vertex;
+}
+"""
+
+# Composites the three horizon images in one pass. Every image is sampled
+# in its own quad space, so the Interior pitch shift and the Frame roll
+# rotation are just transforms of the fragment's local position. The images
+# share one atlas texture, each rect uniform is its (u, v, width, height).
+FRAGMENT_SHADER = """
+#version 120
+uniform sampler2D atlas;
+uniform vec4 interior_rect;
+uniform vec4 frame_rect;
+uniform vec4 ring_rect;
+uniform float radius;
+uniform float pitch_offset;
+uniform vec2 roll;
+varying vec2 local;
+
+vec4 sample_quad(vec4 rect, vec2 uv) {
+    vec4 color = texture2D(atlas, rect.xy + clamp(uv, 0.0, 1.0) * rect.zw);
+    // Outside the textured quad nothing was drawn
+    vec2 inside = step(vec2(0.0), uv) * step(uv, vec2(1.0));
+    return vec4(color.rgb * color.a, color.a) * inside.x * inside.y;
+}
+
+vec4 over(vec4 top, vec4 bottom) {
+    return top + bottom * (1.0 - top.a);
+}
+
+void main() {
+    // Circular mask, replaces the stencil pass
+    if (dot(local, local) > radius * radius) {
+        discard;
+    }
+
+    // Interior is drawn at twice the horizon size and shifted by the pitch
+    vec2 interior_uv = (local - vec2(0.0, pitch_offset)) / (4.0 * radius) + 0.5;
+
+    // Frame is rotated by the roll angle, sample it with the inverse rotation
+    vec2 frame_local = vec2(
+        roll.x * local.x + roll.y * local.y,
+        -roll.y * local.x + roll.x * local.y
+    );
+    vec2 frame_uv = frame_local / (2.0 * radius) + 0.5;
+
+    vec2 ring_uv = local / (2.0 * radius) + 0.5;
+
+    vec4 color = sample_quad(interior_rect, interior_uv);
+    color = over(sample_quad(frame_rect, frame_uv), color);
+    color = over(sample_quad(ring_rect, ring_uv), color);
+
+    if (color.a <= 0.0) {
+        discard;
+    }
+    gl_FragColor = vec4(color.rgb / color.a, color.a);
+}
+"""
+
+# Texture unit used by the shader, unit 0 is left to the 2D batch
+ATLAS_UNIT = 1
+
+
+class HorizonShader:
+    """
+    Draws the artificial horizon (mask, pitch-shifted Interior, rolled Frame
+    and Ring) as a single quad with one GLSL program.
+    """
+
+    def __init__(self):
+        self.program = compileProgram(
+            compileShader(VERTEX_SHADER, GL_VERTEX_SHADER),
+            compileShader(FRAGMENT_SHADER, GL_FRAGMENT_SHADER),
+            validate=False,
+        )
+        self.uniforms = {
+            name: glGetUniformLocation(self.program, name)
+            for name in (
+                "center",
+                "radius",
+                "pitch_offset",
+                "roll",
+                "atlas",
+                "interior_rect",
+                "frame_rect",
+                "ring_rect",
+            )
+        }
+
+        glUseProgram(self.program)
+        glUniform1i(self.uniforms["atlas"], ATLAS_UNIT)
+        glUseProgram(0)
+
+    def draw(self, x, y, radius, pitch_offset, cos_roll, sin_roll, textures):
+        # Anything queued must be drawn before the program is bound
+        batch.flush()
+
+        # All three images live in the same atlas texture
+        glActiveTexture(GL_TEXTURE0 + ATLAS_UNIT)
+        glBindTexture(GL_TEXTURE_2D, textures["Interior"].texture)
+        glActiveTexture(GL_TEXTURE0)
+
+        glUseProgram(self.program)
+        glUniform2f(self.uniforms["center"], x, y)
+        glUniform1f(self.uniforms["radius"], radius)
+        glUniform1f(self.uniforms["pitch_offset"], pitch_offset)
+        glUniform2f(self.uniforms["roll"], cos_roll, sin_roll)
+        for name in ("Interior", "Frame", "Ring"):
+            region = textures[name]
+            glUniform4f(
+                self.uniforms[name.lower() + "_rect"],
+                region.u0,
+                region.v0,
+                region.u1 - region.u0,
+                region.v1 - region.v0,
+            )
+
+        batch.rect(x - radius, y - radius, x + radius, y + radius)
+        batch.flush()
+
+        glUseProgram(0)
+        glActiveTexture(GL_TEXTURE0 + ATLAS_UNIT)
+        glBindTexture(GL_TEXTURE_2D, 0)
+        glActiveTexture(GL_TEXTURE0)
+
+
+# None until first use, False when shaders are not available
+_horizon_shader = None
+
+
+def get_horizon_shader():
+    """
+    Return the shared HorizonShader, or None when the context has no GLSL
+    support and the stencil path has to be used.
+    """
+    global _horizon_shader
+    if _horizon_shader is None:
+        try:
+            version = glGetString(GL_VERSION).decode().split()[0]
+            if int(version.split(".")[0]) < 2:
+                raise RuntimeError(f"OpenGL {version} has no GLSL")
+            _horizon_shader = HorizonShader()
+        except Exception as e:
+            print(DEBUG + f"Horizon shader unavailable, using stencil path: {e}")
+            _horizon_shader = False
+    return _horizon_shader or None
+
+
+def release_horizon_shader():
+    """
+    Delete the shared program. It belongs to the current GL context, the next
+    get_horizon_shader() call compiles a new one.
+    """
+    global _horizon_shader
+    if _horizon_shader:
+        glDeleteProgram(_horizon_shader.program)
+    _horizon_shader = None
@@ -0,0 +1,257 @@
+import math
+from OpenGL.GL import *
+from batch_renderer import batch
+from layout import align_rect
+from gpu_resources import resources, TEXTURE, FRAMEBUFFER, RENDERBUFFER
+
+
+def framebuffers_supported():
+    """
+    Framebuffer objects are core from OpenGL 3.0, older contexts draw the HUD
+    directly every frame instead.
+    """
+    try:
+        version = glGetString(GL_VERSION).decode().split()[0]
+        major = int(version.split(".")[0])
+    except Exception:
+        return False
+    return major >= 3 and bool(glGenFramebuffers)
+
+
+class FramebufferLayer:
+    """
+    An offscreen RGBA texture with a depth/stencil buffer that a HUD node is
+    rendered into.
+    """
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+
+        self.texture = glGenTextures(1)
+        glBindTexture(GL_TEXTURE_2D, self.texture)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_CLAMP_TO_EDGE)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_CLAMP_TO_EDGE)
+        glTexImage2D(
+            GL_TEXTURE_2D,
+            0,
+            GL_RGBA,
+            width,
+            height,
+            0,
+            GL_RGBA,
+            GL_UNSIGNED_BYTE,
+            None,
+        )
+        glBindTexture(GL_TEXTURE_2D, 0)
+        resources.add(TEXTURE, self.texture, width * height * 4, "HUD layer")
+
+        # The artificial horizon masks with the stencil buffer
+        self.depth_stencil = glGenRenderbuffers(1)
+        glBindRenderbuffer(GL_RENDERBUFFER, self.depth_stencil)
+        glRenderbufferStorage(GL_RENDERBUFFER, GL_DEPTH24_STENCIL8, width, height)
+        glBindRenderbuffer(GL_RENDERBUFFER, 0)
+        resources.add(RENDERBUFFER, self.depth_stencil, width * height * 4, "HUD layer")
+
+        # Layers can be created mid-frame, keep the current target bound
+        previous = glGetIntegerv(GL_FRAMEBUFFER_BINDING)
+        self.fbo = glGenFramebuffers(1)
+        resources.add(FRAMEBUFFER, self.fbo, 0, "HUD layer")
+        glBindFramebuffer(GL_FRAMEBUFFER, self.fbo)
+        glFramebufferTexture2D(
+            GL_FRAMEBUFFER, GL_COLOR_ATTACHMENT0, GL_TEXTURE_2D, self.texture, 0
+        )
+        glFramebufferRenderbuffer(
+            GL_FRAMEBUFFER,
+            GL_DEPTH_STENCIL_ATTACHMENT,
+            GL_RENDERBUFFER,
+            self.depth_stencil,
+        )
+        status = glCheckFramebufferStatus(GL_FRAMEBUFFER)
+        glBindFramebuffer(GL_FRAMEBUFFER, previous)
+        if status != GL_FRAMEBUFFER_COMPLETE:
+            self.delete()
+            raise RuntimeError(f"Incomplete HUD framebuffer: {status}")
+
+    def delete(self):
+        resources.release(FRAMEBUFFER, self.fbo)
+        resources.release(RENDERBUFFER, self.depth_stencil)
+        resources.release(TEXTURE, self.texture)
+
+
+class HudNode:
+    """
+    One HUD widget. draw(*values) renders it inside design_rect
+    (x, y, width, height), which is mapped onto rect on the screen; the
+    result is cached in a framebuffer layer and only redrawn when the bound
+    values change.
+    """
+
+    def __init__(self, name, draw, rect, design_rect=None):
+        self.name = name
+        self.draw = draw
+        self.rect = rect
+        self.design_rect = design_rect or rect
+        self.values = ()
+        self.dirty = True
+        self.layer = None
+
+    def bind(self, *values):
+        if values != self.values:
+            self.values = values
+            self.dirty = True
+
+    def release(self):
+        if self.layer is not None:
+            self.layer.delete()
+            self.layer = None
+        self.dirty = True
+
+
+class Hud:
+    """
+    Retained-mode HUD. Widgets are added once as nodes, each frame the
+    caller binds the current values and render() composites the cached
+    layers, redrawing only the nodes whose values changed.
+    """
+
+    def __init__(self, resolution):
+        self.resolution = resolution
+        self.scale = 1.0
+        self.nodes = []
+        self.retained = framebuffers_supported()
+
+    def add(self, name, draw, rect, design_rect=None):
+        """
+        Add a node. Without design_rect the widget draws in screen
+        coordinates, otherwise design_rect is scaled onto rect.
+        """
+        node = HudNode(name, draw, align_rect(rect), design_rect)
+        self.nodes.append(node)
+        return node
+
+    def place(self, name, rect, design_rect=None):
+        """
+        Move a node, e.g. after the window was resized. The cached layer is
+        kept when only the position changed, and redrawn without being
+        reallocated when the size in pixels stayed the same.
+        """
+        node = self.node(name)
+        rect = align_rect(rect)
+        design_rect = design_rect or rect
+        if rect[2:] != node.rect[2:]:
+            node.release()
+        elif design_rect != node.design_rect:
+            node.dirty = True
+        node.rect = rect
+        node.design_rect = design_rect
+
+    def node(self, name):
+        for node in self.nodes:
+            if node.name == name:
+                return node
+        raise KeyError(name)
+
+    def bind(self, name, *values):
+        self.node(name).bind(*values)
+
+    def resize(self, resolution):
+        """
+        Change the window size. Nodes keep their layers until they are moved
+        with place().
+        """
+        self.resolution = resolution
+
+    def set_scale(self, scale):
+        """
+        Render the layers at scale times their screen size, used when the
+        frame itself is rendered at a reduced resolution.
+        """
+        if scale != self.scale:
+            self.scale = scale
+            self.release()
+
+    def invalidate(self):
+        """
+        Force every node to redraw, e.g. after a global drawing setting changed.
+        """
+        for node in self.nodes:
+            node.dirty = True
+
+    def release(self):
+        for node in self.nodes:
+            node.release()
+
+    def render(self):
+        if not self.retained:
+            for node in self.nodes:
+                x, y, width, height = node.rect
+                design_x, design_y, design_width, design_height = node.design_rect
+                glPushMatrix()
+                glTranslatef(x, y, 0)
+                glScalef(width / design_width, height / design_height, 1)
+                glTranslatef(-design_x, -design_y, 0)
+                node.draw(*node.values)
+                batch.flush()
+                glPopMatrix()
+            return
+
+        for node in self.nodes:
+            if node.dirty or node.layer is None:
+                self._render_layer(node)
+
+        self._composite()
+
+    def _render_layer(self, node):
+        width, height = node.rect[2:]
+        x, y, design_width, design_height = node.design_rect
+        if node.layer is None:
+            node.layer = FramebufferLayer(
+                max(1, math.ceil(width * self.scale)),
+                max(1, math.ceil(height * self.scale)),
+            )
+
+        # The frame may itself be going to an offscreen target
+        target = glGetIntegerv(GL_FRAMEBUFFER_BINDING)
+        viewport = glGetIntegerv(GL_VIEWPORT)
+
+        glBindFramebuffer(GL_FRAMEBUFFER, node.layer.fbo)
+        glViewport(0, 0, node.layer.width, node.layer.height)
+        glMatrixMode(GL_PROJECTION)
+        glPushMatrix()
+        glLoadIdentity()
+        # Map the layer onto the node's design rectangle, so widgets keep
+        # drawing in their own coordinates
+        glOrtho(x, x + design_width, y, y + design_height, -1, 1)
+        glMatrixMode(GL_MODELVIEW)
+        glPushMatrix()
+        glLoadIdentity()
+
+        glClearColor(0, 0, 0, 0)
+        glClear(GL_COLOR_BUFFER_BIT | GL_STENCIL_BUFFER_BIT)
+
+        # Layers end up holding premultiplied alpha, see Batch2D.flush
+        node.draw(*node.values)
+        batch.flush()
+
+        glPopMatrix()
+        glMatrixMode(GL_PROJECTION)
+        glPopMatrix()
+        glMatrixMode(GL_MODELVIEW)
+        glBindFramebuffer(GL_FRAMEBUFFER, target)
+        glViewport(*viewport)
+
+        node.dirty = False
+
+    def _composite(self):
+        batch.color(1, 1, 1, 1)
+        for node in self.nodes:
+            x, y, width, height = node.rect
+            batch.quad(
+                ((x, y), (x + width, y), (x + width, y + height), (x, y + height)),
+                ((0, 0), (1, 0), (1, 1), (0, 1)),
+                node.layer.texture,
+            )
+        batch.flush(premultiplied=True)
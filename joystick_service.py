@@ -1,4 +1,5 @@
 import multiprocessing
+import time
 import pygame
 from launcher import Config
 
@@ -73,7 +74,7 @@ class Joystick_Position:
         return self.data
 
 
-def main(config, data, lock):
+def main(config, data, lock, updated=None):
     joystick_position = Joystick_Position(
         joystick_id=config.joystick,
         FILTER_THRESHOLD=config.filter_threshold,
@@ -108,6 +109,7 @@ def main(config, data, lock):
         "button_15": False,
         "button_16": False,
     }
+    published = None
     while True:
         # Handle Pygame events
         for event in pygame.event.get():
@@ -118,9 +120,20 @@ def main(config, data, lock):
 
             if event.type == pygame.JOYBUTTONUP:
                 temp = joystick_position.get_button(event.button)
-        with lock:
-            data.clear()
-            data.update(temp.copy())
+
+        # Only publish when something changed, so readers waiting on
+        # updated wake up for real input only
+        if temp != published:
+            published = temp.copy()
+            with lock:
+                data.clear()
+                data.update(published)
+                # Sample time for the visualizer's interpolation buffer. The
+                # monotonic clock is system wide, so it compares across
+                # processes.
+                data["timestamp"] = time.monotonic()
+            if updated is not None:
+                updated.set()
 
 
 def get_joystick_list():
@@ -64,6 +64,33 @@ class Config:
         fps=30,
         resolution=(1920, 1200),
         fullscreen=False,
+        fast_gl=False,
+        adaptive_quality=True,
+        idle_mode=True,
+        idle_heartbeat=1.0,
+        profile=False,
+        profile_output="profile",
+        chart_window=600.0,
+        capture=False,
+        capture_output="capture",
+        capture_format="png",
+        stream=False,
+        stream_host="127.0.0.1",
+        stream_port=8080,
+        stream_resolution=(960, 600),
+        stream_fps=10.0,
+        stream_quality=80,
+        map_tiles="",
+        map_zoom=15,
+        map_center=(47.3769, 8.5417),
+        map_cache=128,
+        video_source="",
+        video_fps=30.0,
+        geofence_radius=0.0,
+        geofence_ceiling=120.0,
+        geofence_polygon=(),
+        history_memory=64.0,
+        history_spill_dir="",
         joystick=0,
         filter_threshold=0.05,
         filter_factor=0.9,
@@ -75,6 +102,33 @@ class Config:
         self.fps = fps
         self.resolution = resolution
         self.fullscreen = fullscreen
+        self.fast_gl = fast_gl
+        self.adaptive_quality = adaptive_quality
+        self.idle_mode = idle_mode
+        self.idle_heartbeat = idle_heartbeat
+        self.profile = profile
+        self.profile_output = profile_output
+        self.chart_window = chart_window
+        self.capture = capture
+        self.capture_output = capture_output
+        self.capture_format = capture_format
+        self.stream = stream
+        self.stream_host = stream_host
+        self.stream_port = stream_port
+        self.stream_resolution = stream_resolution
+        self.stream_fps = stream_fps
+        self.stream_quality = stream_quality
+        self.map_tiles = map_tiles
+        self.map_zoom = map_zoom
+        self.map_center = map_center
+        self.map_cache = map_cache
+        self.video_source = video_source
+        self.video_fps = video_fps
+        self.geofence_radius = geofence_radius
+        self.geofence_ceiling = geofence_ceiling
+        self.geofence_polygon = geofence_polygon
+        self.history_memory = history_memory
+        self.history_spill_dir = history_spill_dir
 
         # Joystick settings
         self.joystick = joystick
@@ -102,6 +156,69 @@ class Config:
                         self.resolution = (int(res[0]), int(res[1]))
                     elif line.startswith("FULLSCREEN="):
                         self.fullscreen = line.split("=")[1].strip().lower() == "true"
+                    elif line.startswith("FAST_GL="):
+                        self.fast_gl = line.split("=")[1].strip().lower() == "true"
+                    elif line.startswith("ADAPTIVE_QUALITY="):
+                        self.adaptive_quality = (
+                            line.split("=")[1].strip().lower() == "true"
+                        )
+                    elif line.startswith("IDLE_MODE="):
+                        self.idle_mode = line.split("=")[1].strip().lower() == "true"
+                    elif line.startswith("IDLE_HEARTBEAT="):
+                        self.idle_heartbeat = float(line.split("=")[1].strip())
+                    elif line.startswith("PROFILE="):
+                        self.profile = line.split("=")[1].strip().lower() == "true"
+                    elif line.startswith("PROFILE_OUTPUT="):
+                        self.profile_output = line.split("=")[1].strip()
+                    elif line.startswith("CHART_WINDOW="):
+                        self.chart_window = float(line.split("=")[1].strip())
+                    elif line.startswith("CAPTURE="):
+                        self.capture = line.split("=")[1].strip().lower() == "true"
+                    elif line.startswith("CAPTURE_OUTPUT="):
+                        self.capture_output = line.split("=")[1].strip()
+                    elif line.startswith("CAPTURE_FORMAT="):
+                        self.capture_format = line.split("=")[1].strip().lower()
+                    elif line.startswith("STREAM="):
+                        self.stream = line.split("=")[1].strip().lower() == "true"
+                    elif line.startswith("STREAM_HOST="):
+                        self.stream_host = line.split("=")[1].strip()
+                    elif line.startswith("STREAM_PORT="):
+                        self.stream_port = int(line.split("=")[1].strip())
+                    elif line.startswith("STREAM_RESOLUTION="):
+                        res = line.split("=")[1].strip().split("x")
+                        self.stream_resolution = (int(res[0]), int(res[1]))
+                    elif line.startswith("STREAM_FPS="):
+                        self.stream_fps = float(line.split("=")[1].strip())
+                    elif line.startswith("STREAM_QUALITY="):
+                        self.stream_quality = int(line.split("=")[1].strip())
+                    elif line.startswith("MAP_TILES="):
+                        self.map_tiles = line.split("=", 1)[1].strip()
+                    elif line.startswith("MAP_ZOOM="):
+                        self.map_zoom = int(line.split("=")[1].strip())
+                    elif line.startswith("MAP_CENTER="):
+                        center = line.split("=")[1].strip().split(",")
+                        self.map_center = (float(center[0]), float(center[1]))
+                    elif line.startswith("MAP_CACHE="):
+                        self.map_cache = int(line.split("=")[1].strip())
+                    elif line.startswith("VIDEO_SOURCE="):
+                        self.video_source = line.split("=", 1)[1].strip()
+                    elif line.startswith("VIDEO_FPS="):
+                        self.video_fps = float(line.split("=")[1].strip())
+                    elif line.startswith("GEOFENCE_RADIUS="):
+                        self.geofence_radius = float(line.split("=")[1].strip())
+                    elif line.startswith("GEOFENCE_CEILING="):
+                        self.geofence_ceiling = float(line.split("=")[1].strip())
+                    elif line.startswith("GEOFENCE_POLYGON="):
+                        points = line.split("=")[1].strip()
+                        self.geofence_polygon = tuple(
+                            tuple(float(v) for v in point.split(","))
+                            for point in points.split(";")
+                            if point
+                        )
+                    elif line.startswith("HISTORY_MEMORY="):
+                        self.history_memory = float(line.split("=")[1].strip())
+                    elif line.startswith("HISTORY_SPILL_DIR="):
+                        self.history_spill_dir = line.split("=", 1)[1].strip()
                     elif line.startswith("JOYSTICK="):
                         self.joystick = int(line.split("=")[1].strip())
                     elif line.startswith("FILTER_THRESHOLD="):
@@ -128,6 +245,35 @@ class Config:
                 f.write(f"FPS={self.fps}\n")
                 f.write(f"RESOLUTION={self.resolution[0]}x{self.resolution[1]}\n")
                 f.write(f"FULLSCREEN={'true' if self.fullscreen else 'false'}\n")
+                f.write(f"FAST_GL={'true' if self.fast_gl else 'false'}\n")
+                f.write(
+                    f"ADAPTIVE_QUALITY={'true' if self.adaptive_quality else 'false'}\n"
+                )
+                f.write(f"IDLE_MODE={'true' if self.idle_mode else 'false'}\n")
+                f.write(f"IDLE_HEARTBEAT={self.idle_heartbeat}\n")
+                f.write(f"PROFILE={'true' if self.profile else 'false'}\n")
+                f.write(f"PROFILE_OUTPUT={self.profile_output}\n")
+                f.write(f"CHART_WINDOW={self.chart_window}\n")
+                f.write(f"CAPTURE={'true' if self.capture else 'false'}\n")
+                f.write(f"CAPTURE_OUTPUT={self.capture_output}\n")
+                f.write(f"CAPTURE_FORMAT={self.capture_format}\n")
+                f.write(f"STREAM={'true' if self.stream else 'false'}\n")
+                f.write(f"STREAM_HOST={self.stream_host}\n")
+                f.write(f"STREAM_PORT={self.stream_port}\n")
+                f.write(f"STREAM_RESOLUTION={self.stream_resolution[0]}x{self.stream_resolution[1]}\n")
+                f.write(f"STREAM_FPS={self.stream_fps}\n")
+                f.write(f"STREAM_QUALITY={self.stream_quality}\n")
+                f.write(f"MAP_TILES={self.map_tiles}\n")
+                f.write(f"MAP_ZOOM={self.map_zoom}\n")
+                f.write(f"MAP_CENTER={self.map_center[0]},{self.map_center[1]}\n")
+                f.write(f"MAP_CACHE={self.map_cache}\n")
+                f.write(f"VIDEO_SOURCE={self.video_source}\n")
+                f.write(f"VIDEO_FPS={self.video_fps}\n")
+                f.write(f"GEOFENCE_RADIUS={self.geofence_radius}\n")
+                f.write(f"GEOFENCE_CEILING={self.geofence_ceiling}\n")
+                f.write(f"GEOFENCE_POLYGON={';'.join(f'{lat},{lon}' for lat, lon in self.geofence_polygon)}\n")
+                f.write(f"HISTORY_MEMORY={self.history_memory}\n")
+                f.write(f"HISTORY_SPILL_DIR={self.history_spill_dir}\n")
                 f.write(f"JOYSTICK={self.joystick}\n")
                 f.write(f"FILTER_THRESHOLD={self.filter_threshold}\n")
                 f.write(f"FILTER_FACTOR={self.filter_factor}\n")
@@ -143,6 +289,35 @@ class Config:
             f.write(f"FPS={self.fps}\n")
             f.write(f"RESOLUTION={self.resolution[0]}x{self.resolution[1]}\n")
             f.write(f"FULLSCREEN={'true' if self.fullscreen else 'false'}\n")
+            f.write(f"FAST_GL={'true' if self.fast_gl else 'false'}\n")
+            f.write(
+                f"ADAPTIVE_QUALITY={'true' if self.adaptive_quality else 'false'}\n"
+            )
+            f.write(f"IDLE_MODE={'true' if self.idle_mode else 'false'}\n")
+            f.write(f"IDLE_HEARTBEAT={self.idle_heartbeat}\n")
+            f.write(f"PROFILE={'true' if self.profile else 'false'}\n")
+            f.write(f"PROFILE_OUTPUT={self.profile_output}\n")
+            f.write(f"CHART_WINDOW={self.chart_window}\n")
+            f.write(f"CAPTURE={'true' if self.capture else 'false'}\n")
+            f.write(f"CAPTURE_OUTPUT={self.capture_output}\n")
+            f.write(f"CAPTURE_FORMAT={self.capture_format}\n")
+            f.write(f"STREAM={'true' if self.stream else 'false'}\n")
+            f.write(f"STREAM_HOST={self.stream_host}\n")
+            f.write(f"STREAM_PORT={self.stream_port}\n")
+            f.write(f"STREAM_RESOLUTION={self.stream_resolution[0]}x{self.stream_resolution[1]}\n")
+            f.write(f"STREAM_FPS={self.stream_fps}\n")
+            f.write(f"STREAM_QUALITY={self.stream_quality}\n")
+            f.write(f"MAP_TILES={self.map_tiles}\n")
+            f.write(f"MAP_ZOOM={self.map_zoom}\n")
+            f.write(f"MAP_CENTER={self.map_center[0]},{self.map_center[1]}\n")
+            f.write(f"MAP_CACHE={self.map_cache}\n")
+            f.write(f"VIDEO_SOURCE={self.video_source}\n")
+            f.write(f"VIDEO_FPS={self.video_fps}\n")
+            f.write(f"GEOFENCE_RADIUS={self.geofence_radius}\n")
+            f.write(f"GEOFENCE_CEILING={self.geofence_ceiling}\n")
+            f.write(f"GEOFENCE_POLYGON={';'.join(f'{lat},{lon}' for lat, lon in self.geofence_polygon)}\n")
+            f.write(f"HISTORY_MEMORY={self.history_memory}\n")
+            f.write(f"HISTORY_SPILL_DIR={self.history_spill_dir}\n")
             f.write(f"JOYSTICK=0\n")
             f.write(f"FILTER_THRESHOLD={self.filter_threshold}\n")
             f.write(f"FILTER_FACTOR={self.filter_factor}\n")
@@ -384,6 +559,19 @@ class visualizerSettings(tk.Frame):
         )
         fullscreen_checkbutton.grid(row=3, column=0, columnspan=2, pady=5)
 
+        # Fast GL Setting (skips per-call OpenGL error checking). PyOpenGL
+        # reads it when OpenGL.GL is first imported, which is when the
+        # launcher starts, so it needs a full restart of the launcher
+        self.fast_gl_var = tk.BooleanVar()
+        fast_gl_checkbutton = tk.Checkbutton(
+            self,
+            text="Fast GL (no error checking, requires full restart)",
+            variable=self.fast_gl_var,
+            bg="black",
+            fg="#ffffff",
+        )
+        fast_gl_checkbutton.grid(row=4, column=0, columnspan=2, pady=5)
+
         save_button = ttk.Button(self, text="Save Settings", command=self.save_settings)
         save_button.grid(row=5, column=0, columnspan=2, pady=10)
         back_button = ttk.Button(
@@ -418,9 +606,18 @@ class visualizerSettings(tk.Frame):
         config.fps = fps
         config.resolution = resolution
         config.fullscreen = fullscreen
+        fast_gl_changed = config.fast_gl != self.fast_gl_var.get()
+        config.fast_gl = self.fast_gl_var.get()
 
         config.save_to_file()
 
+        # Apply the new settings to a running visualizer
+        visualizer.restart_visualizer()
+        if fast_gl_changed:
+            messagebox.showinfo(
+                "Fast GL", "Restart the launcher for the Fast GL setting to apply."
+            )
+
     def load_settings(self):
         self.fps_entry.insert(0, str(config.fps))
 
@@ -437,6 +634,7 @@ class visualizerSettings(tk.Frame):
 
         self.resolution_combobox.set(resolution_str)
         self.fullscreen_var.set(config.fullscreen)
+        self.fast_gl_var.set(config.fast_gl)
 
 
 class JoystickSettings(tk.Frame):
@@ -0,0 +1,169 @@
+import functools
+import math
+from collections import namedtuple
+
+# The HUD was designed at this resolution; widget sizes scale from it
+REFERENCE_RESOLUTION = (1920, 1200)
+
+Rect = namedtuple("Rect", ["x", "y", "width", "height"])
+
+# A widget is drawn in design coordinates (the reference resolution) inside
+# design_rect, and composited onto rect in window coordinates
+Placement = namedtuple("Placement", ["rect", "design_rect"])
+
+
+class Layout:
+    """
+    Geometry of every HUD widget for one window resolution.
+
+    Widgets are anchored at fractions of the window like before, their size
+    scales with ui_scale. Drawing code keeps using the fixed design
+    coordinates in the attributes below, the HUD maps them to the window.
+    """
+
+    def __init__(self, resolution):
+        width, height = resolution
+        ref_width, ref_height = REFERENCE_RESOLUTION
+        self.resolution = resolution
+        self.ui_scale = min(width / ref_width, height / ref_height)
+
+        # Bottom panel below the line 60% down the screen
+        self.panel_top = int(0.4 * height)
+        self.divider_x = 0.2 * width
+        self.scene = Rect(0, self.panel_top, width, height - self.panel_top)
+
+        # Design coordinates of the widgets
+        self.horizon_center = ((ref_width // 2) - 200, int(0.2 * ref_height) + 30)
+        self.horizon_radius = 150
+        self.pitch_slider = (0.75 * ref_width, 0.2 * ref_height, 40, 300)
+        self.roll_slider = (0.6 * ref_width, 0.15 * ref_height, 300, 40)
+        self.yaw_slider = (0.6 * ref_width, 0.25 * ref_height, 300, 40)
+
+        # Status block and FPS line are drawn 1:1 in window coordinates
+        self.status_y = int(0.35 * height) + 37
+        self.fps_position = (10, height - 20)
+
+        self.placements = {}
+
+        # Dividers
+        self.placements["horizontal_divider"] = self._unscaled(
+            Rect(0, self.panel_top - 1, width, 2)
+        )
+        self.placements["vertical_divider"] = self._unscaled(
+            Rect(self.divider_x - 1, 0, 2, self.panel_top)
+        )
+
+        # Horizon, with room for the pitch labels on the left and the yaw
+        # labels below
+        horizon_x, horizon_y = self.horizon_center
+        radius = self.horizon_radius
+        self.placements["horizon"] = self._scaled(
+            self.horizon_center,
+            (
+                (width // 2) - 200 * self.ui_scale,
+                int(0.2 * height) + 30 * self.ui_scale,
+            ),
+            Rect(
+                horizon_x - radius - 110,
+                horizon_y - radius - 80,
+                radius + 110 + max(radius, 190),
+                radius + 80 + max(radius, 180),
+            ),
+        )
+
+        # Pitch Slider
+        pitch_x, pitch_y = self.pitch_slider[:2]
+        pitch_anchor = (0.75 * width, 0.2 * height)
+        self.placements["pitch_scale"] = self._scaled(
+            (pitch_x, pitch_y),
+            pitch_anchor,
+            Rect(pitch_x - 95, pitch_y - 160, 100, 320),
+        )
+        self.placements["pitch_value"] = self._scaled(
+            (pitch_x, pitch_y),
+            pitch_anchor,
+            Rect(pitch_x - 95, pitch_y - 160, 100, 340),
+        )
+
+        # Roll and Yaw Sliders
+        for name, slider, anchor in (
+            ("roll", self.roll_slider, (0.6 * width, 0.15 * height)),
+            ("yaw", self.yaw_slider, (0.6 * width, 0.25 * height)),
+        ):
+            slider_x, slider_y = slider[:2]
+            self.placements[name + "_scale"] = self._scaled(
+                (slider_x, slider_y),
+                anchor,
+                Rect(slider_x - 180, slider_y - 70, 360, 75),
+            )
+            self.placements[name + "_value"] = self._scaled(
+                (slider_x, slider_y),
+                anchor,
+                Rect(slider_x - 180, slider_y - 45, 360, 75),
+            )
+
+        # Strip chart in the free space right of the pitch slider, drawn 1:1
+        # so the history keeps its resolution in pixels
+        self.strip_chart = align_rect(
+            Rect(0.79 * width, 0.03 * height, 0.19 * width, 0.33 * height)
+        )
+        self.placements["strip_chart"] = self._unscaled(self.strip_chart)
+
+        # Status labels start at x=300, past the divider on small screens.
+        # Seven rows: the connections and the flight path figures
+        self.placements["status"] = self._unscaled(
+            Rect(0, self.status_y - 95, max(0.2 * width, 340), 115)
+        )
+
+    def _unscaled(self, rect):
+        rect = align_rect(rect)
+        return Placement(rect, rect)
+
+    def _scaled(self, design_anchor, anchor, design_rect):
+        """
+        Place design_rect, drawn around design_anchor, so that the anchor
+        lands on the window position anchor. The window rectangle is
+        aligned to whole pixels and the design rectangle adjusted to match,
+        so layers composite without resampling offsets.
+        """
+        scale = self.ui_scale
+        rect = align_rect(
+            Rect(
+                anchor[0] + (design_rect.x - design_anchor[0]) * scale,
+                anchor[1] + (design_rect.y - design_anchor[1]) * scale,
+                design_rect.width * scale,
+                design_rect.height * scale,
+            )
+        )
+        return Placement(
+            rect,
+            Rect(
+                design_anchor[0] + (rect.x - anchor[0]) / scale,
+                design_anchor[1] + (rect.y - anchor[1]) / scale,
+                rect.width / scale,
+                rect.height / scale,
+            ),
+        )
+
+
+def align_rect(rect):
+    """
+    Align a rectangle to whole pixels so HUD layers composite 1:1.
+    """
+    x, y, width, height = rect
+    left, bottom = math.floor(x), math.floor(y)
+    return Rect(
+        left,
+        bottom,
+        math.ceil(x + width) - left,
+        math.ceil(y + height) - bottom,
+    )
+
+
+@functools.lru_cache(maxsize=8)
+def compute_layout(resolution):
+    """
+    Return the Layout for a resolution. Layouts are cached, so switching back
+    and forth between window sizes does not recompute them.
+    """
+    return Layout(tuple(resolution))
@@ -0,0 +1,296 @@
+import io
+import math
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from PIL import Image
+from asset_cache import upload_texture
+from batch_renderer import batch
+from gpu_resources import resources, TEXTURE
+
+DEBUG = "Visualizer: "
+
+TILE_SIZE = 256
+
+# Decoded tiles uploaded per frame at most, the rest wait for the next one
+MAX_UPLOADS_PER_FRAME = 4
+
+# Seconds of travel ahead of the current position that are prefetched
+PREFETCH_SECONDS = 3.0
+
+# Request priorities, lower is loaded first
+VISIBLE, AHEAD, NEIGHBOUR = 0, 1, 2
+
+
+def world_pixel(latitude, longitude, zoom):
+    """
+    Web Mercator pixel coordinates of a position at zoom, x to the east and
+    y to the south, as used by the tile numbering.
+    """
+    size = TILE_SIZE * 2**zoom
+    latitude = max(-85.0511, min(85.0511, latitude))
+    phi = math.radians(latitude)
+    x = (longitude + 180.0) / 360.0 * size
+    y = (1.0 - math.log(math.tan(phi) + 1.0 / math.cos(phi)) / math.pi) / 2.0 * size
+    return x, y
+
+
+class TileLoader:
+    """
+    Reads and decodes tiles from an MBTiles file on a background thread.
+
+    The thread owns its SQLite connection. Requests are served in priority
+    order; the ones no longer wanted when their turn comes are skipped.
+    Decoded tiles are collected from the results queue by the render
+    thread, which does the uploads. Every request gets a result, None for
+    tiles that are not in the file or cannot be read, so none stays
+    pending. failed is set when the file cannot be opened as MBTiles.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.requests = queue.PriorityQueue()
+        self.results = queue.Queue()
+        self.wanted = set()
+        self.sequence = 0
+        self.failed = False
+        self.thread = threading.Thread(target=self._run, name="map tiles", daemon=True)
+        self.thread.start()
+
+    def request(self, key, priority):
+        self.sequence += 1
+        self.requests.put((priority, self.sequence, key))
+
+    def _run(self):
+        connection = None
+        try:
+            connection = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+            # Opening is lazy, a file that is not a database fails here
+            connection.execute("SELECT 1 FROM tiles LIMIT 1").fetchall()
+        except sqlite3.Error as e:
+            print(DEBUG + f"Could not open map tiles {self.path}: {e}")
+            self.failed = True
+            if connection is not None:
+                connection.close()
+            return
+        while True:
+            _, _, key = self.requests.get()
+            if key is None:
+                break
+            if key not in self.wanted:
+                self.results.put((key, False))
+                continue
+            try:
+                pixels = self._load(connection, key)
+            except sqlite3.Error as e:
+                print(DEBUG + f"Could not read map tile {key}: {e}")
+                pixels = None
+            self.results.put((key, pixels))
+        connection.close()
+
+    def _load(self, connection, key):
+        zoom, x, y = key
+        # MBTiles rows count from the south (TMS), tile y from the north
+        row = connection.execute(
+            "SELECT tile_data FROM tiles"
+            " WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?",
+            (zoom, x, 2**zoom - 1 - y),
+        ).fetchone()
+        if row is None:
+            return None
+        try:
+            image = Image.open(io.BytesIO(row[0])).convert("RGBA")
+        except (OSError, ValueError, Image.DecompressionBombError) as e:
+            print(DEBUG + f"Could not decode map tile {key}: {e}")
+            return None
+        return np.asarray(image.transpose(Image.FLIP_TOP_BOTTOM), dtype=np.uint8)
+
+    def close(self):
+        self.requests.put((-1, 0, None))
+        self.thread.join()
+
+
+class TileCache:
+    """
+    Least recently used GPU textures of map tiles, keyed by (zoom, x, y).
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.textures = OrderedDict()
+
+    def __contains__(self, key):
+        return key in self.textures
+
+    def __len__(self):
+        return len(self.textures)
+
+    def get(self, key):
+        texture = self.textures.get(key)
+        if texture is not None:
+            self.textures.move_to_end(key)
+        return texture
+
+    def put(self, key, texture):
+        self.textures[key] = texture
+        self.textures.move_to_end(key)
+        while len(self.textures) > self.capacity:
+            _, evicted = self.textures.popitem(last=False)
+            resources.release(TEXTURE, evicted)
+
+    def clear(self):
+        for texture in self.textures.values():
+            resources.release(TEXTURE, texture)
+        self.textures.clear()
+
+
+class MapUnderlay:
+    """
+    Map tiles from a local MBTiles file drawn under the 3D scene, centred
+    on the current position.
+
+    Tiles are read and decoded on a TileLoader thread and uploaded a few
+    per frame, so the render loop never waits for the database or the
+    decoder. Missing tiles are simply not drawn until they arrive. Besides
+    the visible tiles, the ones the position will reach within
+    PREFETCH_SECONDS at the current velocity are requested, then the ring
+    of neighbours around the view.
+    """
+
+    def __init__(self, path, zoom=15, capacity=128):
+        self.zoom = zoom
+        self.loader = TileLoader(path)
+        self.cache = TileCache(capacity)
+        # Tiles requested and not back yet, and tiles not in the file
+        self.pending = set()
+        self.missing = set()
+        self.last_position = None
+        self.velocity = (0.0, 0.0)
+
+    @property
+    def loading(self):
+        """
+        True while requested tiles have not been uploaded yet.
+        """
+        return bool(self.pending) and not self.loader.failed
+
+    def _track(self, x, y, now):
+        # Smoothed velocity in world pixels per second
+        if self.last_position is not None:
+            last_x, last_y, last_time = self.last_position
+            elapsed = now - last_time
+            if elapsed > 0:
+                vx = (x - last_x) / elapsed
+                vy = (y - last_y) / elapsed
+                self.velocity = (
+                    self.velocity[0] + 0.2 * (vx - self.velocity[0]),
+                    self.velocity[1] + 0.2 * (vy - self.velocity[1]),
+                )
+        self.last_position = (x, y, now)
+
+    def _tile_range(self, center_x, center_y, width, height, margin=0):
+        # Tile x is not wrapped here, a view across the antimeridian needs
+        # to place the tiles on either side
+        first_x = math.floor((center_x - width / 2) / TILE_SIZE) - margin
+        last_x = math.floor((center_x + width / 2) / TILE_SIZE) + margin
+        first_y = math.floor((center_y - height / 2) / TILE_SIZE) - margin
+        last_y = math.floor((center_y + height / 2) / TILE_SIZE) + margin
+        count = 2**self.zoom
+        return [
+            (tx, ty)
+            for ty in range(max(first_y, 0), min(last_y, count - 1) + 1)
+            for tx in range(first_x, last_x + 1)
+        ]
+
+    def _key(self, tx, ty):
+        return (self.zoom, tx % 2**self.zoom, ty)
+
+    def _collect(self):
+        # Upload what the loader decoded, a few tiles per frame
+        for _ in range(MAX_UPLOADS_PER_FRAME):
+            try:
+                key, pixels = self.loader.results.get_nowait()
+            except queue.Empty:
+                break
+            self.pending.discard(key)
+            if pixels is None:
+                self.missing.add(key)
+            elif pixels is not False and key not in self.cache:
+                texture = upload_texture(pixels, mipmaps=False, name="map tile")
+                self.cache.put(key, texture)
+
+    def update(self, latitude, longitude, width, height, now=None):
+        """
+        Upload finished tiles and request the ones needed around the
+        position for a view of width x height pixels. Returns the visible
+        tiles as (x, y) tile numbers.
+        """
+        now = time.monotonic() if now is None else now
+        x, y = world_pixel(latitude, longitude, self.zoom)
+        self._track(x, y, now)
+        self._collect()
+
+        visible = self._tile_range(x, y, width, height)
+        ahead_x = x + self.velocity[0] * PREFETCH_SECONDS
+        ahead_y = y + self.velocity[1] * PREFETCH_SECONDS
+        ahead = self._tile_range(ahead_x, ahead_y, width, height)
+        neighbours = self._tile_range(x, y, width, height, margin=1)
+
+        wanted = {}
+        for priority, tiles in (
+            (NEIGHBOUR, neighbours),
+            (AHEAD, ahead),
+            (VISIBLE, visible),
+        ):
+            for tx, ty in tiles:
+                wanted[self._key(tx, ty)] = priority
+        if self.loader.failed:
+            # Nothing will come back, the map stays empty
+            self.pending.clear()
+            return visible
+        self.loader.wanted = set(wanted)
+        for key, priority in sorted(wanted.items(), key=lambda item: item[1]):
+            if key in self.cache or key in self.pending or key in self.missing:
+                continue
+            self.pending.add(key)
+            self.loader.request(key, priority)
+        return visible
+
+    def draw(self, rect, latitude, longitude, now=None):
+        """
+        Draw the tiles covering rect (x, y, width, height) in the current
+        window-pixel projection, the position at its centre.
+        """
+        x, y, width, height = rect
+        visible = self.update(latitude, longitude, width, height, now)
+        center_x, center_y = world_pixel(latitude, longitude, self.zoom)
+        screen_x = x + width / 2
+        screen_y = y + height / 2
+
+        batch.color(1, 1, 1, 1)
+        for tx, ty in visible:
+            texture = self.cache.get(self._key(tx, ty))
+            if texture is None:
+                continue
+            # Tile space grows to the south, the window upwards
+            left = screen_x + tx * TILE_SIZE - center_x
+            top = screen_y - (ty * TILE_SIZE - center_y)
+            batch.quad(
+                (
+                    (left, top - TILE_SIZE),
+                    (left + TILE_SIZE, top - TILE_SIZE),
+                    (left + TILE_SIZE, top),
+                    (left, top),
+                ),
+                ((0, 0), (1, 0), (1, 1), (0, 1)),
+                texture,
+            )
+        batch.flush()
+
+    def release(self):
+        self.loader.close()
+        self.cache.clear()
+        self.pending.clear()
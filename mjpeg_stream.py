@@ -0,0 +1,202 @@
+import io
+import queue
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from PIL import Image
+from frame_capture import frame_image, CLOSE_TIMEOUT
+
+DEBUG = "Visualizer: "
+
+BOUNDARY = "hudframe"
+
+INDEX_PAGE = b"""<!DOCTYPE html>
+<html>
+<head><title>Visualizer</title></head>
+<body style="margin:0;background:#000">
+<img src="/stream" style="width:100%;height:100vh;object-fit:contain">
+</body>
+</html>
+"""
+
+
+class StreamHandler(BaseHTTPRequestHandler):
+    """
+    Serves the viewer page on /, the MJPEG stream on /stream and the latest
+    frame on /frame.jpg.
+    """
+
+    def do_GET(self):
+        stream = self.server.stream
+        if self.path == "/":
+            self._send(200, "text/html", INDEX_PAGE)
+        elif self.path == "/frame.jpg":
+            sequence, frame = stream.latest()
+            if frame is None:
+                self._send(503, "text/plain", b"No frame yet\n")
+            else:
+                self._send(200, "image/jpeg", frame)
+        elif self.path == "/stream":
+            self._stream(stream)
+        else:
+            self._send(404, "text/plain", b"Not found\n")
+
+    def _send(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream(self, stream):
+        self.send_response(200)
+        self.send_header(
+            "Content-Type", f"multipart/x-mixed-replace; boundary={BOUNDARY}"
+        )
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+
+        # Every client waits for the newest frame on its own, so a slow
+        # client skips frames without holding up the others
+        client = f"{self.client_address[0]}:{self.client_address[1]}"
+        print(DEBUG + f"Stream client {client} connected")
+        sent = skipped = 0
+        sequence = 0
+        try:
+            while True:
+                latest, frame = stream.wait(sequence, timeout=1.0)
+                if frame is None:
+                    if stream.closed:
+                        break
+                    continue
+                if sequence:
+                    skipped += latest - sequence - 1
+                sequence = latest
+                self.wfile.write(
+                    f"--{BOUNDARY}\r\n"
+                    f"Content-Type: image/jpeg\r\n"
+                    f"Content-Length: {len(frame)}\r\n\r\n".encode()
+                )
+                self.wfile.write(frame)
+                self.wfile.write(b"\r\n")
+                sent += 1
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        print(
+            DEBUG
+            + f"Stream client {client} disconnected, "
+            + f"{sent} frames sent, {skipped} skipped"
+        )
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MjpegStream:
+    """
+    Local HTTP server publishing the HUD as an MJPEG stream.
+
+    The render loop hands frames over through the capture encoder interface
+    (full, submit, close): scaled to the stream resolution and read back by
+    a FrameCapture with it as the output size, then JPEG encoded on the
+    encoder thread. Only the
+    newest encoded frame is kept, clients always get the latest one.
+    """
+
+    def __init__(self, host="127.0.0.1", port=8080, resolution=(960, 600), quality=80):
+        self.resolution = tuple(resolution)
+        self.quality = quality
+        self.closed = False
+        self.sequence = 0
+        self.frame = None
+        self.condition = threading.Condition()
+
+        self.frames = queue.Queue(1)
+        self.encoder = threading.Thread(
+            target=self._encode, name="stream encoder", daemon=True
+        )
+        self.encoder.start()
+
+        self.server = ThreadingHTTPServer((host, port), StreamHandler)
+        self.server.daemon_threads = True
+        self.server.stream = self
+        self.thread = threading.Thread(
+            target=self.server.serve_forever, name="stream server", daemon=True
+        )
+        self.thread.start()
+        print(DEBUG + f"Streaming the HUD on http://{host}:{port}/")
+
+    @property
+    def full(self):
+        return self.frames.full()
+
+    def submit(self, index, pixels, timestamp=None):
+        # Streamed frames go out as they come, the timestamp is not needed
+        try:
+            self.frames.put_nowait(pixels)
+            return True
+        except queue.Full:
+            return False
+
+    def _encode(self):
+        while True:
+            pixels = self.frames.get()
+            if pixels is None:
+                break
+            try:
+                image = frame_image(pixels).convert("RGB")
+                # Frames from a capture of another size are scaled here
+                if image.size != self.resolution:
+                    image = image.resize(self.resolution, Image.BILINEAR)
+                data = io.BytesIO()
+                image.save(data, "JPEG", quality=self.quality)
+            except (OSError, ValueError) as e:
+                print(DEBUG + f"Could not encode stream frame: {e}")
+                continue
+            self.publish(data.getvalue())
+
+    def publish(self, frame):
+        with self.condition:
+            self.sequence += 1
+            self.frame = frame
+            self.condition.notify_all()
+
+    def latest(self):
+        with self.condition:
+            return self.sequence, self.frame
+
+    def wait(self, sequence, timeout=None):
+        """
+        Wait for a frame newer than sequence. Returns (sequence, frame), the
+        frame None on timeout or when the stream closed.
+        """
+        with self.condition:
+            self.condition.wait_for(
+                lambda: self.sequence > sequence or self.closed, timeout
+            )
+            if self.sequence > sequence and not self.closed:
+                return self.sequence, self.frame
+            return self.sequence, None
+
+    def close(self):
+        """
+        The capture is finished with the stream; the server keeps serving
+        the last frame until shutdown().
+        """
+
+    def shutdown(self):
+        """
+        Stop the encoder and the server and disconnect the clients.
+        """
+        # Drop the frame waiting to be encoded, so the end marker fits even
+        # if the encoder thread is gone, and never wait for it unbounded
+        try:
+            self.frames.get_nowait()
+        except queue.Empty:
+            pass
+        self.frames.put_nowait(None)
+        self.encoder.join(CLOSE_TIMEOUT)
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,309 @@
+import ctypes
+import math
+from collections import namedtuple
+import numpy as np
+from OpenGL.GL import *
+from gpu_resources import resources, BUFFER
+
+# Path points per chunk; consecutive chunks share their boundary point
+CHUNK_POINTS = 1024
+
+# Ramer-Douglas-Peucker tolerance of each level of detail in metres, level
+# 0 is every point
+LOD_TOLERANCES = (0.0, 0.25, 1.0, 4.0, 16.0)
+
+# Largest error of the chosen level on screen, in pixels
+LOD_PIXELS = 1.0
+
+# Scene units per metre: the drone model is 2 units across, 100 m of path
+# span the width of the scene
+PATH_SCALE = 0.05
+
+PATH_COLOR = (1.0, 0.85, 0.2)
+
+# A closed chunk of the path, ready to upload:
+#   index      position of the chunk along the path
+#   origin     metres east, north and up the vertices are relative to
+#   center     centre of the bounding sphere, relative to home
+#   radius     radius of the bounding sphere in metres
+#   vertices   float32 (n, 3) scene-axis vertices of all levels, one after
+#              the other
+#   levels     (first, count) of each level in vertices
+PathChunk = namedtuple(
+    "PathChunk", ["index", "origin", "center", "radius", "vertices", "levels"]
+)
+
+
+def simplify(points, tolerance):
+    """
+    Ramer-Douglas-Peucker: the subset of points, first and last always
+    kept, from which no dropped point is further than tolerance. The
+    distances of a whole span are computed at once.
+    """
+    count = len(points)
+    if count < 3 or tolerance <= 0:
+        return points
+    keep = np.zeros(count, dtype=bool)
+    keep[0] = keep[-1] = True
+    spans = [(0, count - 1)]
+    while spans:
+        first, last = spans.pop()
+        if last - first < 2:
+            continue
+        start = points[first]
+        direction = points[last] - start
+        length = direction @ direction
+        offsets = points[first + 1 : last] - start
+        if length > 0:
+            along = np.clip(offsets @ direction / length, 0.0, 1.0)
+            offsets = offsets - along[:, None] * direction
+        distances = np.einsum("ij,ij->i", offsets, offsets)
+        farthest = int(distances.argmax())
+        if distances[farthest] > tolerance * tolerance:
+            index = first + 1 + farthest
+            keep[index] = True
+            spans.append((first, index))
+            spans.append((index, last))
+    return points[keep]
+
+
+def scene_axes(positions):
+    """
+    East, north, up metres to the scene's OpenGL axes: east is +X, up +Y
+    and north -Z.
+    """
+    return np.stack((positions[:, 0], positions[:, 2], -positions[:, 1]), axis=1)
+
+
+def build_chunk(index, positions):
+    """
+    A PathChunk of the points, with every level of detail.
+    """
+    low = positions.min(axis=0)
+    high = positions.max(axis=0)
+    center = (low + high) / 2
+    radius = float(np.linalg.norm(high - low) / 2)
+    origin = positions[0]
+    local = positions - origin
+
+    levels = []
+    parts = []
+    first = 0
+    simplified = local
+    for tolerance in LOD_TOLERANCES:
+        # Each level is simplified from the previous one, which is already
+        # a fraction of the size
+        simplified = simplify(simplified, tolerance)
+        parts.append(scene_axes(simplified))
+        levels.append((first, len(simplified)))
+        first += len(simplified)
+    vertices = np.concatenate(parts).astype(np.float32)
+    return PathChunk(index, origin, center, radius, vertices, tuple(levels))
+
+
+class PathChunker:
+    """
+    Cuts the growing flight path into chunks of CHUNK_POINTS points and
+    precomputes their levels of detail, on the compute worker.
+
+    chunks only grows; the ones below a published count never change, so
+    the render thread reads them without a lock.
+    """
+
+    def __init__(self):
+        self.chunks = []
+
+    def update(self, path):
+        """
+        Close the chunks the path has filled. Returns the number of closed
+        chunks.
+        """
+        positions = path.positions
+        while len(positions) > (len(self.chunks) + 1) * CHUNK_POINTS:
+            index = len(self.chunks)
+            start = index * CHUNK_POINTS
+            chunk = build_chunk(index, positions[start : start + CHUNK_POINTS + 1])
+            self.chunks.append(chunk)
+        return len(self.chunks)
+
+
+def perspective(fovy, aspect, near, far):
+    """
+    The projection matrix gluPerspective sets, for column vectors.
+    """
+    f = 1 / math.tan(math.radians(fovy) / 2)
+    return np.array(
+        [
+            [f / aspect, 0, 0, 0],
+            [0, f, 0, 0],
+            [0, 0, (far + near) / (near - far), 2 * far * near / (near - far)],
+            [0, 0, -1, 0],
+        ]
+    )
+
+
+def frustum_planes(matrix):
+    """
+    The six planes (a, b, c, d) of the view frustum of a projection times
+    modelview matrix, normalised so a x + b y + c z + d is the distance,
+    positive inside.
+    """
+    rows = matrix
+    planes = np.array(
+        [
+            rows[3] + rows[0],
+            rows[3] - rows[0],
+            rows[3] + rows[1],
+            rows[3] - rows[1],
+            rows[3] + rows[2],
+            rows[3] - rows[2],
+        ]
+    )
+    return planes / np.linalg.norm(planes[:, :3], axis=1)[:, None]
+
+
+class PathRenderer:
+    """
+    Draws the flight path in the 3D scene, centred on the current position.
+
+    Closed chunks are uploaded once into their own vertex buffer, every
+    level of detail in it; only the open tail chunk is uploaded again as the
+    path grows. Each frame the chunks outside the view frustum are culled
+    and the others drawn at the coarsest level whose error stays under
+    LOD_PIXELS on screen at their distance from the camera.
+    """
+
+    def __init__(self, chunker):
+        self.chunker = chunker
+        self.buffers = []
+        self.tail = None
+        self.tail_count = 0
+        self.tail_origin = None
+        self.current = None
+        # Bounding spheres of the uploaded chunks, for culling them at once
+        self.centers = np.empty((0, 3))
+        self.radii = np.empty(0)
+        self.drawn = 0
+
+    def update(self, path, chunks):
+        """
+        Upload the chunks closed since the last frame and the tail of path,
+        a PathSnapshot, if it grew.
+        """
+        count = len(path.times)
+        if not count:
+            self.current = None
+            return
+        self.current = path.positions[count - 1]
+
+        if chunks > len(self.buffers):
+            new = self.chunker.chunks[len(self.buffers) : chunks]
+            for chunk in new:
+                self.buffers.append(self._upload(None, chunk.vertices, "path chunk"))
+            self.centers = np.concatenate(
+                (self.centers, [chunk.center for chunk in new])
+            )
+            self.radii = np.concatenate((self.radii, [chunk.radius for chunk in new]))
+            self.tail_count = 0
+
+        start = chunks * CHUNK_POINTS
+        if count - start != self.tail_count:
+            points = path.positions[start:count]
+            self.tail_origin = points[0]
+            vertices = scene_axes(points - self.tail_origin).astype(np.float32)
+            self.tail = self._upload(self.tail, vertices, "path tail")
+            self.tail_count = count - start
+
+    def _upload(self, buffer, vertices, name):
+        if buffer is None:
+            buffer = glGenBuffers(1)
+            glBindBuffer(GL_ARRAY_BUFFER, buffer)
+            glBufferData(GL_ARRAY_BUFFER, vertices, GL_STATIC_DRAW)
+            resources.add(BUFFER, buffer, vertices.nbytes, name)
+        else:
+            # The tail is replaced whole, with fresh storage so the draw of
+            # the last frame does not have to finish first
+            glBindBuffer(GL_ARRAY_BUFFER, buffer)
+            glBufferData(GL_ARRAY_BUFFER, vertices, GL_STREAM_DRAW)
+            resources.resize(BUFFER, buffer, vertices.nbytes)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        return buffer
+
+    def _visible(self, modelview, projection, pixels_per_unit):
+        # Chunk indices in the frustum and the level to draw each at, from
+        # the bounding spheres of all chunks at once
+        if not len(self.centers):
+            return [], []
+        centers = self.centers - self.current
+        planes = frustum_planes(projection @ modelview)
+        homogeneous = np.hstack(
+            (scene_axes(centers) * PATH_SCALE, np.ones((len(centers), 1)))
+        )
+        inside = (homogeneous @ planes.T >= -self.radii[:, None] * PATH_SCALE).all(1)
+
+        eye = homogeneous[inside] @ modelview.T
+        distance = np.maximum(
+            np.linalg.norm(eye[:, :3], axis=1) - self.radii[inside] * PATH_SCALE,
+            1e-3,
+        )
+        # Error on screen of each tolerance at each chunk's distance
+        pixels_per_metre = pixels_per_unit * PATH_SCALE / distance
+        errors = np.asarray(LOD_TOLERANCES)[None, :] * pixels_per_metre[:, None]
+        levels = (errors <= LOD_PIXELS).sum(axis=1) - 1
+        return np.flatnonzero(inside), levels
+
+    def draw(self, modelview, projection, viewport_height, fovy):
+        """
+        Draw the path. modelview and projection are the scene's matrices
+        in scene units, as numpy arrays, which the path is scaled into.
+        """
+        if self.current is None:
+            return
+        pixels_per_unit = viewport_height / 2 / math.tan(math.radians(fovy) / 2)
+        visible, levels = self._visible(modelview, projection, pixels_per_unit)
+
+        glPushMatrix()
+        glScaled(PATH_SCALE, PATH_SCALE, PATH_SCALE)
+        glEnable(GL_DEPTH_TEST)
+        glDisable(GL_TEXTURE_2D)
+        glColor3f(*PATH_COLOR)
+        glLineWidth(2.0)
+        glEnableClientState(GL_VERTEX_ARRAY)
+
+        self.drawn = 0
+        for index, level in zip(visible, levels):
+            chunk = self.chunker.chunks[index]
+            first, count = chunk.levels[level]
+            self._draw_strip(self.buffers[index], chunk.origin, first, count)
+        if self.tail is not None and self.tail_count > 1:
+            self._draw_strip(self.tail, self.tail_origin, 0, self.tail_count)
+
+        glDisableClientState(GL_VERTEX_ARRAY)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glLineWidth(1.0)
+        glColor4f(1, 1, 1, 1)
+        glEnable(GL_TEXTURE_2D)
+        glDisable(GL_DEPTH_TEST)
+        glPopMatrix()
+
+    def _draw_strip(self, buffer, origin, first, count):
+        # Vertices are relative to their origin; the offset to the current
+        # position is applied in double precision
+        offset = scene_axes((origin - self.current)[None, :])[0]
+        glPushMatrix()
+        glTranslated(*offset)
+        glBindBuffer(GL_ARRAY_BUFFER, buffer)
+        glVertexPointer(3, GL_FLOAT, 0, ctypes.c_void_p(0))
+        glDrawArrays(GL_LINE_STRIP, first, count)
+        glPopMatrix()
+        self.drawn += count
+
+    def release(self):
+        for buffer in self.buffers:
+            resources.release(BUFFER, buffer)
+        if self.tail is not None:
+            resources.release(BUFFER, self.tail)
+        self.buffers = []
+        self.tail = None
+        self.centers = np.empty((0, 3))
+        self.radii = np.empty(0)
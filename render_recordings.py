@@ -0,0 +1,219 @@
+"""
+Offline HUD rendering of recorded flights.
+
+Renders the HUD at fixed intervals across each recording and writes the
+frames as thumbnails plus one contact sheet per recording:
+
+    python render_recordings.py recordings/*.csv --interval 10 --output review
+
+A recording is a CSV file with a header row: a timestamp column in seconds
+and one column per joystick field (axis_0, axis_1, ...), as published by
+the joystick process. Recordings are spread over a pool of processes, each
+with its own offscreen GL context.
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# Render without a display: SDL's offscreen driver, with EGL providing the
+# GL context (Mesa's software rasterizer when there is no GPU)
+os.environ.setdefault("SDL_VIDEODRIVER", "offscreen")
+if sys.platform.startswith("linux"):
+    os.environ.setdefault("PYOPENGL_PLATFORM", "egl")
+
+import numpy as np
+import pygame
+from pygame.locals import DOUBLEBUF, OPENGL, HIDDEN
+from PIL import Image, ImageDraw
+from visualizer import OffscreenHud, ATTITUDE_AXES, CHART_CHANNELS
+from strip_chart import StripChart
+
+DEBUG = "Batch render: "
+
+# Height of the time label under each thumbnail on the contact sheet
+LABEL_HEIGHT = 16
+
+# Offscreen HUD of the worker process, created by init_worker
+_hud = None
+
+
+def load_recording(path):
+    """
+    Read a recording. Returns the timestamps and a dict of channel name to
+    values, both as arrays sorted by time.
+    """
+    with open(path) as f:
+        names = f.readline().strip().split(",")
+    data = np.loadtxt(path, delimiter=",", skiprows=1, ndmin=2)
+    if "timestamp" not in names:
+        raise ValueError(f"{path}: no timestamp column")
+    order = np.argsort(data[:, names.index("timestamp")], kind="stable")
+    data = data[order]
+    channels = {name: data[:, i] for i, name in enumerate(names)}
+    return channels.pop("timestamp"), channels
+
+
+def frame_times(times, interval):
+    """
+    Times of the frames rendered from a recording, every interval seconds
+    from its first sample.
+    """
+    return np.arange(times[0], times[-1] + 1e-9, interval)
+
+
+def recording_attitude(times, channels, at):
+    """
+    Roll, pitch and yaw at the times in at, interpolated like the live
+    input. Returns an (n, 3) array.
+    """
+    return np.stack(
+        [np.interp(at, times, channels[axis]) * scale for axis, scale in ATTITUDE_AXES],
+        axis=1,
+    )
+
+
+def init_worker(resolution):
+    """
+    Pool initializer: open an offscreen GL context and the HUD renderer of
+    this process.
+    """
+    global _hud
+    # Assets are loaded relative to the repository
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    pygame.init()
+    # Frames go to an offscreen target, the window only provides a context
+    pygame.display.set_mode((64, 64), DOUBLEBUF | OPENGL | HIDDEN)
+    _hud = OffscreenHud(resolution)
+
+
+def render_recording(path, output, interval, thumbnail_size, columns):
+    """
+    Render one recording with the worker's HUD. Writes the thumbnails to
+    output/<name>/ and the contact sheet to output/<name>.png. Returns
+    (name, frames, seconds spent rendering).
+    """
+    name = os.path.splitext(os.path.basename(path))[0]
+    start = time.perf_counter()
+    times, channels = load_recording(path)
+    at = frame_times(times, interval)
+    attitudes = recording_attitude(times, channels, at)
+
+    # The strip chart spans the whole flight and is fed the samples up to
+    # each frame
+    chart = None
+    if all(channel in channels for channel in CHART_CHANNELS):
+        window = max(times[-1] - times[0], interval)
+        chart = StripChart(CHART_CHANNELS, window=window, start_time=times[0])
+        chart_values = np.stack([channels[c] for c in CHART_CHANNELS], axis=1)
+    _hud.chart = chart
+
+    thumbnail_dir = os.path.join(output, name)
+    os.makedirs(thumbnail_dir, exist_ok=True)
+    thumbnails = []
+    sample = 0
+    for t, attitude in zip(at, attitudes):
+        if chart is not None:
+            end = np.searchsorted(times, t, side="right")
+            for i in range(sample, end):
+                chart.append(times[i], chart_values[i])
+            sample = end
+        elapsed = t - times[0]
+        pixels = _hud.render(tuple(attitude), f"{name}  T+{elapsed:.1f} s", now=t)
+        # Box-reduce first, then filter: half the cost of a plain Lanczos
+        thumbnail = Image.fromarray(pixels).resize(
+            thumbnail_size, Image.LANCZOS, reducing_gap=2.0
+        )
+        # Named by milliseconds, intervals can be below a second
+        thumbnail.save(
+            os.path.join(thumbnail_dir, f"t_{round(elapsed * 1000):09d}ms.png")
+        )
+        thumbnails.append((elapsed, thumbnail))
+
+    if chart is not None:
+        chart.release()
+    _hud.chart = None
+
+    contact_sheet(thumbnails, thumbnail_size, columns).save(
+        os.path.join(output, name + ".png")
+    )
+    return name, len(thumbnails), time.perf_counter() - start
+
+
+def contact_sheet(thumbnails, thumbnail_size, columns):
+    """
+    Grid of (elapsed seconds, image) thumbnails, each labelled with its time.
+    """
+    width, height = thumbnail_size
+    cell_height = height + LABEL_HEIGHT
+    rows = max(1, -(-len(thumbnails) // columns))
+    sheet = Image.new("RGB", (columns * width, rows * cell_height))
+    draw = ImageDraw.Draw(sheet)
+    for i, (elapsed, thumbnail) in enumerate(thumbnails):
+        x = (i % columns) * width
+        y = (i // columns) * cell_height
+        sheet.paste(thumbnail, (x, y))
+        minutes, seconds = divmod(int(elapsed), 60)
+        draw.text((x + 4, y + height + 2), f"{minutes}:{seconds:02d}", fill="white")
+    return sheet
+
+
+def parse_size(text):
+    width, height = text.lower().split("x")
+    return (int(width), int(height))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("recordings", nargs="+", help="recording CSV files")
+    parser.add_argument("--output", default="review")
+    parser.add_argument(
+        "--interval", type=float, default=10.0, help="seconds between frames"
+    )
+    parser.add_argument("--resolution", type=parse_size, default=(1920, 1200))
+    parser.add_argument("--thumbnail", type=parse_size, default=(480, 300))
+    parser.add_argument("--columns", type=int, default=6)
+    parser.add_argument(
+        "--workers", type=int, default=os.cpu_count(), help="rendering processes"
+    )
+    args = parser.parse_args(argv)
+
+    output = os.path.abspath(args.output)
+    os.makedirs(output, exist_ok=True)
+    tasks = [
+        (os.path.abspath(path), output, args.interval, args.thumbnail, args.columns)
+        for path in args.recordings
+    ]
+    workers = max(1, min(args.workers, len(tasks)))
+
+    # Fresh interpreters, a forked process must not inherit a GL context
+    context = multiprocessing.get_context("spawn")
+    start = time.perf_counter()
+    frames = 0
+    busy = 0.0
+    # A worker that crashes in GL code fails the batch instead of hanging it
+    with ProcessPoolExecutor(
+        workers, context, initializer=init_worker, initargs=(args.resolution,)
+    ) as pool:
+        futures = [pool.submit(render_recording, *task) for task in tasks]
+        for future in as_completed(futures):
+            name, count, seconds = future.result()
+            frames += count
+            busy += seconds
+            print(DEBUG + f"{name}: {count} frames, {count / seconds:.1f} frames/s")
+    elapsed = time.perf_counter() - start
+
+    print(
+        DEBUG
+        + f"{len(tasks)} recordings, {frames} frames in {elapsed:.1f} s "
+        + f"with {workers} workers: {frames / elapsed:.1f} frames/s, "
+        + f"{frames / busy:.1f} frames/s per core"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
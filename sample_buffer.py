@@ -0,0 +1,107 @@
+import numpy as np
+
+
+class SampleBuffer:
+    """
+    Timestamped samples of a few channels, e.g. joystick axes, that can be
+    read at any time in between.
+
+    Producers push samples at whatever rate they run; the renderer asks for
+    the values at the time the frame will be presented. Between samples the
+    values are interpolated linearly. Past the newest sample they follow the
+    last slope for half of max_extrapolation seconds and ease back to the
+    newest value by its end, then hold it: input that stops changing is not
+    published again, so an overshoot would never be corrected. Extrapolated
+    values are clipped to limits, (low, high), when given.
+    """
+
+    def __init__(self, channels, capacity=64, max_extrapolation=0.1, limits=None):
+        self.channels = list(channels)
+        self.max_extrapolation = max_extrapolation
+        self.limits = limits
+        self.times = np.empty(capacity, dtype=np.float64)
+        self.values = np.empty((capacity, len(self.channels)), dtype=np.float64)
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def latest_time(self):
+        return self.times[self.count - 1] if self.count else None
+
+    def push(self, timestamp, values):
+        """
+        Add a sample. values is a sequence in channel order, or a dict with
+        the channel names as keys. Samples not newer than the latest one are
+        ignored.
+        """
+        if self.count and timestamp <= self.times[self.count - 1]:
+            return False
+        if isinstance(values, dict):
+            values = [values[channel] for channel in self.channels]
+
+        if self.count == len(self.times):
+            # Keep the newer half, old samples are never read again
+            half = self.count // 2
+            self.times[:half] = self.times[self.count - half : self.count]
+            self.values[:half] = self.values[self.count - half : self.count]
+            self.count = half
+
+        self.times[self.count] = timestamp
+        self.values[self.count] = values
+        self.count += 1
+        return True
+
+    def copy(self):
+        """
+        An independent copy holding the same samples, e.g. to hand to
+        another thread.
+        """
+        other = SampleBuffer.__new__(SampleBuffer)
+        other.channels = self.channels
+        other.max_extrapolation = self.max_extrapolation
+        other.limits = self.limits
+        other.times = self.times[: self.count].copy()
+        other.values = self.values[: self.count].copy()
+        other.count = self.count
+        return other
+
+    def sample(self, t):
+        """
+        Values of all channels at time t as an array, or None while the
+        buffer is empty.
+        """
+        if not self.count:
+            return None
+        times = self.times[: self.count]
+        values = self.values[: self.count]
+
+        if t <= times[0]:
+            return values[0].copy()
+
+        if t >= times[-1]:
+            elapsed = t - times[-1]
+            if self.count < 2 or elapsed >= self.max_extrapolation:
+                return values[-1].copy()
+            # Along the slope of the last two samples and back
+            elapsed = min(elapsed, self.max_extrapolation - elapsed)
+            slope = (values[-1] - values[-2]) / (times[-1] - times[-2])
+            extrapolated = values[-1] + slope * elapsed
+            if self.limits is not None:
+                np.clip(extrapolated, *self.limits, out=extrapolated)
+            return extrapolated
+
+        after = np.searchsorted(times, t, side="right")
+        before = after - 1
+        fraction = (t - times[before]) / (times[after] - times[before])
+        return values[before] + (values[after] - values[before]) * fraction
+
+    def settling(self, t):
+        """
+        True while sample(t) can still change without new samples, i.e. t
+        is inside the extrapolation window of the newest sample.
+        """
+        return (
+            self.count >= 2 and t < self.times[self.count - 1] + self.max_extrapolation
+        )
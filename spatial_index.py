@@ -0,0 +1,148 @@
+import numpy as np
+
+
+class GridIndex:
+    """
+    Uniform grid over the horizontal positions of a growing point array,
+    e.g. the flight path, for nearest point queries.
+
+    Each cell holds the indices of the points in it as one array. update()
+    adds the new rows a batch at a time: they are grouped by cell with one
+    sort, so there is no per-point Python object.
+    """
+
+    def __init__(self, cell_size=10.0, max_rings=64):
+        self.cell_size = cell_size
+        self.max_rings = max_rings
+        self.cells = {}
+        self.positions = np.empty((0, 3))
+        self.count = 0
+
+    def _cells(self, points):
+        return np.floor(points[:, :2] / self.cell_size).astype(np.int64)
+
+    def update(self, positions):
+        """
+        Index the rows of positions added since the last update. positions
+        must be the same array grown, or a view of it like
+        FlightPath.positions.
+        """
+        self.positions = positions
+        if len(positions) <= self.count:
+            return
+        start = self.count
+        cells = self._cells(positions[start:])
+        order = np.lexsort((cells[:, 1], cells[:, 0]))
+        cells = cells[order]
+        indices = order + start
+        # Boundaries of the runs of equal cells
+        change = np.flatnonzero((np.diff(cells, axis=0) != 0).any(axis=1)) + 1
+        for first, last in zip(
+            np.concatenate(([0], change)), np.concatenate((change, [len(cells)]))
+        ):
+            key = (int(cells[first, 0]), int(cells[first, 1]))
+            run = indices[first:last]
+            existing = self.cells.get(key)
+            self.cells[key] = (
+                run if existing is None else np.concatenate((existing, run))
+            )
+        self.count = len(positions)
+
+    def nearest(self, point, first=0, last=None):
+        """
+        The indexed point nearest to point among indices first to last
+        (exclusive), as (distance, index), or None when there is none within
+        max_rings cells.
+        """
+        last = self.count if last is None else last
+        if first >= last:
+            return None
+        point = np.asarray(point, dtype=np.float64)
+        cx, cy = self._cells(point[None, :])[0]
+        best = None
+        for ring in range(self.max_rings + 1):
+            # Points in this ring are at least ring - 1 cells away
+            if best is not None and best[0] <= (ring - 1) * self.cell_size:
+                break
+            candidates = [
+                self.cells[key] for key in _ring(cx, cy, ring) if key in self.cells
+            ]
+            if not candidates:
+                continue
+            indices = np.concatenate(candidates)
+            indices = indices[(indices >= first) & (indices < last)]
+            if not len(indices):
+                continue
+            offsets = self.positions[indices] - point
+            distances = np.einsum("ij,ij->i", offsets, offsets)
+            closest = int(distances.argmin())
+            distance = float(np.sqrt(distances[closest]))
+            if best is None or distance < best[0]:
+                best = (distance, int(indices[closest]))
+        return best
+
+
+def _ring(cx, cy, ring):
+    # Cells at Chebyshev distance ring from (cx, cy)
+    if ring == 0:
+        yield (cx, cy)
+        return
+    for x in range(cx - ring, cx + ring + 1):
+        yield (x, cy - ring)
+        yield (x, cy + ring)
+    for y in range(cy - ring + 1, cy + ring):
+        yield (cx - ring, y)
+        yield (cx + ring, y)
+
+
+class LapTracker:
+    """
+    Splits a path into laps around its first point: a lap ends when the
+    drone comes back within radius metres of it after having been more
+    than twice as far away.
+    """
+
+    def __init__(self, radius=15.0):
+        self.radius = radius
+        self.starts = [0]
+        self.away = False
+        self.count = 0
+
+    @property
+    def lap(self):
+        """
+        Number of the current lap, from 1.
+        """
+        return len(self.starts)
+
+    @property
+    def previous(self):
+        """
+        (first, last) indices of the previous lap, None during the first.
+        """
+        if len(self.starts) < 2:
+            return None
+        first = self.starts[-2]
+        return first, self.starts[-1]
+
+    def update(self, positions):
+        if len(positions) <= self.count:
+            return
+        start = self.count
+        offsets = positions[start:, :2] - positions[0, :2]
+        distances = np.hypot(offsets[:, 0], offsets[:, 1])
+        self.count = len(positions)
+
+        # Find the transitions a whole batch at a time
+        i = 0
+        while i < len(distances):
+            if self.away:
+                found = np.flatnonzero(distances[i:] < self.radius)
+            else:
+                found = np.flatnonzero(distances[i:] > 2 * self.radius)
+            if not len(found):
+                break
+            i += int(found[0])
+            if self.away:
+                self.starts.append(start + i)
+            self.away = not self.away
@@ -0,0 +1,240 @@
+import ctypes
+import numpy as np
+from OpenGL.GL import *
+from batch_renderer import batch
+from gpu_resources import resources, BUFFER
+
+# Line colours of the channels, cycled when there are more channels
+CHANNEL_COLORS = (
+    (1.0, 0.3, 0.3),
+    (0.3, 1.0, 0.3),
+    (0.4, 0.6, 1.0),
+    (1.0, 1.0, 0.3),
+    (1.0, 0.4, 1.0),
+    (0.3, 1.0, 1.0),
+)
+
+# Fraction of the half height used by a value of 1.0
+VERTICAL_MARGIN = 0.9
+
+
+class StripChart:
+    """
+    Scrolling history of a few channels with values in [-1, 1].
+
+    The window is split into fixed time buckets. Each bucket is reduced to
+    one point per channel with the largest-triangle-three-buckets rule: the
+    sample forming the largest triangle with the point chosen for the
+    previous bucket and the average of the next bucket. A bucket is reduced
+    once the next one is complete, so the newest samples are drawn as a
+    short tail straight from the latest input.
+
+    Reduced points are written into a ring-buffered vertex buffer, one ring
+    per channel, and only the new vertices are uploaded. Scrolling is a
+    translation, so drawing costs the same for any window length.
+    """
+
+    def __init__(self, channels, window=600.0, points=720, start_time=0.0):
+        self.channels = list(channels)
+        self.window = window
+        self.points = points
+        self.bucket_seconds = window / points
+        self.start_time = start_time
+
+        # One extra vertex per ring repeats vertex 0, so the strip drawn
+        # from the ring head to the end joins the strip from 0 to the head
+        self.vertices = np.zeros((len(self.channels), points + 1, 2), np.float32)
+        self.head = 0
+        self.count = 0
+        self.dirty = []
+
+        self.bucket = 0
+        self.current = []
+        self.pending = None
+        self.previous = None
+        self.latest = None
+        self.vbo = None
+
+    def append(self, timestamp, values):
+        """
+        Add a sample, values in channel order.
+        """
+        self.advance(timestamp)
+        sample = (timestamp - self.start_time, np.asarray(values, dtype=np.float64))
+        self.current.append(sample)
+        self.latest = sample
+
+    def advance(self, now):
+        """
+        Close the buckets that ended before now. Buckets without samples
+        hold the latest value, input only arrives when it changes.
+        """
+        bucket = int((now - self.start_time) // self.bucket_seconds)
+        if self.bucket >= bucket:
+            return
+        if self.current:
+            self._close_bucket()
+            self.bucket += 1
+        if self.latest is None:
+            self.bucket = bucket
+            return
+
+        # Buckets further back than the window scroll out unseen
+        self.bucket = max(self.bucket, bucket - self.points - 2)
+        while self.bucket < bucket:
+            self.current.append((self.bucket * self.bucket_seconds, self.latest[1]))
+            self._close_bucket()
+            self.bucket += 1
+
+    def _close_bucket(self):
+        times = np.array([t for t, _ in self.current])
+        values = np.array([v for _, v in self.current])
+        self.current = []
+
+        if self.pending is not None:
+            self._commit(*self._reduce(*self.pending, times.mean(), values.mean(0)))
+        elif self.previous is None:
+            # The very first bucket: start the line at its first sample
+            self._commit(np.full(len(self.channels), times[0]), values[0])
+        self.pending = (times, values)
+
+    def _reduce(self, times, values, next_time, next_value):
+        """
+        Pick one sample per channel from a bucket, the one with the largest
+        triangle area between the previous point and the next bucket's
+        average.
+        """
+        previous_time, previous_value = self.previous
+        # Twice the triangle area, for every sample (rows) and channel
+        area = np.abs(
+            (previous_time - next_time) * (values - previous_value)
+            - (previous_time[None, :] - times[:, None]) * (next_value - previous_value)
+        )
+        chosen = area.argmax(axis=0)
+        channels = np.arange(len(self.channels))
+        return times[chosen], values[chosen, channels]
+
+    def _commit(self, times, values):
+        self.previous = (times, values)
+        self.vertices[:, self.head, 0] = times
+        self.vertices[:, self.head, 1] = values
+        self.dirty.append(self.head)
+        if self.head == 0:
+            self.vertices[:, self.points] = self.vertices[:, 0]
+            self.dirty.append(self.points)
+        self.head = (self.head + 1) % self.points
+        self.count = min(self.count + 1, self.points)
+
+    def _upload(self):
+        if self.vbo is None:
+            self.vbo = glGenBuffers(1)
+            glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+            glBufferData(GL_ARRAY_BUFFER, self.vertices, GL_DYNAMIC_DRAW)
+            resources.add(BUFFER, self.vbo, self.vertices.nbytes, "strip chart")
+            self.dirty = []
+            return
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+        if not self.dirty:
+            return
+
+        # Upload the changed vertices, as contiguous runs per channel
+        self.dirty.sort()
+        runs = []
+        start = previous = self.dirty[0]
+        for index in self.dirty[1:]:
+            if index != previous + 1:
+                runs.append((start, previous + 1))
+                start = index
+            previous = index
+        runs.append((start, previous + 1))
+
+        stride = (self.points + 1) * 8
+        for channel in range(len(self.channels)):
+            for first, last in runs:
+                glBufferSubData(
+                    GL_ARRAY_BUFFER,
+                    channel * stride + first * 8,
+                    self.vertices[channel, first:last],
+                )
+        self.dirty = []
+
+    def draw(self, rect, now):
+        """
+        Draw the history into rect (x, y, width, height) in the current
+        projection, the newest samples at the right edge.
+        """
+        self.advance(now)
+        if self.count == 0 and self.latest is None:
+            return
+        x, y, width, height = rect
+
+        batch.flush()
+        self._upload()
+
+        # Clip to the chart, in window pixels of the current viewport
+        viewport = glGetIntegerv(GL_VIEWPORT)
+        projection = glGetDoublev(GL_PROJECTION_MATRIX)
+        scale_x = viewport[2] * projection[0][0] / 2
+        scale_y = viewport[3] * projection[1][1] / 2
+        left = viewport[0] + (projection[3][0] + 1) * viewport[2] / 2
+        bottom = viewport[1] + (projection[3][1] + 1) * viewport[3] / 2
+        glEnable(GL_SCISSOR_TEST)
+        glScissor(
+            int(left + x * scale_x),
+            int(bottom + y * scale_y),
+            int(width * scale_x + 1),
+            int(height * scale_y + 1),
+        )
+
+        # Chart time and value to screen, scrolling is only this transform
+        pixels_per_second = width / self.window
+        glPushMatrix()
+        glTranslatef(
+            x + width - (now - self.start_time) * pixels_per_second,
+            y + height / 2,
+            0,
+        )
+        glScalef(pixels_per_second, VERTICAL_MARGIN * height / 2, 1)
+
+        glDisable(GL_TEXTURE_2D)
+        glEnableClientState(GL_VERTEX_ARRAY)
+        stride = (self.points + 1) * 8
+        for channel in range(len(self.channels)):
+            glColor3f(*CHANNEL_COLORS[channel % len(CHANNEL_COLORS)])
+            glVertexPointer(2, GL_FLOAT, 0, ctypes.c_void_p(channel * stride))
+            if self.count < self.points:
+                glDrawArrays(GL_LINE_STRIP, 0, self.count)
+            else:
+                glDrawArrays(GL_LINE_STRIP, self.head, self.points + 1 - self.head)
+                if self.head:
+                    glDrawArrays(GL_LINE_STRIP, 0, self.head)
+        glDisableClientState(GL_VERTEX_ARRAY)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glEnable(GL_TEXTURE_2D)
+
+        # Tail from the last reduced point to the latest sample
+        if self.previous is not None and self.latest is not None:
+            latest_time, latest_value = self.latest
+            for channel in range(len(self.channels)):
+                batch.color(*CHANNEL_COLORS[channel % len(CHANNEL_COLORS)])
+                batch.line(
+                    self.previous[0][channel],
+                    self.previous[1][channel],
+                    latest_time,
+                    latest_value[channel],
+                )
+                batch.line(
+                    latest_time,
+                    latest_value[channel],
+                    now - self.start_time,
+                    latest_value[channel],
+                )
+            batch.flush()
+
+        glPopMatrix()
+        glDisable(GL_SCISSOR_TEST)
+
+    def release(self):
+        if self.vbo is not None:
+            resources.release(BUFFER, self.vbo)
+            self.vbo = None
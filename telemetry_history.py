@@ -0,0 +1,366 @@
+import tempfile
+from collections import namedtuple
+import numpy as np
+
+# Bucket lengths in seconds of the rolled up tiers, finest first
+ROLLUP_SECONDS = (1.0, 10.0, 60.0)
+
+# Share of the memory ceiling held by the full rate tier; the rest is split
+# evenly between the rolled up tiers
+RAW_SHARE = 0.5
+
+# Fewest rows a tier keeps in memory, whatever the ceiling
+MIN_ROWS = 16
+
+# Live samples staged before they are added in one batch
+STAGE_SIZE = 256
+
+# Samples of a time window at one resolution:
+#   resolution  bucket length in seconds, 0 for the full rate samples
+#   times       sample times, or bucket start times
+#   minimum     (n, channels) smallest value in each bucket
+#   maximum     (n, channels) largest value in each bucket
+#   mean        (n, channels) average of each bucket
+# At full rate minimum, maximum and mean are the same array.
+HistoryWindow = namedtuple(
+    "HistoryWindow", ["resolution", "times", "minimum", "maximum", "mean"]
+)
+
+
+class SpillFile:
+    """
+    Append-only rows on disk, a memory-mapped times file and one of values.
+    The files grow by doubling; the pages are the operating system's to
+    keep or drop, so they do not count against the memory ceiling.
+
+    The files are anonymous temporary files, removed by the operating
+    system when they are closed or the process ends, however it ends.
+    """
+
+    def __init__(self, directory, name, columns, capacity=4096):
+        self.columns = columns
+        self.count = 0
+        self.files = [
+            tempfile.TemporaryFile(prefix=f"{name}-", suffix=suffix, dir=directory)
+            for suffix in (".times", ".values")
+        ]
+        self.times = None
+        self.values = None
+        self._map(capacity)
+
+    def _map(self, capacity):
+        self.capacity = capacity
+        if self.times is not None:
+            self.times.flush()
+            self.values.flush()
+        self.times = np.memmap(self.files[0], np.float64, "r+", shape=(capacity,))
+        self.values = np.memmap(
+            self.files[1], np.float64, "r+", shape=(capacity, self.columns)
+        )
+
+    def append(self, times, values):
+        needed = self.count + len(times)
+        if needed > self.capacity:
+            capacity = self.capacity
+            while capacity < needed:
+                capacity *= 2
+            self._map(capacity)
+        self.times[self.count : needed] = times
+        self.values[self.count : needed] = values
+        self.count = needed
+
+    @property
+    def nbytes(self):
+        return self.count * 8 * (1 + self.columns)
+
+    def close(self):
+        self.times = self.values = None
+        for file in self.files:
+            file.close()
+
+
+class Tier:
+    """
+    Rows of one resolution: the newest in memory, up to capacity, the older
+    ones spilled to disk, or dropped without a spill directory.
+
+    When the memory rows are full the older half is spilled at once and the
+    newer half moved to the front, so spilling is amortised O(1) per row.
+    """
+
+    def __init__(self, resolution, columns, capacity, spill_dir, name):
+        self.resolution = resolution
+        self.times = np.empty(capacity)
+        self.values = np.empty((capacity, columns))
+        self.count = 0
+        self.spill = None
+        if spill_dir is not None:
+            self.spill = SpillFile(spill_dir, name, columns)
+        self.dropped = 0
+
+    @property
+    def nbytes(self):
+        return self.times.nbytes + self.values.nbytes
+
+    @property
+    def used_bytes(self):
+        return self.count * (self.times.itemsize + self.values[0].nbytes)
+
+    @property
+    def first_time(self):
+        if self.spill is not None and self.spill.count:
+            return self.spill.times[0]
+        return self.times[0] if self.count else None
+
+    def append(self, times, values):
+        capacity = len(self.times)
+        while len(times):
+            if self.count == capacity:
+                half = self.count // 2
+                if self.spill is not None:
+                    self.spill.append(self.times[:half], self.values[:half])
+                else:
+                    self.dropped += half
+                self.times[: self.count - half] = self.times[half : self.count]
+                self.values[: self.count - half] = self.values[half : self.count]
+                self.count -= half
+            n = min(len(times), capacity - self.count)
+            self.times[self.count : self.count + n] = times[:n]
+            self.values[self.count : self.count + n] = values[:n]
+            self.count += n
+            times, values = times[n:], values[n:]
+
+    def _parts(self, start, end):
+        # (times, values) slices with times in [start, end], disk first
+        parts = []
+        if self.spill is not None and self.spill.count:
+            parts.append((self.spill.times[: self.spill.count], self.spill.values))
+        parts.append((self.times[: self.count], self.values))
+        for times, values in parts:
+            first = np.searchsorted(times, start, side="left")
+            last = np.searchsorted(times, end, side="right")
+            yield times[first:last], values[first:last]
+
+    def count_between(self, start, end):
+        return sum(len(times) for times, _ in self._parts(start, end))
+
+    def rows(self, start, end):
+        """
+        Times and values of the rows with times in [start, end], from disk
+        and memory.
+        """
+        parts = list(self._parts(start, end))
+        return (
+            np.concatenate([times for times, _ in parts]),
+            np.concatenate([values for _, values in parts]),
+        )
+
+    def close(self):
+        if self.spill is not None:
+            self.spill.close()
+
+
+class TelemetryHistory:
+    """
+    The history of a few telemetry channels over a whole session, in
+    bounded memory.
+
+    Samples are kept at full rate and rolled up into buckets of each of
+    ROLLUP_SECONDS holding the minimum, maximum and mean of every channel.
+    Each tier keeps its newest rows in memory and spills older ones to
+    memory-mapped files in spill_dir. The memory rows of all tiers are
+    allocated up front from memory_limit bytes, so the history never holds
+    more, however long the session. query() returns a time window at the
+    finest resolution that fits a number of points.
+
+    Batches, e.g. of a recording, go through extend(); append() stages
+    single live samples and adds them a block at a time.
+    """
+
+    def __init__(
+        self,
+        channels,
+        memory_limit=64 * 1024 * 1024,
+        spill_dir=None,
+        rollups=ROLLUP_SECONDS,
+    ):
+        self.channels = list(channels)
+        self.memory_limit = memory_limit
+        self.spill_dir = spill_dir
+        count = len(self.channels)
+
+        self.stage = np.empty((STAGE_SIZE, 1 + count))
+        self.staged = 0
+        self.latest_time = None
+
+        # Memory rows of each tier from its share of the ceiling
+        budget = memory_limit - self.stage.nbytes
+        raw_budget = budget * (RAW_SHARE if rollups else 1.0)
+        rollup_budget = (budget - raw_budget) / max(len(rollups), 1)
+        self.tiers = [Tier(0.0, count, self._rows(raw_budget, count), spill_dir, "raw")]
+        for seconds in rollups:
+            self.tiers.append(
+                Tier(
+                    seconds,
+                    3 * count,
+                    self._rows(rollup_budget, 3 * count),
+                    spill_dir,
+                    f"{seconds:g}s",
+                )
+            )
+        # Open bucket of each rollup tier: (bucket, count, minimum, maximum,
+        # sum), None before the first sample
+        self.open = [None] * len(rollups)
+
+    @staticmethod
+    def _rows(budget, columns):
+        return max(int(budget // (8 * (1 + columns))), MIN_ROWS)
+
+    @property
+    def memory_bytes(self):
+        """
+        Bytes of memory allocated by the tiers and the stage, at most
+        memory_limit.
+        """
+        return sum(tier.nbytes for tier in self.tiers) + self.stage.nbytes
+
+    @property
+    def disk_bytes(self):
+        return sum(tier.spill.nbytes for tier in self.tiers if tier.spill is not None)
+
+    def append(self, timestamp, values):
+        """
+        Stage one live sample, values in channel order. It is added when
+        the stage is full, or on flush() or query().
+        """
+        if self.staged == STAGE_SIZE:
+            self.flush()
+        row = self.stage[self.staged]
+        row[0] = timestamp
+        row[1:] = values
+        self.staged += 1
+
+    def flush(self):
+        if not self.staged:
+            return
+        block = self.stage[: self.staged]
+        self.staged = 0
+        self.extend(block[:, 0], block[:, 1:])
+
+    def extend(self, times, values):
+        """
+        Add arrays of samples: times (n,) and values (n, channels). Samples
+        not newer than the latest one are dropped.
+        """
+        times = np.asarray(times, dtype=np.float64)
+        values = np.asarray(values, dtype=np.float64).reshape(len(times), -1)
+        if self.latest_time is not None:
+            keep = times > self.latest_time
+            times, values = times[keep], values[keep]
+        # Out of order samples inside the batch are dropped too
+        if len(times) > 1:
+            keep = np.concatenate(
+                ([True], times[1:] > np.maximum.accumulate(times)[:-1])
+            )
+            times, values = times[keep], values[keep]
+        if not len(times):
+            return
+        self.latest_time = times[-1]
+        self.tiers[0].append(times, values)
+        for i, tier in enumerate(self.tiers[1:]):
+            self._roll_up(i, tier, times, values)
+
+    def _roll_up(self, i, tier, times, values):
+        # Reduce the batch per bucket at once, merge the first bucket into
+        # the open one and close every bucket but the last
+        buckets = np.floor(times / tier.resolution)
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(buckets)) + 1))
+        counts = np.diff(np.append(starts, len(times)))
+        minimum = np.minimum.reduceat(values, starts, axis=0)
+        maximum = np.maximum.reduceat(values, starts, axis=0)
+        sums = np.add.reduceat(values, starts, axis=0)
+        buckets = buckets[starts]
+
+        open_bucket = self.open[i]
+        closed = []
+        if open_bucket is not None:
+            bucket, count, low, high, total = open_bucket
+            if bucket == buckets[0]:
+                counts[0] += count
+                minimum[0] = np.minimum(minimum[0], low)
+                maximum[0] = np.maximum(maximum[0], high)
+                sums[0] += total
+            else:
+                closed.append((bucket, np.concatenate((low, high, total / count))))
+        self.open[i] = (buckets[-1], counts[-1], minimum[-1], maximum[-1], sums[-1])
+
+        rows = np.hstack((minimum[:-1], maximum[:-1], sums[:-1] / counts[:-1, None]))
+        times = buckets[:-1] * tier.resolution
+        if closed:
+            bucket, row = closed[0]
+            times = np.concatenate(([bucket * tier.resolution], times))
+            rows = np.vstack((row[None, :], rows))
+        if len(times):
+            tier.append(times, rows)
+
+    def _open_row(self, i):
+        bucket, count, low, high, total = self.open[i]
+        return (
+            bucket * self.tiers[i + 1].resolution,
+            np.concatenate((low, high, total / count)),
+        )
+
+    def query(self, start, end, max_points=1000):
+        """
+        The samples between times start and end as a HistoryWindow, at the
+        finest resolution with at most max_points rows that still holds the
+        start of the window; the coarsest tier when none does.
+        """
+        self.flush()
+        chosen = len(self.tiers) - 1
+        for i, tier in enumerate(self.tiers):
+            first = tier.first_time
+            if first is None or tier.dropped and first > start:
+                # Empty, or the start of the window was dropped
+                continue
+            # The bucket holding start begins up to a bucket earlier
+            if tier.count_between(start - tier.resolution, end) <= max_points:
+                chosen = i
+                break
+        tier = self.tiers[chosen]
+        times, values = tier.rows(start - tier.resolution, end)
+        if not tier.resolution:
+            return HistoryWindow(0.0, times, values, values, values)
+
+        if self.open[chosen - 1] is not None:
+            time, row = self._open_row(chosen - 1)
+            if start - tier.resolution <= time <= end:
+                times = np.append(times, time)
+                values = np.vstack((values, row[None, :]))
+        count = len(self.channels)
+        return HistoryWindow(
+            tier.resolution,
+            times,
+            values[:, :count],
+            values[:, count : 2 * count],
+            values[:, 2 * count :],
+        )
+
+    def report(self):
+        raw = self.tiers[0]
+        samples = raw.count + raw.dropped + self.staged
+        if raw.spill is not None:
+            samples += raw.spill.count
+        return (
+            f"{samples} samples, "
+            f"{sum(tier.used_bytes for tier in self.tiers) / 2**20:.1f} MB in "
+            f"memory (limit {self.memory_limit / 2**20:.1f} MB), "
+            f"{self.disk_bytes / 2**20:.1f} MB spilled"
+        )
+
+    def close(self):
+        """
+        Delete the spill files.
+        """
+        for tier in self.tiers:
+            tier.close()
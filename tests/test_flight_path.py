@@ -0,0 +1,68 @@
+import importlib
+import os
+import time
+import numpy as np
+import pytest
+from flight_path import DEAD_RECKONED, FlightPath
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def processor(monkeypatch):
+    # The visualizer reads config.txt from the working directory on import
+    monkeypatch.chdir(REPO)
+    visualizer = importlib.import_module("visualizer")
+    processor = visualizer.InputProcessor()
+    yield processor
+    processor.history.close()
+
+
+def stick(timestamp, roll=0.0, pitch=0.0):
+    data = {f"axis_{i}": 0.0 for i in range(6)}
+    data.update(axis_0=roll, axis_1=pitch, timestamp=timestamp)
+    return data
+
+
+def test_advance_holds_the_velocity():
+    path = FlightPath()
+    path.add_attitude([0.0, 1.0], 0.0, -30.0, 90.0)
+    assert path.advance(3.0) == 1
+    east, north, up = path.positions[-1] - path.positions[-2]
+    assert east == pytest.approx(2 * path.velocity[0])
+    assert east > 0
+    assert north == pytest.approx(0.0, abs=1e-9)
+    assert path.sources[-1] == DEAD_RECKONED
+
+
+def test_advance_at_rest_adds_nothing():
+    path = FlightPath()
+    path.add_attitude([0.0, 1.0], 0.0, 0.0, 0.0)
+    count = len(path)
+    for t in np.arange(1.1, 5.0, 0.1):
+        assert path.advance(t) == 0
+    assert len(path) == count
+
+
+def test_advance_integrates_staged_samples_first():
+    path = FlightPath()
+    path.push(0.0, 0.0, 0.0, 0.0)
+    path.push(1.0, 0.0, 0.0, 0.0)
+    assert path.advance(2.0) == 2
+    assert path.staged == 0
+
+
+def test_idle_with_the_stick_at_rest_publishes_nothing(processor):
+    processor(stick(time.monotonic() - 1.0), None)
+    count = len(processor.path)
+    for _ in range(3):
+        assert processor.idle(stick(0.0), None) is None
+    assert len(processor.path) == count
+
+
+def test_idle_with_the_stick_held_moves_on(processor):
+    processor(stick(time.monotonic() - 1.0, pitch=0.5), None)
+    count = len(processor.path)
+    fields = processor.idle(stick(0.0, pitch=0.5), None)
+    assert fields is not None
+    assert len(processor.path) == count + 1
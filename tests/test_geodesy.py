@@ -0,0 +1,109 @@
+import math
+import numpy as np
+import pytest
+from geodesy import A, B, E2, ecef_to_geodetic, geodetic_to_ecef, local_frame
+
+# Points whose ECEF coordinates follow exactly from the ellipsoid
+_S = math.sqrt(0.5)
+REFERENCE_POINTS = [
+    ((0.0, 0.0, 0.0), (A, 0.0, 0.0)),
+    ((0.0, 90.0, 0.0), (0.0, A, 0.0)),
+    ((90.0, 0.0, 0.0), (0.0, 0.0, B)),
+    ((-90.0, 0.0, 0.0), (0.0, 0.0, -B)),
+    ((0.0, 180.0, 1000.0), (-A - 1000.0, 0.0, 0.0)),
+    (
+        (45.0, 0.0, 0.0),
+        (
+            A * _S / math.sqrt(1 - E2 / 2),
+            0.0,
+            A * (1 - E2) * _S / math.sqrt(1 - E2 / 2),
+        ),
+    ),
+]
+
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(1)
+
+
+@pytest.mark.parametrize("geodetic, ecef", REFERENCE_POINTS)
+def test_geodetic_to_ecef_reference(geodetic, ecef):
+    np.testing.assert_allclose(geodetic_to_ecef(*geodetic), ecef, rtol=0, atol=1e-6)
+
+
+@pytest.mark.parametrize("geodetic, ecef", REFERENCE_POINTS)
+def test_ecef_to_geodetic_reference(geodetic, ecef):
+    latitude, longitude, altitude = ecef_to_geodetic(ecef)
+    assert latitude == pytest.approx(geodetic[0], abs=1e-9)
+    assert altitude == pytest.approx(geodetic[2], abs=1e-6)
+    # Longitude is undefined at the poles
+    if abs(geodetic[0]) < 90:
+        assert longitude == pytest.approx(geodetic[1], abs=1e-9)
+
+
+def test_round_trip(rng):
+    latitude = rng.uniform(-90, 90, 100000)
+    longitude = rng.uniform(-180, 180, 100000)
+    altitude = rng.uniform(-500, 20000, 100000)
+    back = ecef_to_geodetic(geodetic_to_ecef(latitude, longitude, altitude))
+    np.testing.assert_allclose(back[0], latitude, rtol=0, atol=1e-9)
+    np.testing.assert_allclose(back[1], longitude, rtol=0, atol=1e-9)
+    np.testing.assert_allclose(back[2], altitude, rtol=0, atol=1e-6)
+
+
+def test_enu_up_is_up():
+    frame = local_frame(0.0, 0.0)
+    np.testing.assert_allclose(
+        frame.to_enu(0.0, 0.0, 1000.0), (0, 0, 1000), rtol=0, atol=1e-6
+    )
+
+
+def test_enu_east_along_the_equator():
+    # A longitude step on the equator is a chord of the equator
+    frame = local_frame(0.0, 0.0)
+    step = math.radians(0.01)
+    np.testing.assert_allclose(
+        frame.to_enu(0.0, 0.01),
+        (A * math.sin(step), 0, A * math.cos(step) - A),
+        rtol=0,
+        atol=1e-6,
+    )
+
+
+def test_enu_north_of_the_pole_anchor():
+    # From the north pole, north along the meridian of longitude 0 is
+    # towards -x, so a point on it further south is south of the pole
+    frame = local_frame(90.0, 0.0)
+    east, north, up = frame.to_enu(89.0, 0.0)
+    assert east == pytest.approx(0.0, abs=1e-6)
+    assert north < 0
+    assert up < 0
+
+
+def test_enu_round_trip(rng):
+    frame = local_frame(47.3769, 8.5417, 408.0)
+    enu = rng.uniform(-20000, 20000, (100000, 3))
+    np.testing.assert_allclose(
+        frame.to_enu(*frame.from_enu(enu)), enu, rtol=0, atol=1e-6
+    )
+
+
+def test_scalar_path_matches_arrays(rng):
+    frame = local_frame(47.3769, 8.5417, 408.0)
+    latitude = rng.uniform(47.0, 47.5, 100)
+    longitude = rng.uniform(8.0, 9.0, 100)
+    altitude = rng.uniform(400, 800, 100)
+    expected = frame.to_enu(latitude, longitude, altitude)
+    scalar = [
+        frame.enu_point(lat, lon, alt)
+        for lat, lon, alt in zip(
+            latitude.tolist(), longitude.tolist(), altitude.tolist()
+        )
+    ]
+    np.testing.assert_allclose(scalar, expected, rtol=0, atol=1e-6)
+
+
+def test_frames_are_cached_per_anchor():
+    assert local_frame(47.0, 8.0, 400.0) is local_frame(47.0, 8.0, 400.0)
+    assert local_frame(47.0, 8.0, 400.0) is not local_frame(47.0, 8.0, 401.0)
@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+import geofence
+from geofence import CylinderFence, Geofence, PolygonFence
+
+SQUARE = [(-50, -50), (50, -50), (50, 50), (-50, 50)]
+# An L: the square without its north-east quarter
+L_SHAPE = [(-50, -50), (50, -50), (50, 0), (0, 0), (0, 50), (-50, 50)]
+
+
+def margins(fence, points):
+    return fence.margin(np.asarray(points, dtype=np.float64))
+
+
+def test_polygon_margin():
+    fence = PolygonFence(SQUARE)
+    np.testing.assert_allclose(
+        margins(fence, [(0, 0, 0), (40, 0, 0), (60, 0, 0), (60, 60, 0), (50, 10, 0)]),
+        [50, 10, -10, -10 * np.sqrt(2), 0],
+        atol=1e-9,
+    )
+
+
+def test_polygon_winding_does_not_matter():
+    points = np.random.default_rng(1).uniform(-80, 80, (500, 3))
+    np.testing.assert_allclose(
+        margins(PolygonFence(SQUARE), points),
+        margins(PolygonFence(SQUARE[::-1]), points),
+    )
+
+
+def test_concave_polygon():
+    fence = PolygonFence(L_SHAPE)
+    # In the notch: outside, nearest to the inner corner or edges
+    inside, notch, corner = margins(fence, [(-25, -25, 0), (25, 25, 0), (3, 4, 0)])
+    assert inside == pytest.approx(25)
+    assert notch == pytest.approx(-25)
+    assert corner == pytest.approx(-3)
+
+
+def test_polygon_altitude_band():
+    fence = PolygonFence(SQUARE, floor=10, ceiling=120)
+    np.testing.assert_allclose(
+        margins(fence, [(0, 0, 60), (0, 0, 130), (0, 0, 5), (45, 0, 60)]),
+        [50, -10, -5, 5],
+    )
+
+
+def test_cylinder_margin():
+    fence = CylinderFence((10, 20), 100, ceiling=50)
+    np.testing.assert_allclose(
+        margins(fence, [(10, 20, 0), (10, 100, 0), (10, 140, 0), (10, 20, 60)]),
+        [50, 20, -20, -10],
+    )
+
+
+def test_breaches_and_exclusion_zones():
+    fence = Geofence(
+        [
+            PolygonFence(SQUARE, ceiling=100),
+            CylinderFence((20, 20), 10, exclusion=True),
+        ]
+    )
+    allowed, margin = fence.check(
+        [(-30, -30, 10), (20, 20, 10), (20, 32, 10), (60, 0, 10), (0, 0, 110)]
+    )
+    np.testing.assert_array_equal(allowed, [True, False, True, False, False])
+    np.testing.assert_allclose(margin, [20, -10, 2, -10, -10])
+
+
+def test_check_point():
+    fence = Geofence([CylinderFence((0, 0), 10)])
+    assert fence.check_point((3, 4, 0)) == (True, pytest.approx(5))
+    assert fence.check_point((0, 12, 0)) == (False, pytest.approx(-2))
+
+
+def test_check_in_batches(monkeypatch):
+    fence = Geofence(
+        [PolygonFence(L_SHAPE, floor=0), CylinderFence((-20, -20), 5, exclusion=True)]
+    )
+    points = np.random.default_rng(1).uniform(-80, 80, (1000, 3))
+    expected = fence.check(points)
+    monkeypatch.setattr(geofence, "CHECK_BATCH", 64)
+    for result, reference in zip(fence.check(points), expected):
+        np.testing.assert_array_equal(result, reference)
+    for point, allowed, margin in zip(points[:20], *expected):
+        assert fence.check_point(point) == (allowed, pytest.approx(margin))
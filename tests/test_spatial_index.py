@@ -0,0 +1,117 @@
+import numpy as np
+import pytest
+from spatial_index import GridIndex, LapTracker
+
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(1)
+
+
+def brute_nearest(positions, point, first=0, last=None):
+    last = len(positions) if last is None else last
+    distances = np.linalg.norm(positions[first:last] - point, axis=1)
+    index = int(distances.argmin())
+    return float(distances[index]), first + index
+
+
+def test_nearest_in_the_neighbouring_cell():
+    # The point in the query's own cell is further than the one just across
+    # the cell boundary
+    index = GridIndex(cell_size=10.0)
+    index.update(np.array([[0.5, 5.0, 0.0], [10.1, 5.0, 0.0]]))
+    distance, nearest = index.nearest((9.9, 5.0, 0.0))
+    assert nearest == 1
+    assert distance == pytest.approx(0.2)
+
+
+def test_nearest_across_a_corner():
+    index = GridIndex(cell_size=10.0)
+    index.update(np.array([[1.0, 1.0, 0.0], [10.5, 10.5, 0.0], [-0.2, 19.5, 0.0]]))
+    assert index.nearest((9.8, 9.8, 0.0))[1] == 1
+    assert index.nearest((0.3, 19.9, 0.0))[1] == 2
+    # Across zero, where the cells below start at -cell_size
+    assert index.nearest((0.1, 18.0, 0.0))[1] == 2
+
+
+@pytest.mark.parametrize("cell_size", [1.0, 10.0, 50.0])
+def test_nearest_matches_brute_force(rng, cell_size):
+    positions = rng.uniform(-200, 200, (2000, 3))
+    positions[:, 2] = rng.uniform(0, 20, 2000)
+    index = GridIndex(cell_size=cell_size, max_rings=1000)
+    index.update(positions)
+    # Queries on and around the cell boundaries as well as random ones
+    grid = np.arange(-100, 101, cell_size * 5)
+    queries = [(x, y, 10.0) for x in grid for y in grid[:3]]
+    queries += [tuple(q) for q in rng.uniform(-250, 250, (50, 3))]
+    for query in queries:
+        distance, nearest = index.nearest(query)
+        expected_distance, _ = brute_nearest(positions, np.array(query))
+        assert distance == pytest.approx(expected_distance)
+        assert np.linalg.norm(positions[nearest] - query) == pytest.approx(distance)
+
+
+def test_nearest_within_an_index_range(rng):
+    positions = rng.uniform(-100, 100, (500, 3))
+    index = GridIndex(cell_size=10.0, max_rings=100)
+    index.update(positions)
+    for query in rng.uniform(-100, 100, (20, 3)):
+        assert index.nearest(query, 100, 200) == pytest.approx(
+            brute_nearest(positions, query, 100, 200)
+        )
+    assert index.nearest((0.0, 0.0, 0.0), 10, 10) is None
+
+
+def test_updates_in_batches_match_one_update(rng):
+    positions = rng.uniform(-100, 100, (1000, 3))
+    whole = GridIndex()
+    whole.update(positions)
+    batched = GridIndex()
+    for end in (1, 7, 300, 301, 1000):
+        batched.update(positions[:end])
+    assert batched.cells.keys() == whole.cells.keys()
+    for key, indices in whole.cells.items():
+        assert sorted(batched.cells[key]) == sorted(indices)
+
+
+def test_nothing_within_max_rings():
+    index = GridIndex(cell_size=10.0, max_rings=2)
+    index.update(np.array([[100.0, 0.0, 0.0]]))
+    assert index.nearest((0.0, 0.0, 0.0)) is None
+    assert index.nearest((85.0, 0.0, 0.0))[1] == 0
+
+
+def laps(count, radius=50.0, points_per_lap=200):
+    # Circles through the origin, starting and ending there
+    angle = np.linspace(0, 2 * np.pi * count, points_per_lap * count + 1)
+    return np.stack(
+        (radius - radius * np.cos(angle), radius * np.sin(angle), np.zeros_like(angle)),
+        axis=1,
+    )
+
+
+def test_lap_tracker_counts_laps():
+    tracker = LapTracker(radius=15.0)
+    tracker.update(laps(3))
+    assert tracker.lap == 4
+    first, last = tracker.previous
+    assert 0 < first < last < len(laps(3))
+
+
+def test_lap_tracker_batches_match_one_update():
+    positions = laps(3)
+    whole = LapTracker(radius=15.0)
+    whole.update(positions)
+    batched = LapTracker(radius=15.0)
+    for end in range(1, len(positions) + 1, 37):
+        batched.update(positions[:end])
+    batched.update(positions)
+    assert batched.starts == whole.starts
+
+
+def test_lap_tracker_ignores_hovering_near_the_start(rng):
+    tracker = LapTracker(radius=15.0)
+    # Never more than twice the radius away from the first point
+    tracker.update(rng.uniform(-7, 7, (1000, 3)))
+    assert tracker.lap == 1
+    assert tracker.previous is None
@@ -0,0 +1,135 @@
+import numpy as np
+import pytest
+from telemetry_history import TelemetryHistory
+
+CHANNELS = ("a", "b", "c")
+
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(1)
+
+
+@pytest.fixture
+def history(tmp_path):
+    history = TelemetryHistory(CHANNELS, memory_limit=4 * 2**20, spill_dir=tmp_path)
+    yield history
+    history.close()
+
+
+def samples(rng, seconds, rate=10.0):
+    times = np.arange(0, seconds, 1 / rate)
+    return times, rng.normal(size=(len(times), len(CHANNELS)))
+
+
+def buckets(times, values, resolution):
+    # Brute force (start, minimum, maximum, mean) of every bucket
+    index = np.floor(times / resolution)
+    for bucket in np.unique(index):
+        rows = values[index == bucket]
+        yield bucket * resolution, rows.min(0), rows.max(0), rows.mean(0)
+
+
+def test_ceiling_spills_to_disk(rng, tmp_path):
+    limit = 64 * 1024
+    history = TelemetryHistory(CHANNELS, memory_limit=limit, spill_dir=tmp_path)
+    times, values = samples(rng, 600)
+    for start in range(0, len(times), 100):
+        history.extend(times[start : start + 100], values[start : start + 100])
+    raw = history.tiers[0]
+    assert raw.spill.count > 0
+    assert history.memory_bytes <= limit
+    # Nothing was lost on the way to disk
+    spilled_times, spilled_values = raw.rows(times[0], times[-1])
+    np.testing.assert_array_equal(spilled_times, times)
+    np.testing.assert_array_equal(spilled_values, values)
+    history.close()
+
+
+def test_without_a_spill_dir_old_rows_are_dropped(rng):
+    history = TelemetryHistory(CHANNELS, memory_limit=64 * 1024)
+    history.extend(*samples(rng, 600))
+    raw = history.tiers[0]
+    assert raw.dropped > 0
+    assert raw.dropped + raw.count == 6000
+
+
+def test_rollups_match_brute_force(rng, history):
+    times, values = samples(rng, 300)
+    # Live samples and a batch, split at a bucket boundary of no tier
+    for t, row in zip(times[:1234], values[:1234]):
+        history.append(t, row)
+    history.flush()
+    history.extend(times[1234:], values[1234:])
+    for tier in history.tiers[1:]:
+        stored_times, stored = tier.rows(-np.inf, np.inf)
+        expected = list(buckets(times, values, tier.resolution))
+        # Every bucket but the open one is stored
+        assert len(stored_times) == len(expected) - 1
+        for row_time, row, (start, low, high, mean) in zip(
+            stored_times, stored, expected
+        ):
+            assert row_time == pytest.approx(start)
+            np.testing.assert_allclose(row, np.concatenate((low, high, mean)))
+
+
+def test_query_includes_the_open_bucket(rng, history):
+    times, values = samples(rng, 125)
+    history.extend(times, values)
+    window = history.query(0, 125, max_points=5)
+    assert window.resolution == 60.0
+    expected = list(buckets(times, values, 60.0))
+    np.testing.assert_allclose(window.times, [start for start, *_ in expected])
+    np.testing.assert_allclose(window.minimum, [low for _, low, _, _ in expected])
+    np.testing.assert_allclose(window.maximum, [high for _, _, high, _ in expected])
+    np.testing.assert_allclose(window.mean, [mean for *_, mean in expected])
+
+
+@pytest.mark.parametrize(
+    "max_points, resolution",
+    [(10000, 0.0), (1000, 1.0), (100, 10.0), (10, 60.0), (5, 60.0)],
+)
+def test_query_picks_the_finest_tier_that_fits(rng, history, max_points, resolution):
+    history.extend(*samples(rng, 600))
+    window = history.query(0, 600, max_points=max_points)
+    assert window.resolution == resolution
+    assert window.times[0] == 0
+
+
+def test_query_skips_tiers_that_dropped_the_start(rng):
+    history = TelemetryHistory(CHANNELS, memory_limit=64 * 1024)
+    history.extend(*samples(rng, 600))
+    # The raw tier only holds the last minute or so, the start is gone
+    assert history.tiers[0].first_time > 100
+    window = history.query(0, 600, max_points=100000)
+    assert window.resolution > 0
+    assert window.times[0] == 0
+    # A recent window still comes at full rate
+    assert history.query(590, 600).resolution == 0.0
+
+
+def test_live_samples_are_staged(rng, history):
+    times, values = samples(rng, 2)
+    for t, row in zip(times, values):
+        history.append(t, row)
+    assert history.tiers[0].count == 0
+    window = history.query(0, 2)
+    np.testing.assert_array_equal(window.times, times)
+
+
+def test_late_samples_are_dropped(history):
+    history.extend([1.0, 2.0, 1.5, 3.0], np.ones((4, 3)))
+    history.extend([2.5, 4.0], np.ones((2, 3)))
+    np.testing.assert_array_equal(history.query(0, 10).times, [1.0, 2.0, 3.0, 4.0])
+
+
+def test_close_removes_the_spill_files(rng, tmp_path):
+    history = TelemetryHistory(CHANNELS, memory_limit=64 * 1024, spill_dir=tmp_path)
+    history.extend(*samples(rng, 600))
+    assert history.disk_bytes > 0
+    files = [file for tier in history.tiers for file in tier.spill.files]
+    # The files are anonymous, they never show up in the directory
+    assert list(tmp_path.iterdir()) == []
+    history.close()
+    assert all(file.closed for file in files)
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,210 @@
+from collections import OrderedDict
+import numpy as np
+import pygame
+from OpenGL.GL import *
+from batch_renderer import batch, QUAD_INDICES
+from gpu_resources import resources, TEXTURE
+
+FIRST_CHAR = 32
+LAST_CHAR = 126
+ATLAS_WIDTH = 512
+
+# Strings whose quads are kept per atlas, least recently used dropped first.
+# Values like the FPS change every frame, so the cache cannot keep them all
+STRING_CACHE_SIZE = 512
+
+# Offsets used to bake the outline, matching the old four-pass outline render
+OUTLINE_OFFSETS = [(-1, -1), (-1, 1), (1, -1), (1, 1)]
+
+
+class GlyphAtlas:
+    """
+    Rasterizes the printable ASCII glyphs of one font into a single OpenGL
+    texture and draws whole strings from it as textured quads.
+
+    Every glyph is stored twice: once as the plain glyph and once as a
+    1px-dilated copy used for outlines. Both are white, so the vertex colour
+    tints them. Strings are submitted to the shared 2D batch as textured
+    triangles, so they are drawn together with the rest of the HUD.
+    """
+
+    def __init__(self, font_size=24, font_name=None):
+        font = pygame.font.Font(font_name, font_size)
+        self.height = font.get_height()
+
+        surfaces = {}
+        for code in range(FIRST_CHAR, LAST_CHAR + 1):
+            surfaces[chr(code)] = font.render(chr(code), True, (255, 255, 255))
+
+        # Lay the glyphs out in rows, fill glyph first then its outline copy
+        cells = {}
+        pen_x, pen_y = 1, 1
+        row_height = self.height + 4
+        for char, surface in surfaces.items():
+            cell_width = 2 * surface.get_width() + 5
+            if pen_x + cell_width > ATLAS_WIDTH:
+                pen_x = 1
+                pen_y += row_height
+            cells[char] = (pen_x, pen_y)
+            pen_x += cell_width
+
+        atlas_height = 1
+        while atlas_height < pen_y + row_height:
+            atlas_height *= 2
+
+        atlas = pygame.Surface((ATLAS_WIDTH, atlas_height), pygame.SRCALPHA)
+        atlas.fill((0, 0, 0, 0))
+
+        self.advances = {}
+        self.fill_uvs = {}
+        self.outline_uvs = {}
+        for char, surface in surfaces.items():
+            cell_x, cell_y = cells[char]
+            width, height = surface.get_size()
+
+            atlas.blit(
+                surface, (cell_x, cell_y + 1), special_flags=pygame.BLEND_RGBA_MAX
+            )
+
+            outline_x = cell_x + width + 1
+            for offset_x, offset_y in OUTLINE_OFFSETS:
+                atlas.blit(
+                    surface,
+                    (outline_x + 1 + offset_x, cell_y + 1 + offset_y),
+                    special_flags=pygame.BLEND_RGBA_MAX,
+                )
+
+            self.advances[char] = width
+            self.fill_uvs[char] = self._uv_rect(
+                cell_x, cell_y + 1, width, height, atlas_height
+            )
+            self.outline_uvs[char] = self._uv_rect(
+                outline_x, cell_y, width + 2, height + 2, atlas_height
+            )
+
+        self.texture = glGenTextures(1)
+        glBindTexture(GL_TEXTURE_2D, self.texture)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_CLAMP_TO_EDGE)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_CLAMP_TO_EDGE)
+        glTexImage2D(
+            GL_TEXTURE_2D,
+            0,
+            GL_RGBA,
+            ATLAS_WIDTH,
+            atlas_height,
+            0,
+            GL_RGBA,
+            GL_UNSIGNED_BYTE,
+            pygame.image.tostring(atlas, "RGBA", True),
+        )
+        glBindTexture(GL_TEXTURE_2D, 0)
+        resources.add(
+            TEXTURE,
+            self.texture,
+            ATLAS_WIDTH * atlas_height * 4,
+            f"glyph atlas {font_size}px",
+        )
+
+        # Triangles per string, relative to the string origin
+        self._string_cache = OrderedDict()
+
+    @staticmethod
+    def _uv_rect(x, y, width, height, atlas_height):
+        # The atlas is uploaded flipped, so v grows from the bottom of the surface
+        u0 = x / ATLAS_WIDTH
+        u1 = (x + width) / ATLAS_WIDTH
+        v0 = (atlas_height - (y + height)) / atlas_height
+        v1 = (atlas_height - y) / atlas_height
+        return (u0, v0, u1, v1)
+
+    def size(self, text):
+        """
+        Return the (width, height) in pixels of text drawn with this atlas.
+        """
+        return sum(self.advances.get(c, 0) for c in text), self.height
+
+    def _string_quads(self, text, outline):
+        key = (text, outline)
+        quads = self._string_cache.get(key)
+        if quads is not None:
+            self._string_cache.move_to_end(key)
+            return quads
+
+        uvs = self.outline_uvs if outline else self.fill_uvs
+        pad = 1 if outline else 0
+        vertices = []
+        tex_coords = []
+        pen_x = 0
+        for char in text:
+            if char not in uvs:
+                continue
+            width = self.advances[char]
+            x0, y0 = pen_x - pad, -pad
+            x1, y1 = pen_x + width + pad, self.height + pad
+            u0, v0, u1, v1 = uvs[char]
+            vertices.extend([(x0, y0), (x1, y0), (x1, y1), (x0, y1)])
+            tex_coords.extend([(u0, v0), (u1, v0), (u1, v1), (u0, v1)])
+            pen_x += width
+
+        # Expand each quad into two triangles
+        corners = np.arange(0, len(vertices), 4)[:, None] + QUAD_INDICES
+        quads = (
+            np.array(vertices, dtype=np.float32).reshape(-1, 2)[corners.ravel()],
+            np.array(tex_coords, dtype=np.float32).reshape(-1, 2)[corners.ravel()],
+        )
+        self._string_cache[key] = quads
+        if len(self._string_cache) > STRING_CACHE_SIZE:
+            self._string_cache.popitem(last=False)
+        return quads
+
+    def draw(self, x, y, text, color, outline_color=None):
+        """
+        Submit text with its bottom-left corner at (x, y). Colours are 0-255
+        RGB tuples.
+        """
+        origin = np.array([round(x), round(y)], dtype=np.float32)
+
+        if outline_color is not None:
+            self._submit(origin, self._string_quads(text, True), outline_color)
+        self._submit(origin, self._string_quads(text, False), color)
+
+    def _submit(self, origin, quads, color):
+        vertices, tex_coords = quads
+        if not len(vertices):
+            return
+        rgba = (color[0] / 255, color[1] / 255, color[2] / 255, 1.0)
+        batch.triangles(vertices + origin, tex_coords, rgba, self.texture)
+
+
+# Atlases are created lazily, they need a current GL context and pygame.font
+_atlases = {}
+
+
+def get_atlas(font_size=24):
+    atlas = _atlases.get(font_size)
+    if atlas is None:
+        atlas = GlyphAtlas(font_size)
+        _atlases[font_size] = atlas
+    return atlas
+
+
+def release_text_atlases():
+    """
+    Release the glyph atlases, they are recreated when text is drawn again.
+    """
+    for atlas in _atlases.values():
+        resources.release(TEXTURE, atlas.texture)
+    _atlases.clear()
+
+
+def draw_text(x, y, text, color, font_size=24, outline_color=None):
+    """
+    Draw text at (x, y) (bottom-left corner) using the atlas for font_size.
+    """
+    get_atlas(font_size).draw(x, y, text, color, outline_color)
+
+
+def text_size(text, font_size=24):
+    return get_atlas(font_size).size(text)
@@ -0,0 +1,354 @@
+import ctypes
+import io
+import os
+import queue
+import shutil
+import stat
+import subprocess
+import threading
+import time
+import numpy as np
+from PIL import Image
+from OpenGL.GL import *
+from OpenGL.raw.GL.VERSION.GL_1_1 import glTexSubImage2D as glTexSubImage2DRaw
+from batch_renderer import batch
+from gpu_resources import resources, TEXTURE, BUFFER
+
+DEBUG = "Visualizer: "
+
+# Sources read as concatenated JPEG frames, everything else goes through
+# ffmpeg
+MJPEG_EXTENSIONS = (".mjpeg", ".mjpg")
+
+# Bytes read from the source at a time
+READ_SIZE = 64 * 1024
+
+
+def _is_pipe(path):
+    try:
+        return stat.S_ISFIFO(os.stat(path).st_mode)
+    except OSError:
+        return False
+
+
+def read_mjpeg(stream):
+    """
+    Yield the JPEG images of a motion JPEG stream, split at the start and
+    end of image markers.
+    """
+    data = bytearray()
+    while True:
+        chunk = stream.read(READ_SIZE)
+        if not chunk:
+            return
+        data += chunk
+        while True:
+            start = data.find(b"\xff\xd8")
+            if start < 0:
+                # Keep a trailing 0xff, it may start the next marker
+                del data[: max(0, len(data) - 1)]
+                break
+            end = data.find(b"\xff\xd9", start + 2)
+            if end < 0:
+                del data[:start]
+                break
+            yield bytes(data[start : end + 2])
+            del data[: end + 2]
+
+
+def decode_jpeg(frame):
+    return np.asarray(Image.open(io.BytesIO(frame)).convert("RGB"))
+
+
+def read_ppm(stream):
+    """
+    Yield the frames of a stream of binary PPM images, as written by
+    ffmpeg's image2pipe, as top-down RGB arrays.
+    """
+    while True:
+        header = []
+        while len(header) < 4:
+            line = stream.readline()
+            if not line:
+                return
+            header += line.split()
+        _, width, height, _ = header
+        size = int(width) * int(height) * 3
+        pixels = stream.read(size)
+        if len(pixels) < size:
+            return
+        yield np.frombuffer(pixels, np.uint8).reshape(int(height), int(width), 3)
+
+
+class VideoDecoder:
+    """
+    Decodes a video source on a background thread into a small queue of
+    frames, newest wins: when the render loop does not keep up the oldest
+    waiting frame is dropped, never the decoder held up.
+
+    A pipe is a live feed and shown as frames arrive. A regular file stands
+    in for one: it is played at fps and looped.
+    """
+
+    def __init__(self, source, fps=30.0, queue_size=2):
+        self.source = source
+        self.live = _is_pipe(source)
+        self.interval = 1 / fps if fps > 0 else 0.0
+        self.frames = queue.Queue(queue_size)
+        self.decoded = 0
+        self.dropped = 0
+        self.process = None
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="video", daemon=True)
+        self.thread.start()
+
+    def _open(self):
+        # Returns the frame generator, decoding JPEG on this thread too
+        if self.source.lower().endswith(MJPEG_EXTENSIONS) or self.live:
+            stream = open(self.source, "rb")
+            return stream, (decode_jpeg(frame) for frame in read_mjpeg(stream))
+        ffmpeg = shutil.which("ffmpeg")
+        if ffmpeg is None:
+            raise OSError(
+                "ffmpeg not found, only motion JPEG video can be read without it"
+            )
+        self.process = subprocess.Popen(
+            [
+                ffmpeg,
+                "-loglevel", "error",
+                "-i", self.source,
+                "-f", "image2pipe",
+                "-vcodec", "ppm",
+                "-",
+            ],
+            stdout=subprocess.PIPE,
+        )  # fmt: skip
+        return self.process.stdout, read_ppm(self.process.stdout)
+
+    def _run(self):
+        while not self.stopped.is_set():
+            try:
+                stream, frames = self._open()
+            except OSError as e:
+                print(DEBUG + f"Could not open video {self.source}: {e}")
+                return
+            with stream:
+                self._play(frames)
+            if self.process is not None:
+                self.process.wait()
+            # A live feed has ended, a file starts over
+            if self.live or self.decoded == 0:
+                break
+        print(DEBUG + f"Video {self.source} ended")
+
+    def _play(self, frames):
+        due = time.monotonic()
+        try:
+            for pixels in frames:
+                if self.stopped.is_set():
+                    return
+                if self.interval and not self.live:
+                    due += self.interval
+                    delay = due - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                    else:
+                        # Behind after a hiccup, carry on from now
+                        due = time.monotonic()
+                self.decoded += 1
+                self._put(pixels)
+        except (OSError, ValueError) as e:
+            print(DEBUG + f"Video decoding stopped: {e}")
+
+    def _put(self, pixels):
+        while True:
+            try:
+                self.frames.put_nowait(pixels)
+                return
+            except queue.Full:
+                try:
+                    self.frames.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    @property
+    def pending(self):
+        return not self.frames.empty()
+
+    def latest(self):
+        """
+        The newest decoded frame, or None when none arrived since the last
+        call. Older frames still waiting are dropped.
+        """
+        pixels = None
+        while True:
+            try:
+                newer = self.frames.get_nowait()
+            except queue.Empty:
+                return pixels
+            if pixels is not None:
+                self.dropped += 1
+            pixels = newer
+
+    def close(self):
+        self.stopped.set()
+        if self.process is not None:
+            self.process.kill()
+        # A pipe without a writer blocks in open or read, the thread is a
+        # daemon and left behind then
+        self.thread.join(timeout=1.0)
+
+
+class VideoUnderlay:
+    """
+    A video feed filling the window beneath the scene and the HUD.
+
+    Frames come from a VideoDecoder. The newest one is copied into a pixel
+    buffer object and the texture updated from it, so the copy to the GPU
+    runs asynchronously; two buffers alternate, so the next frame is never
+    written into one the GPU may still be reading. The texture is allocated
+    once and reused for every frame of the same size.
+    """
+
+    def __init__(self, source, fps=30.0):
+        self.decoder = VideoDecoder(source, fps)
+        self.texture = None
+        self.buffers = []
+        self.next_buffer = 0
+        self.size = None
+        self.shown = 0
+
+    @property
+    def pending(self):
+        """
+        True while a decoded frame waits to be shown.
+        """
+        return self.decoder.pending
+
+    def _allocate(self, width, height):
+        self._release()
+        self.size = (width, height)
+        nbytes = width * height * 3
+        texture = glGenTextures(1)
+        glBindTexture(GL_TEXTURE_2D, texture)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_CLAMP_TO_EDGE)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_CLAMP_TO_EDGE)
+        glTexImage2D(
+            GL_TEXTURE_2D, 0, GL_RGB8, width, height, 0, GL_RGB, GL_UNSIGNED_BYTE, None
+        )
+        glBindTexture(GL_TEXTURE_2D, 0)
+        self.texture = resources.add(TEXTURE, texture, nbytes, "video")
+
+        self.buffers = list(glGenBuffers(2))
+        for pbo in self.buffers:
+            glBindBuffer(GL_PIXEL_UNPACK_BUFFER, pbo)
+            glBufferData(GL_PIXEL_UNPACK_BUFFER, nbytes, None, GL_STREAM_DRAW)
+            resources.add(BUFFER, pbo, nbytes, "video")
+        glBindBuffer(GL_PIXEL_UNPACK_BUFFER, 0)
+
+    def update(self):
+        """
+        Upload the newest decoded frame, if any. Returns True when the
+        texture changed.
+        """
+        pixels = self.decoder.latest()
+        if pixels is None:
+            return False
+        height, width = pixels.shape[:2]
+        if self.size != (width, height):
+            self._allocate(width, height)
+        pixels = np.ascontiguousarray(pixels)
+
+        pbo = self.buffers[self.next_buffer]
+        self.next_buffer = (self.next_buffer + 1) % len(self.buffers)
+        glBindBuffer(GL_PIXEL_UNPACK_BUFFER, pbo)
+        address = glMapBufferRange(
+            GL_PIXEL_UNPACK_BUFFER,
+            0,
+            pixels.nbytes,
+            GL_MAP_WRITE_BIT | GL_MAP_INVALIDATE_BUFFER_BIT,
+        )
+        if not address:
+            glBindBuffer(GL_PIXEL_UNPACK_BUFFER, 0)
+            return False
+        ctypes.memmove(address, pixels.ctypes.data, pixels.nbytes)
+        glUnmapBuffer(GL_PIXEL_UNPACK_BUFFER)
+
+        # Sourced from the bound buffer, the call returns without waiting
+        # for the copy
+        glBindTexture(GL_TEXTURE_2D, self.texture)
+        glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+        glTexSubImage2DRaw(
+            GL_TEXTURE_2D,
+            0,
+            0,
+            0,
+            width,
+            height,
+            GL_RGB,
+            GL_UNSIGNED_BYTE,
+            ctypes.c_void_p(0),
+        )
+        glPixelStorei(GL_UNPACK_ALIGNMENT, 4)
+        glBindTexture(GL_TEXTURE_2D, 0)
+        glBindBuffer(GL_PIXEL_UNPACK_BUFFER, 0)
+        self.shown += 1
+        return True
+
+    def draw(self, resolution):
+        """
+        Upload the newest frame and draw the video over the whole viewport,
+        cropped to fill it. Keeps showing the last frame while none arrive.
+        """
+        self.update()
+        if self.texture is None:
+            return
+        width, height = resolution
+        video_width, video_height = self.size
+        # Crop the sides or the top and bottom, whichever sticks out
+        aspect = (width / height) / (video_width / video_height)
+        u = (1 - min(aspect, 1.0)) / 2
+        v = (1 - min(1 / aspect, 1.0)) / 2
+
+        glMatrixMode(GL_PROJECTION)
+        glPushMatrix()
+        glLoadIdentity()
+        glOrtho(0, width, 0, height, -1, 1)
+        glMatrixMode(GL_MODELVIEW)
+        glPushMatrix()
+        glLoadIdentity()
+
+        # The frames are top-down, the first row at t = 0
+        batch.color(1, 1, 1, 1)
+        batch.quad(
+            ((0, 0), (width, 0), (width, height), (0, height)),
+            ((u, 1 - v), (1 - u, 1 - v), (1 - u, v), (u, v)),
+            self.texture,
+        )
+        batch.flush()
+
+        glPopMatrix()
+        glMatrixMode(GL_PROJECTION)
+        glPopMatrix()
+        glMatrixMode(GL_MODELVIEW)
+
+    def report(self):
+        return (
+            f"{self.decoder.decoded} frames decoded, {self.shown} shown, "
+            f"{self.decoder.dropped} dropped"
+        )
+
+    def _release(self):
+        if self.texture is not None:
+            resources.release(TEXTURE, self.texture)
+            self.texture = None
+        for pbo in self.buffers:
+            resources.release(BUFFER, pbo)
+        self.buffers = []
+
+    def release(self):
+        self.decoder.close()
+        self._release()
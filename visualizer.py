@@ -1,78 +1,238 @@
+import functools
 import math
+import os
+import tempfile
+import time
+from collections import deque, namedtuple
 from pygame.locals import *
 import pygame
 from launcher import Config
 from joystick_service import get_joystick_list
-from PIL import Image
+import numpy as np
+import OpenGL
+
+config = Config()
+
+# Fast GL mode skips PyOpenGL's glGetError check after every call. It has to
+# be set before OpenGL.GL is imported anywhere; the launcher imports this
+# module once at startup and the visualizer processes inherit it, so a
+# change only applies after a full restart of the launcher.
+if config.fast_gl:
+    OpenGL.ERROR_CHECKING = False
+    OpenGL.ERROR_LOGGING = False
+
 from OpenGL.GL import *
-from OpenGL.GLUT import *
-from OpenGL.GLUT import GLUT_BITMAP_8_BY_13
 from OpenGL.GLU import gluPerspective
+from batch_renderer import batch
+from text_engine import draw_text, text_size, release_text_atlases
+from hud import Hud, FramebufferLayer
+from horizon_shader import get_horizon_shader, release_horizon_shader
+from frame_governor import FrameGovernor, ScaledRenderTarget, QUALITY_LEVELS
+from layout import compute_layout
+from drone_model import DroneModel, set_light
+from map_tiles import MapUnderlay
+from video_underlay import VideoUnderlay
+from asset_cache import (
+    load_atlas,
+    load_pixels,
+    region_tex_coords,
+    release_atlas,
+    upload_texture,
+)
+from gpu_resources import resources
+from frame_profiler import profiler, PERCENTILES
+from sample_buffer import SampleBuffer
+from compute_worker import ComputeWorker, FrameState
+from flight_path import FlightPath, DEAD_RECKONED
+from path_renderer import PathChunker, PathRenderer, perspective
+from spatial_index import GridIndex, LapTracker
+from geofence import Geofence, PolygonFence, CylinderFence
+from telemetry_history import TelemetryHistory
+from strip_chart import StripChart, CHANNEL_COLORS
+from frame_capture import FrameCapture, open_encoder
+from mjpeg_stream import MjpegStream
+
+DEBUG = "Visualizer: "
 
+# Current render quality, lowered by the frame governor when frames overrun
+quality = QUALITY_LEVELS[0]
 
-config = Config()
+# Longest idle wait before window events are serviced again, in seconds
+IDLE_POLL = 0.05
 
-DEBUG = "Visualizer: "
+# Frames between updates of the profiler overlay, computing percentiles
+# every frame would show up in the profile itself
+PROFILE_OVERLAY_INTERVAL = 15
+
+# Roll, pitch and yaw shown while there is no attitude data
+DEFAULT_ATTITUDE = (20, 30, 45)
+
+# Joystick axis and degrees at full deflection for roll, pitch and yaw
+ATTITUDE_AXES = (("axis_0", 45.0), ("axis_1", -30.0), ("axis_2", 180.0))
+
+# Range of the joystick axes
+AXIS_LIMITS = (-1.0, 1.0)
+
+# Seconds the input is shown late, a few joystick events while the stick
+# moves, so frames interpolate between samples rather than extrapolate
+# past the newest one
+INPUT_DELAY = 0.03
+
+# Joystick axis commanding the climb rate of the dead reckoned flight path,
+# 0 holds the altitude
+THROTTLE_AXIS = "axis_3"
+
+# Seconds of live attitude samples integrated into the flight path at once
+PATH_BATCH = 0.1
+
+# A lap ends when the path comes back this close to its start, in metres
+LAP_RADIUS = 15.0
+
+# Navigation figures of the flight path, computed on the compute worker:
+#   distance    metres flown
+#   lap         number of the current lap, from 1
+#   lap_offset  metres to the nearest point of the previous lap, or None
+#   fence       (allowed, margin in metres) of the geofence, or None
+PathStatus = namedtuple("PathStatus", ["distance", "lap", "lap_offset", "fence"])
+
+# Channels plotted in the strip chart
+CHART_CHANNELS = tuple(f"axis_{i}" for i in range(6))
+
+# Images packed into the HUD texture atlas
+HUD_ASSETS = ("assets/Frame.png", "assets/Interior.png", "assets/Ring.png")
+
+# Model shown in the scene above the HUD panel
+DRONE_MODEL = "assets/drone.obj"
+
+# Camera of the scene: field of view, distance behind the model and the
+# angle it looks down at it, in degrees and scene units
+SCENE_FOV = 45
+SCENE_DISTANCE = 5.0
+SCENE_PITCH = 20
+
+# Window events after which the idle loop has to redraw
+REDRAW_EVENTS = (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED, pygame.WINDOWRESTORED)
 
 
 def load_texture(filename):
     """
-    Load an image file as an OpenGL texture.
-    """
-    image = Image.open(filename)
-    image = image.transpose(Image.FLIP_TOP_BOTTOM)
-
-    # Create a new OpenGL texture
-    tex_id = glGenTextures(1)
-
-    glEnable(GL_TEXTURE_2D)
-    glEnable(GL_BLEND)
-    glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
-    glBindTexture(GL_TEXTURE_2D, tex_id)
-    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
-    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
-    glTexImage2D(
-        GL_TEXTURE_2D,
-        0,
-        GL_RGBA,
-        image.width,
-        image.height,
-        0,
-        GL_RGBA,
-        GL_UNSIGNED_BYTE,
-        image.tobytes("raw", "RGBA"),
-    )
-    glBindTexture(GL_TEXTURE_2D, 0)
-
-    return tex_id
+    Load an image file as an OpenGL texture, from the asset cache when the
+    file was decoded before.
+    """
+    return upload_texture(load_pixels(filename), name=filename)
 
 
+def scene_view():
+    """
+    The scene's modelview matrix as set in OpenGLViewport.render, for use
+    with column vectors.
+    """
+    angle = math.radians(SCENE_PITCH)
+    cos, sin = math.cos(angle), math.sin(angle)
+    return np.array(
+        [
+            [1, 0, 0, 0],
+            [0, cos, -sin, 0],
+            [0, sin, cos, -SCENE_DISTANCE],
+            [0, 0, 0, 1],
+        ]
+    )
 
 
 class OpenGLViewport:
-    def __init__(self, resolution):
+    """
+    The 3D scene above the HUD panel: the drone model at the current
+    attitude, seen from behind and slightly above, and the flight path
+    around it.
+    """
+
+    def __init__(self, resolution, model=None, underlay=None, path=None):
+        self.model = model
+        self.underlay = underlay
+        self.path = path
+        self.resize(resolution)
+
+    def resize(self, resolution):
+        """
+        Set the viewport and projection for the window size. Called again
+        when the window is resized.
+        """
         self.resolution = resolution
-        # Adjust the OpenGL viewport to use only the top 80% of the window
-        glViewport(
-            0,
-            int(0 * self.resolution[1]),
-            self.resolution[0],
-            int(1 * self.resolution[1]),
-        )
-        gluPerspective(45, (self.resolution[0] / (1 * self.resolution[1])), 0.1, 50.0)
+        self.scene = compute_layout(resolution).scene
+        glViewport(0, 0, self.resolution[0], self.resolution[1])
+        glMatrixMode(GL_PROJECTION)
+        glLoadIdentity()
+        gluPerspective(45, (self.resolution[0] / self.resolution[1]), 0.1, 50.0)
+        glMatrixMode(GL_MODELVIEW)
+        glLoadIdentity()
         glTranslatef(0.0, 0.0, -5)
 
-    def render(self):
-        glRotatef(1, 3, 1, 1)
-        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+    def render(self, attitude=None, position=None):
+        """
+        Draw the map underlay and the model into the scene area, beneath the
+        HUD drawn after them. attitude is (roll, pitch, yaw) in degrees,
+        position (latitude, longitude) the centre of the map.
+        """
+        if self.model is None and self.underlay is None:
+            return
+        x, y, width, height = self.scene
+
+        # The frame may be going to a reduced-scale render target, map the
+        # scene area into its viewport
+        viewport = glGetIntegerv(GL_VIEWPORT)
+        scale_x = viewport[2] / self.resolution[0]
+        scale_y = viewport[3] / self.resolution[1]
+
+        if self.underlay is not None and position is not None:
+            with profiler.stage("map"):
+                self._render_underlay(viewport, scale_x, scale_y, position)
+        if self.model is None and self.path is None:
+            return
 
+        glViewport(
+            int(viewport[0] + x * scale_x),
+            int(viewport[1] + y * scale_y),
+            max(1, int(width * scale_x)),
+            max(1, int(height * scale_y)),
+        )
 
-class TextRenderer:
-    def __init__(self, resolution):
-        self.resolution = resolution
+        glMatrixMode(GL_PROJECTION)
+        glPushMatrix()
+        glLoadIdentity()
+        gluPerspective(SCENE_FOV, width / height, 0.1, 50.0)
+        glMatrixMode(GL_MODELVIEW)
+        glPushMatrix()
+        glLoadIdentity()
+        glTranslatef(0.0, 0.0, -SCENE_DISTANCE)
+        glRotatef(SCENE_PITCH, 1, 0, 0)
+        set_light()
+
+        if self.path is not None:
+            with profiler.stage("path"):
+                self.path.draw(
+                    scene_view(),
+                    perspective(SCENE_FOV, width / height, 0.1, 50.0),
+                    height * scale_y,
+                    SCENE_FOV,
+                )
+        if self.model is not None:
+            self.model.draw(*(attitude or DEFAULT_ATTITUDE))
 
-    def render(self, text_list, textures):
-        # Render text using OpenGL
+        glPopMatrix()
+        glMatrixMode(GL_PROJECTION)
+        glPopMatrix()
+        glMatrixMode(GL_MODELVIEW)
+        glViewport(*viewport)
+
+    def _render_underlay(self, viewport, scale_x, scale_y, position):
+        x, y, width, height = self.scene
+        glEnable(GL_SCISSOR_TEST)
+        glScissor(
+            int(viewport[0] + x * scale_x),
+            int(viewport[1] + y * scale_y),
+            int(width * scale_x + 1),
+            int(height * scale_y + 1),
+        )
         glMatrixMode(GL_PROJECTION)
         glPushMatrix()
         glLoadIdentity()
@@ -81,61 +241,183 @@ class TextRenderer:
         glPushMatrix()
         glLoadIdentity()
 
-        # Draw the line 60% down the screen
-        line_position = int(0.4 * config.resolution[1])
-        draw_horizontal_line(line_position)
+        self.underlay.draw(self.scene, *position)
 
-        draw_vertical_line(0.4, config.resolution[1], 0.2 * config.resolution[0])
+        glPopMatrix()
+        glMatrixMode(GL_PROJECTION)
+        glPopMatrix()
+        glMatrixMode(GL_MODELVIEW)
+        glDisable(GL_SCISSOR_TEST)
 
-        PITCH = 30
-        ROLL = 20
-        YAW = 45
 
-        # Render the artificial horizon
-        draw_artificial_horizon(
-            (config.resolution[0] // 2) - 200,
-            int(0.2 * config.resolution[1]) + 30,
-            textures,
-            roll_angle=ROLL,
-            pitch_angle=PITCH,
-            yaw_angle=YAW,
-            radius=150,
+class TextRenderer:
+    def __init__(self, resolution):
+        self.resolution = resolution
+        self.layout = compute_layout(resolution)
+        self.scale = 1.0
+        self.hud = None
+        # Strip chart drawn over its cached frame every frame, if any
+        self.chart = None
+
+    def _build_hud(self, textures):
+        """
+        Create the retained HUD nodes. Widgets draw in the layout's design
+        coordinates, the nodes map them onto their place in the window.
+        """
+        layout = self.layout
+        hud = Hud(self.resolution)
+        hud.set_scale(self.scale)
+
+        # Draw the line 60% down the screen
+        hud.add(
+            "horizontal_divider",
+            lambda: draw_horizontal_line(self.layout.panel_top),
+            *layout.placements["horizontal_divider"],
+        )
+        hud.add(
+            "vertical_divider",
+            lambda: draw_vertical_line(0.4, self.resolution[1], self.layout.divider_x),
+            *layout.placements["vertical_divider"],
         )
 
+        # Render the artificial horizon
+        horizon_x, horizon_y = layout.horizon_center
+        radius = layout.horizon_radius
+
+        def draw_horizon(roll, pitch, yaw):
+            draw_artificial_horizon(
+                horizon_x,
+                horizon_y,
+                textures,
+                roll_angle=roll,
+                pitch_angle=pitch,
+                yaw_angle=yaw,
+                radius=radius,
+            )
+
+        hud.add("horizon", draw_horizon, *layout.placements["horizon"])
+
         # Control Dials
 
         # Pitch Slider
-        draw_vertical_slider(
-            0.75 * config.resolution[0],
-            0.2 * config.resolution[1],
-            PITCH,
-            width=40,
-            height=300,
+        pitch_x, pitch_y, pitch_width, pitch_height = layout.pitch_slider
+        hud.add(
+            "pitch_scale",
+            lambda: draw_vertical_slider_scale(
+                pitch_x, pitch_y, pitch_width, pitch_height
+            ),
+            *layout.placements["pitch_scale"],
         )
-
-        # Roll Slider
-        draw_horizontal_slider(
-            0.6 * config.resolution[0],
-            0.15 * config.resolution[1],
-            ROLL,
-            width=300,
-            height=40,
+        hud.add(
+            "pitch_value",
+            lambda pitch: draw_vertical_slider_value(
+                pitch_x, pitch_y, pitch, pitch_width, pitch_height
+            ),
+            *layout.placements["pitch_value"],
         )
 
-        # Yaw Slider
-        draw_horizontal_slider(
-            0.6 * config.resolution[0],
-            0.25 * config.resolution[1],
-            YAW,
-            width=300,
-            height=40,
+        # Roll and Yaw Sliders
+        for name, slider in (("roll", layout.roll_slider), ("yaw", layout.yaw_slider)):
+            hud.add(
+                name + "_scale",
+                lambda slider=slider: draw_horizontal_slider_scale(*slider),
+                *layout.placements[name + "_scale"],
+            )
+            hud.add(
+                name + "_value",
+                lambda value, slider=slider: draw_horizontal_slider_value(
+                    slider[0], slider[1], value, *slider[2:]
+                ),
+                *layout.placements[name + "_value"],
+            )
+
+        def draw_status(text_list):
+            # Display each text entry in the list
+            for text_entry in text_list:
+                x, y, text, color = text_entry
+
+                render_text(x, y, text, color)
+
+        hud.add("status", draw_status, *layout.placements["status"])
+
+        hud.add(
+            "strip_chart",
+            lambda: draw_strip_chart_frame(self.layout.strip_chart, CHART_CHANNELS),
+            *layout.placements["strip_chart"],
         )
 
-        # Display each text entry in the list
-        for text_entry in text_list:
-            x, y, text, color = text_entry
+        return hud
 
-            render_text(x, y, text, color)
+    def resize(self, resolution):
+        """
+        Move the HUD nodes to the layout of the new window size. Nodes that
+        keep their size in pixels reuse their cached layers.
+        """
+        self.resolution = resolution
+        self.layout = compute_layout(resolution)
+        if self.hud is not None:
+            self.hud.resize(resolution)
+            for name, placement in self.layout.placements.items():
+                self.hud.place(name, *placement)
+
+    def set_scale(self, scale):
+        self.scale = scale
+        if self.hud is not None:
+            self.hud.set_scale(scale)
+
+    def invalidate(self):
+        if self.hud is not None:
+            self.hud.invalidate()
+
+    def release(self):
+        """
+        Delete the HUD layers, they are recreated on the next render.
+        """
+        if self.hud is not None:
+            self.hud.release()
+            self.hud = None
+
+    def render(self, text_list, textures, overlay=(), attitude=None, now=None):
+        """
+        Render the HUD. text_list is the status block, it is cached like the
+        other widgets; overlay entries change every frame and are drawn
+        directly on top. attitude is (roll, pitch, yaw) in degrees, now the
+        time the strip chart scrolls to (default: time.monotonic()).
+        """
+        if self.hud is None:
+            self.hud = self._build_hud(textures)
+
+        # Render text using OpenGL
+        glMatrixMode(GL_PROJECTION)
+        glPushMatrix()
+        glLoadIdentity()
+        glOrtho(0, self.resolution[0], 0, self.resolution[1], -1, 1)
+        glMatrixMode(GL_MODELVIEW)
+        glPushMatrix()
+        glLoadIdentity()
+
+        roll, pitch, yaw = attitude or DEFAULT_ATTITUDE
+
+        self.hud.bind("horizon", roll, pitch, yaw)
+        self.hud.bind("pitch_value", pitch)
+        self.hud.bind("roll_value", roll)
+        self.hud.bind("yaw_value", yaw)
+        self.hud.bind("status", tuple(text_list))
+        with profiler.stage("hud"):
+            self.hud.render()
+
+        if self.chart is not None:
+            with profiler.stage("strip_chart"):
+                if now is None:
+                    now = time.monotonic()
+                self.chart.draw(self.layout.strip_chart, now)
+
+        with profiler.stage("text"):
+            for x, y, text, color in overlay:
+                render_text(x, y, text, color)
+
+            # Draw everything queued this frame
+            batch.flush()
 
         glPopMatrix()
         glMatrixMode(GL_PROJECTION)
@@ -143,14 +425,13 @@ class TextRenderer:
         glMatrixMode(GL_MODELVIEW)
 
 
+@profiler.timed("draw_horizontal_line")
 def draw_horizontal_line(y_position):
-    glColor3f(1, 1, 1)  # Set line color to white
-    glBegin(GL_LINES)
-    glVertex2f(0, y_position)
-    glVertex2f(config.resolution[0], y_position)
-    glEnd()
+    batch.color(1, 1, 1)  # Set line color to white
+    batch.line(0, y_position, config.resolution[0], y_position)
 
 
+@profiler.timed("draw_vertical_line")
 def draw_vertical_line(stop_percentage, window_height, x_position):
     """
     Draws a vertical line that starts at the bottom of the screen and stops
@@ -165,13 +446,21 @@ def draw_vertical_line(stop_percentage, window_height, x_position):
     end_y = window_height * stop_percentage  # Calculate end point based on percentage
 
     # OpenGL commands to draw the line
-    glColor3f(1, 1, 1)  # White color
-    glBegin(GL_LINES)
-    glVertex2f(x_position, start_y)
-    glVertex2f(x_position, end_y)
-    glEnd()
+    batch.color(1, 1, 1)  # White color
+    batch.line(x_position, start_y, x_position, end_y)
+
+
+@functools.lru_cache(maxsize=8)
+def circle_outline(radius, segments=360):
+    """
+    Outline of a circle around the origin, cached so the horizon mask is not
+    recomputed with math.cos/math.sin every frame.
+    """
+    angles = np.radians(np.arange(segments) * (360 / segments))
+    return np.column_stack((np.cos(angles), np.sin(angles))) * radius
 
 
+@profiler.timed("draw_artificial_horizon")
 def draw_artificial_horizon(
     x, y, textures, roll_angle, pitch_angle, yaw_angle, radius=100
 ):
@@ -189,12 +478,39 @@ def draw_artificial_horizon(
     ):
         raise ValueError("Provide textures for Frame, Interior, and Ring")
 
-    glEnable(GL_BLEND)
-    glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+    # Adjust pitch translation based on scaling and radius
+    adjusted_pitch = -1 * pitch_angle * (radius / 100.0) * 1.35
+
+    cos_roll = math.cos(math.radians(roll_angle))
+    sin_roll = math.sin(math.radians(roll_angle))
+
+    shader = get_horizon_shader()
+    if shader is not None:
+        # The Interior is scaled 2x, so its pitch shift doubles on screen
+        shader.draw(x, y, radius, 2 * adjusted_pitch, cos_roll, sin_roll, textures)
+    else:
+        draw_artificial_horizon_stencil(
+            x, y, textures, adjusted_pitch, cos_roll, sin_roll, radius
+        )
+
+    draw_yaw_slider(x, y - radius - 30, yaw_angle)
+    draw_pitch_slider(x - radius - 30, y, pitch_angle)
+
+
+def draw_artificial_horizon_stencil(
+    x, y, textures, adjusted_pitch, cos_roll, sin_roll, radius
+):
+    """
+    Fallback for contexts without GLSL: mask with the stencil buffer and draw
+    the Interior, Frame and Ring as separate quads.
+    """
+    # Anything queued before must be drawn before the stencil state changes
+    batch.flush()
     glDisable(GL_DEPTH_TEST)
 
     # Set up the stencil buffer
     glEnable(GL_STENCIL_TEST)
+    glStencilMask(0xFF)
     glClear(GL_STENCIL_BUFFER_BIT)
 
     # Draw the masking shape (circle)
@@ -202,100 +518,77 @@ def draw_artificial_horizon(
     glStencilOp(GL_KEEP, GL_KEEP, GL_REPLACE)
     glColorMask(GL_FALSE, GL_FALSE, GL_FALSE, GL_FALSE)
 
-    glBegin(GL_POLYGON)
-    for i in range(360):
-        angle = i
-        dx = x + radius * math.cos(math.radians(angle))
-        dy = y + radius * math.sin(math.radians(angle))
-        glVertex2f(dx, dy)
-    glEnd()
+    batch.polygon(circle_outline(radius, quality.circle_segments) + (x, y))
+    batch.flush()
 
     glColorMask(GL_TRUE, GL_TRUE, GL_TRUE, GL_TRUE)
 
-    # Adjust pitch translation based on scaling and radius
-    adjusted_pitch = -1 * pitch_angle * (radius / 100.0) * 1.35
-
     # Render the Interior image with pitch transformation and masking
     glStencilFunc(GL_EQUAL, 1, 0xFF)
     glStencilMask(0x00)
 
-    glPushMatrix()
-    glTranslatef(x, y, 0)
-    glScalef(2, 2, 1)
-    glTranslatef(0, adjusted_pitch, 0)
-
-    glBindTexture(GL_TEXTURE_2D, textures["Interior"])
-    glBegin(GL_QUADS)
-    glTexCoord2f(0, 0)
-    glVertex2f(-radius, -radius)
-    glTexCoord2f(1, 0)
-    glVertex2f(radius, -radius)
-    glTexCoord2f(1, 1)
-    glVertex2f(radius, radius)
-    glTexCoord2f(0, 1)
-    glVertex2f(-radius, radius)
-    glEnd()
-    glPopMatrix()
+    batch.color(1, 1, 1)
+
+    # The Interior is scaled 2x about the centre, then shifted by the pitch
+    interior_y = y + 2 * adjusted_pitch
+    batch.quad(
+        (
+            (x - 2 * radius, interior_y - 2 * radius),
+            (x + 2 * radius, interior_y - 2 * radius),
+            (x + 2 * radius, interior_y + 2 * radius),
+            (x - 2 * radius, interior_y + 2 * radius),
+        ),
+        region_tex_coords(textures["Interior"]),
+        textures["Interior"].texture,
+    )
 
     # Render the Frame with roll transformation
-    glPushMatrix()
-    glTranslatef(x, y, 0)
-    glRotatef(roll_angle, 0, 0, 1)
-
-    glBindTexture(GL_TEXTURE_2D, textures["Frame"])
-    glBegin(GL_QUADS)
-    glTexCoord2f(0, 0)
-    glVertex2f(-radius, -radius)
-    glTexCoord2f(1, 0)
-    glVertex2f(radius, -radius)
-    glTexCoord2f(1, 1)
-    glVertex2f(radius, radius)
-    glTexCoord2f(0, 1)
-    glVertex2f(-radius, radius)
-    glEnd()
-    glPopMatrix()
+    batch.quad(
+        [
+            (x + dx * cos_roll - dy * sin_roll, y + dx * sin_roll + dy * cos_roll)
+            for dx, dy in (
+                (-radius, -radius),
+                (radius, -radius),
+                (radius, radius),
+                (-radius, radius),
+            )
+        ],
+        region_tex_coords(textures["Frame"]),
+        textures["Frame"].texture,
+    )
 
     # Render the Ring without any transformations
-    glBindTexture(GL_TEXTURE_2D, textures["Ring"])
-    glBegin(GL_QUADS)
-    glTexCoord2f(0, 0)
-    glVertex2f(x - radius, y - radius)
-    glTexCoord2f(1, 0)
-    glVertex2f(x + radius, y - radius)
-    glTexCoord2f(1, 1)
-    glVertex2f(x + radius, y + radius)
-    glTexCoord2f(0, 1)
-    glVertex2f(x - radius, y + radius)
-    glEnd()
-
-    glBindTexture(GL_TEXTURE_2D, 0)  # Unbind texture
+    batch.quad(
+        (
+            (x - radius, y - radius),
+            (x + radius, y - radius),
+            (x + radius, y + radius),
+            (x - radius, y + radius),
+        ),
+        region_tex_coords(textures["Ring"]),
+        textures["Ring"].texture,
+    )
+    batch.flush()
 
     # Disable the stencil test
+    glStencilMask(0xFF)
     glDisable(GL_STENCIL_TEST)
 
-    draw_yaw_slider(x, y - radius - 30, yaw_angle)
-    draw_pitch_slider(x - radius - 30, y, pitch_angle)
-
 
+@profiler.timed("draw_pitch_slider")
 def draw_pitch_slider(x, y, pitch_angle, width=20, height=240):
     """
     Draw the pitch slider next to the artificial horizon with moving numbers based on pitch angle.
     """
     # Draw slider background
-    glColor3f(0.6, 0.6, 0.6)
-    glBegin(GL_QUADS)
-    glVertex2f(x - width, y - height / 2)
-    glVertex2f(x, y - height / 2)
-    glVertex2f(x, y + height / 2)
-    glVertex2f(x - width, y + height / 2)
-    glEnd()
+    batch.color(0.6, 0.6, 0.6)
+    batch.rect(x - width, y - height / 2, x, y + height / 2)
 
     # Draw slider position (centered)
-    glColor3f(1, 0, 0)  # Red color for the slider position
-    glRectf(x - width, y - 5, x, y + 5)
+    batch.color(1, 0, 0)  # Red color for the slider position
+    batch.rect(x - width, y - 5, x, y + 5)
 
     # Draw numbered indicators, moving based on pitch
-    font = pygame.font.Font(None, 24)
     spacing = height / 6  # Adjust as needed
 
     # Calculate the starting and ending values based on the pitch angle
@@ -305,53 +598,31 @@ def draw_pitch_slider(x, y, pitch_angle, width=20, height=240):
     for i in range(start_val, end_val + 10, 10):
         pos_y = y + (i - pitch_angle) * spacing / 10
         if y - height / 2 - spacing < pos_y < y + height / 2 + spacing:
-            glBegin(GL_LINES)
-            glVertex2f(x - width, pos_y)
-            glVertex2f(x - width + 10, pos_y)
-            glEnd()
-
-            text_surface = font.render(str(i), True, (255, 255, 255))
-            text_data = pygame.image.tostring(text_surface, "RGBA", True)
-
-            # Enable blending
-            glEnable(GL_BLEND)
-            glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
-
-            glRasterPos2f(
-                x - width - text_surface.get_width() - 5,
-                pos_y - text_surface.get_height() / 2,
-            )
-            glDrawPixels(
-                text_surface.get_width(),
-                text_surface.get_height(),
-                GL_RGBA,
-                GL_UNSIGNED_BYTE,
-                text_data,
+            batch.line(x - width, pos_y, x - width + 10, pos_y)
+
+            label_width, label_height = text_size(str(i))
+            draw_text(
+                x - width - label_width - 5,
+                pos_y - label_height / 2,
+                str(i),
+                (255, 255, 255),
             )
 
-            # Disable blending
-            glDisable(GL_BLEND)
-
 
+@profiler.timed("draw_yaw_slider")
 def draw_yaw_slider(x, y, yaw_angle, width=240, height=20):
     """
     Draw the yaw slider below the artificial horizon with moving numbers based on yaw angle.
     """
     # Draw slider background
-    glColor3f(0.6, 0.6, 0.6)
-    glBegin(GL_QUADS)
-    glVertex2f(x - width / 2, y - height)
-    glVertex2f(x + width / 2, y - height)
-    glVertex2f(x + width / 2, y)
-    glVertex2f(x - width / 2, y)
-    glEnd()
+    batch.color(0.6, 0.6, 0.6)
+    batch.rect(x - width / 2, y - height, x + width / 2, y)
 
     # Draw slider position (centered)
-    glColor3f(1, 0, 0)  # Red color for the slider position
-    glRectf(x - 5, y - height, x + 5, y)
+    batch.color(1, 0, 0)  # Red color for the slider position
+    batch.rect(x - 5, y - height, x + 5, y)
 
     # Draw numbered indicators, moving based on yaw
-    font = pygame.font.Font(None, 24)
     spacing = width / 6  # Adjust as needed
 
     # Calculate the starting and ending values based on the yaw angle
@@ -361,91 +632,72 @@ def draw_yaw_slider(x, y, yaw_angle, width=240, height=20):
     for i in range(start_val, end_val + 10, 10):
         pos_x = x + (i - yaw_angle) * spacing / 10
         if x - width / 2 - spacing < pos_x < x + width / 2 + spacing:
-            glBegin(GL_LINES)
-            glVertex2f(pos_x, y - height)
-            glVertex2f(pos_x, y - height + 10)
-            glEnd()
-
-            text_surface = font.render(str(i), True, (255, 255, 255))
-            text_data = pygame.image.tostring(text_surface, "RGBA", True)
-
-            # Enable blending
-            glEnable(GL_BLEND)
-            glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
-
-            glRasterPos2f(
-                pos_x - text_surface.get_width() / 2,
-                y - height - text_surface.get_height() - 5,
-            )
-            glDrawPixels(
-                text_surface.get_width(),
-                text_surface.get_height(),
-                GL_RGBA,
-                GL_UNSIGNED_BYTE,
-                text_data,
+            batch.line(pos_x, y - height, pos_x, y - height + 10)
+
+            label_width, label_height = text_size(str(i))
+            draw_text(
+                pos_x - label_width / 2,
+                y - height - label_height - 5,
+                str(i),
+                (255, 255, 255),
             )
 
-            # Disable blending
-            glDisable(GL_BLEND)
-
 
 def draw_vertical_slider(x, y, pitch_angle, width=20, height=240):
     """
     Draw the pitch slider next to the artificial horizon with static numbers based on a fixed pitch range (-100 to 100).
     Additionally, display the current pitch_angle value above the slider.
     """
+    draw_vertical_slider_scale(x, y, width, height)
+    draw_vertical_slider_value(x, y, pitch_angle, width, height)
+
+
+@profiler.timed("draw_vertical_slider_scale")
+def draw_vertical_slider_scale(x, y, width=20, height=240):
+    """
+    Draw the static part of the vertical slider: background and the fixed
+    -100 to 100 scale. It does not depend on the value, so the HUD caches it.
+    """
     # Draw slider background
-    glColor3f(0.6, 0.6, 0.6)
-    glBegin(GL_QUADS)
-    glVertex2f(x - width, y - height / 2)
-    glVertex2f(x, y - height / 2)
-    glVertex2f(x, y + height / 2)
-    glVertex2f(x - width, y + height / 2)
-    glEnd()
+    batch.color(0.6, 0.6, 0.6)
+    batch.rect(x - width, y - height / 2, x, y + height / 2)
 
-    # Calculate the slider's vertical position based on pitch_angle
-    font = pygame.font.Font(None, 24)
     spacing = (
         height / 20
     )  # Divided by 20 since there are 20 intervals (from -100 to 100 in steps of 10)
-    slider_position_y = y + (pitch_angle * spacing / 10)
-
-    # Draw slider position (centered) based on pitch_angle
-    glColor3f(1, 0, 0)  # Red color for the slider position
-    glRectf(x - width, slider_position_y - 5, x, slider_position_y + 5)
 
     # Draw static numbered indicators, with fixed range from -100 to 100
+    batch.color(1, 0, 0)
     for i in range(-100, 110, 10):  # 110 is used so 100 is included
         pos_y = y + (i * spacing / 10)
 
         # Draw the line indicator
-        glBegin(GL_LINES)
-        glVertex2f(x - width, pos_y)
-        glVertex2f(x - width + 10, pos_y)
-        glEnd()
-
-        # Draw the number
-        text_surface = font.render(str(i), True, (255, 255, 255))
-        text_data = pygame.image.tostring(text_surface, "RGBA", True)
-
-        # Enable blending for text rendering
-        glEnable(GL_BLEND)
-        glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
-
-        glRasterPos2f(
-            x - width - text_surface.get_width() - 5,
-            pos_y - text_surface.get_height() / 2,
-        )
-        glDrawPixels(
-            text_surface.get_width(),
-            text_surface.get_height(),
-            GL_RGBA,
-            GL_UNSIGNED_BYTE,
-            text_data,
-        )
+        batch.line(x - width, pos_y, x - width + 10, pos_y)
+
+        # Draw the number, skipped when the frame governor lowers quality
+        if quality.labels:
+            label_width, label_height = text_size(str(i))
+            draw_text(
+                x - width - label_width - 5,
+                pos_y - label_height / 2,
+                str(i),
+                (255, 255, 255),
+            )
 
-        # Disable blending
-        glDisable(GL_BLEND)
+
+@profiler.timed("draw_vertical_slider_value")
+def draw_vertical_slider_value(x, y, pitch_angle, width=20, height=240):
+    """
+    Draw the moving part of the vertical slider: the position marker and the
+    current pitch_angle value above the slider.
+    """
+    # Calculate the slider's vertical position based on pitch_angle
+    spacing = height / 20
+    slider_position_y = y + (pitch_angle * spacing / 10)
+
+    # Draw slider position (centered) based on pitch_angle
+    batch.color(1, 0, 0)  # Red color for the slider position
+    batch.rect(x - width, slider_position_y - 5, x, slider_position_y + 5)
 
     # Display the current pitch_angle value above the slider
     pitch_angle_str = "{:.2f}".format(pitch_angle)
@@ -458,101 +710,64 @@ def draw_vertical_slider(x, y, pitch_angle, width=20, height=240):
     else:
         text_color = (0, 255, 255)  # Blue
 
-    pitch_angle_surface = font.render(pitch_angle_str, True, text_color)
-    pitch_angle_data = pygame.image.tostring(pitch_angle_surface, "RGBA", True)
-
     # Calculate position for the text
-    text_x = (x - width - pitch_angle_surface.get_width() / 2) + 20
+    text_width, _ = text_size(pitch_angle_str)
+    text_x = (x - width - text_width / 2) + 20
     text_y = (y + height / 2) + 5
 
-    # Render the outline by drawing the text multiple times with slight offsets
-    outline_color = (0, 0, 0)  # Black for the outline
-    offsets = [(-1, -1), (-1, 1), (1, -1), (1, 1)]
-
-    glEnable(GL_BLEND)
-    glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
-
-    for offset_x, offset_y in offsets:
-        outline_surface = font.render(pitch_angle_str, True, outline_color)
-        outline_data = pygame.image.tostring(outline_surface, "RGBA", True)
-
-        glRasterPos2f(text_x + offset_x, text_y + offset_y)
-        glDrawPixels(
-            pitch_angle_surface.get_width(),
-            pitch_angle_surface.get_height(),
-            GL_RGBA,
-            GL_UNSIGNED_BYTE,
-            outline_data,
-        )
-
-    # Render the main text over the outline
-    glRasterPos2f(text_x, text_y)
-    glDrawPixels(
-        pitch_angle_surface.get_width(),
-        pitch_angle_surface.get_height(),
-        GL_RGBA,
-        GL_UNSIGNED_BYTE,
-        pitch_angle_data,
-    )
-
-    glDisable(GL_BLEND)
+    # Render the text with a black outline
+    draw_text(text_x, text_y, pitch_angle_str, text_color, outline_color=(0, 0, 0))
 
 
 def draw_horizontal_slider(x, y, pitch_angle, width=240, height=20):
     """
     Draw the horizontal pitch slider next to the artificial horizon with numbers based on pitch angle.
     """
-    # Ensure pitch_angle is clamped between -100 and 100
-    pitch_angle = max(-100, min(100, pitch_angle))
+    draw_horizontal_slider_scale(x, y, width, height)
+    draw_horizontal_slider_value(x, y, pitch_angle, width, height)
 
-    # Draw slider background
-    glColor3f(0.6, 0.6, 0.6)
-    glBegin(GL_QUADS)
-    glVertex2f(x - width / 2, y - height)
-    glVertex2f(x + width / 2, y - height)
-    glVertex2f(x + width / 2, y)
-    glVertex2f(x - width / 2, y)
-    glEnd()
-
-    # Calculate position for the red bar based on pitch_angle
-    pos_x = x + (pitch_angle * (width / 2) / 100)
 
-    # Draw slider position (centered)
-    glColor3f(1, 0, 0)  # Red color for the slider position
-    glRectf(pos_x - 5, y - height, pos_x + 5, y)
+@profiler.timed("draw_horizontal_slider_scale")
+def draw_horizontal_slider_scale(x, y, width=240, height=20):
+    """
+    Draw the static part of the horizontal slider: background and the fixed
+    -100 to 100 scale.
+    """
+    # Draw slider background
+    batch.color(0.6, 0.6, 0.6)
+    batch.rect(x - width / 2, y - height, x + width / 2, y)
 
     # Draw numbered indicators
-    font = pygame.font.Font(None, 24)
-    spacing = width / 10  # Adjust as needed for intervals of 20
-
+    batch.color(1, 0, 0)
     for i in range(-100, 120, 20):  # From -100 to 100 in steps of 20
         pos_x_indicator = x + (i * width / 200)
-        glBegin(GL_LINES)
-        glVertex2f(pos_x_indicator, y - height)
-        glVertex2f(pos_x_indicator, y - height + 10)
-        glEnd()
+        batch.line(pos_x_indicator, y - height, pos_x_indicator, y - height + 10)
+
+        if quality.labels:
+            label_width, label_height = text_size(str(i))
+            draw_text(
+                pos_x_indicator - label_width / 2,
+                y - height - label_height - 5,
+                str(i),
+                (255, 255, 255),
+            )
 
-        text_surface = font.render(str(i), True, (255, 255, 255))
-        text_data = pygame.image.tostring(text_surface, "RGBA", True)
 
-        # Enable blending
-        glEnable(GL_BLEND)
-        glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+@profiler.timed("draw_horizontal_slider_value")
+def draw_horizontal_slider_value(x, y, pitch_angle, width=240, height=20):
+    """
+    Draw the moving part of the horizontal slider: the position marker and
+    the current value above the slider.
+    """
+    # Ensure pitch_angle is clamped between -100 and 100
+    pitch_angle = max(-100, min(100, pitch_angle))
 
-        glRasterPos2f(
-            pos_x_indicator - text_surface.get_width() / 2,
-            y - height - text_surface.get_height() - 5,
-        )
-        glDrawPixels(
-            text_surface.get_width(),
-            text_surface.get_height(),
-            GL_RGBA,
-            GL_UNSIGNED_BYTE,
-            text_data,
-        )
+    # Calculate position for the red bar based on pitch_angle
+    pos_x = x + (pitch_angle * (width / 2) / 100)
 
-        # Disable blending
-        glDisable(GL_BLEND)
+    # Draw slider position (centered)
+    batch.color(1, 0, 0)  # Red color for the slider position
+    batch.rect(pos_x - 5, y - height, pos_x + 5, y)
 
     # Display the current pitch_angle value above the slider
     pitch_angle_str = "{:.2f}".format(pitch_angle)
@@ -563,41 +778,366 @@ def draw_horizontal_slider(x, y, pitch_angle, width=240, height=20):
     else:
         text_color = (0, 255, 255)  # Blue
 
-    pitch_angle_surface = font.render(pitch_angle_str, True, text_color)
-    pitch_angle_data = pygame.image.tostring(pitch_angle_surface, "RGBA", True)
-
     # Calculate position for the text (above the slider)
-    text_x = x - pitch_angle_surface.get_width() / 2
-    text_y = (y - height - pitch_angle_surface.get_height() - 10) + 75
+    text_width, text_height = text_size(pitch_angle_str)
+    text_x = x - text_width / 2
+    text_y = (y - height - text_height - 10) + 75
 
     # Render the text
-    glEnable(GL_BLEND)
-    glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
-    glRasterPos2f(text_x, text_y)
-    glDrawPixels(
-        pitch_angle_surface.get_width(),
-        pitch_angle_surface.get_height(),
-        GL_RGBA,
-        GL_UNSIGNED_BYTE,
-        pitch_angle_data,
-    )
-    glDisable(GL_BLEND)
+    draw_text(text_x, text_y, pitch_angle_str, text_color)
+
+
+@profiler.timed("draw_strip_chart_frame")
+def draw_strip_chart_frame(rect, channels):
+    """
+    Draw the static part of the strip chart: background, border, zero line
+    and the channel legend.
+    """
+    x, y, width, height = rect
+    batch.color(0.1, 0.1, 0.1, 0.8)
+    batch.rect(x, y, x + width, y + height)
+
+    batch.color(0.6, 0.6, 0.6)
+    batch.line(x, y + height / 2, x + width, y + height / 2)
+    for x0, y0, x1, y1 in (
+        (x, y, x + width, y),
+        (x + width, y, x + width, y + height),
+        (x + width, y + height, x, y + height),
+        (x, y + height, x, y),
+    ):
+        batch.line(x0, y0, x1, y1)
+
+    # Legend along the top edge, one label per channel in its line colour,
+    # wrapped into more rows when the chart is narrow
+    label_x = x + 5
+    label_y = y + height - 18
+    for channel, name in enumerate(channels):
+        label_width = text_size(name, font_size=18)[0]
+        if label_x > x + 5 and label_x + label_width > x + width:
+            label_x = x + 5
+            label_y -= 15
+        r, g, b = CHANNEL_COLORS[channel % len(CHANNEL_COLORS)]
+        render_text(label_x, label_y, name, (int(r * 255), int(g * 255), int(b * 255)))
+        label_x += label_width + 10
 
 
 def render_text(x, y, text, color):
-    glColor3f(*color)
-    glRasterPos2f(x, y)
-    for character in text:
-        glutBitmapCharacter(GLUT_BITMAP_8_BY_13, ord(character))
+    # Font size 18 matches the height of the old GLUT 8x13 bitmap font
+    draw_text(x, y, text, color, font_size=18)
+
+
+def read_input(joystick_data):
+    """
+    Return a local copy of the latest joystick data, or an empty dict when
+    the visualizer runs without a joystick process. get_data() copies under
+    the joystick lock; the dict() copy is for sources that return their own
+    dict.
+    """
+    if joystick_data is None:
+        return {}
+    return dict(joystick_data.get_data())
+
+
+class InputProcessor:
+    """
+    The input processing of the render loop, run on its ComputeWorker.
+
+    Joystick data goes into the interpolation buffer, stamped with the time
+    the joystick process published it, and the strip chart channels into a
+    queue of samples. The flight path follows the position when the input
+    has one and is dead reckoned from the attitude otherwise, in batches of
+    PATH_BATCH seconds; idle() carries it on at the held velocity while
+    the input does not change, as it is only published on change. The
+    chart itself holds GPU buffers and is fed on the render thread: every
+    state carries the samples the render loop has not acknowledged yet, so
+    none are lost when it skips states. The chart
+    channels are also kept for the whole session in the telemetry history,
+    within HISTORY_MEMORY megabytes.
+    """
+
+    def __init__(self, max_chart_samples=4096):
+        self.input_buffer = SampleBuffer(
+            [axis for axis, _ in ATTITUDE_AXES], limits=AXIS_LIMITS
+        )
+        self.chart_samples = deque(maxlen=max_chart_samples)
+        self.chart_index = 0
+        self.acknowledged = 0
+        self.path = FlightPath()
+        self.path_flushed = None
+        self.chunker = PathChunker()
+        self.index = GridIndex()
+        self.laps = LapTracker(LAP_RADIUS)
+        self.geofence = None
+        self.fence_placed = None
+        self.history = TelemetryHistory(
+            CHART_CHANNELS,
+            memory_limit=int(config.history_memory * 2**20),
+            spill_dir=config.history_spill_dir or tempfile.gettempdir(),
+        )
+
+    def initial_state(self):
+        return FrameState(
+            sequence=0,
+            data={},
+            samples=self.input_buffer.copy(),
+            chart_samples=(),
+            position=input_position({}),
+            path=self.path.snapshot(),
+            path_chunks=0,
+            path_status=None,
+            compute_ms=0.0,
+        )
+
+    def _track(self, timestamp, data):
+        path = self.path
+        if "latitude" in data and "longitude" in data:
+            path.add_positions(
+                timestamp,
+                data["latitude"],
+                data["longitude"],
+                data.get("altitude", 0.0),
+            )
+            return
+        if not all(axis in data for axis, _ in ATTITUDE_AXES):
+            return
+        roll, pitch, yaw = (data[axis] * scale for axis, scale in ATTITUDE_AXES)
+        path.push(timestamp, roll, pitch, yaw, data.get(THROTTLE_AXIS, 0.0))
+        if self.path_flushed is None or timestamp - self.path_flushed >= PATH_BATCH:
+            path.flush()
+            self.path_flushed = timestamp
+
+    def acknowledge(self, index):
+        """
+        The render loop added the chart samples up to index.
+        """
+        self.acknowledged = index
+
+    def __call__(self, data, state):
+        timestamp = data.get("timestamp", time.monotonic())
+        if all(axis in data for axis, _ in ATTITUDE_AXES):
+            self.input_buffer.push(timestamp, data)
+        if all(channel in data for channel in CHART_CHANNELS):
+            self.chart_index += 1
+            values = tuple(data[channel] for channel in CHART_CHANNELS)
+            self.chart_samples.append((self.chart_index, timestamp, values))
+            self.history.append(timestamp, values)
+        self._track(timestamp, data)
+        return self._fields(data)
+
+    def idle(self, data, state):
+        """
+        Dead reckon the path on to now while the input holds still, every
+        PATH_BATCH seconds. Returns the fields of the next state, or None
+        when the path did not move, e.g. with the stick at rest.
+        """
+        path = self.path
+        now = time.monotonic()
+        holding = (
+            len(path)
+            and path.sources[-1] == DEAD_RECKONED
+            and path.velocity.any()
+            and now - path.latest_time >= PATH_BATCH
+        )
+        if not (path.staged or holding):
+            return None
+        self.path_flushed = now
+        return self._fields(data) if path.advance(now) else None
+
+    def _fields(self, data):
+        acknowledged = self.acknowledged
+        while self.chart_samples and self.chart_samples[0][0] <= acknowledged:
+            self.chart_samples.popleft()
+        return dict(
+            data=data,
+            samples=self.input_buffer.copy(),
+            chart_samples=tuple(self.chart_samples),
+            position=input_position(data),
+            path=self.path.snapshot(),
+            path_chunks=self.chunker.update(self.path),
+            path_status=self._path_status(),
+        )
+
+    def _path_status(self):
+        positions = self.path.positions
+        if not len(positions):
+            return None
+        self.index.update(positions)
+        self.laps.update(positions)
+        current = positions[-1]
+
+        nearest = None
+        if self.laps.previous is not None:
+            nearest = self.index.nearest(current, *self.laps.previous)
+
+        # Fences given in latitude and longitude are placed once home is
+        # known
+        placed = self.path.home is not None
+        if placed != self.fence_placed:
+            self.geofence = open_geofence(self.path)
+            self.fence_placed = placed
+        fence = None
+        if self.geofence is not None:
+            fence = self.geofence.check_point(current)
+
+        return PathStatus(
+            distance=float(self.path.distance),
+            lap=self.laps.lap,
+            lap_offset=None if nearest is None else nearest[0],
+            fence=fence,
+        )
+
+
+def feed_chart(chart, state, processor, added):
+    """
+    Append the chart samples of state newer than index added to the strip
+    chart. Returns the index of the newest one.
+    """
+    for index, timestamp, values in state.chart_samples:
+        if index > added:
+            chart.append(timestamp, values)
+            added = index
+    processor.acknowledge(added)
+    return added
+
+
+def input_attitude(samples, t):
+    """
+    Roll, pitch and yaw from the joystick axes buffered in samples at time
+    t, or None before any input arrived.
+    """
+    values = samples.sample(t)
+    if values is None:
+        return None
+    return tuple(
+        float(value) * scale for value, (_, scale) in zip(values, ATTITUDE_AXES)
+    )
+
+
+def input_position(data):
+    """
+    (latitude, longitude) from the input data when a telemetry source
+    publishes them, otherwise the map centre from the config.
+    """
+    if "latitude" in data and "longitude" in data:
+        return (data["latitude"], data["longitude"])
+    return config.map_center
+
+
+def open_map_underlay():
+    """
+    The map underlay for the MAP_TILES file, or None when it is not set or
+    does not exist.
+    """
+    if not config.map_tiles:
+        return None
+    if not os.path.exists(config.map_tiles):
+        print(DEBUG + f"Map tiles {config.map_tiles} not found, map disabled")
+        return None
+    return MapUnderlay(config.map_tiles, config.map_zoom, config.map_cache)
+
+
+def open_video_underlay():
+    """
+    The video underlay for VIDEO_SOURCE, or None when it is not set or does
+    not exist.
+    """
+    if not config.video_source:
+        return None
+    if not os.path.exists(config.video_source):
+        print(DEBUG + f"Video {config.video_source} not found, video disabled")
+        return None
+    return VideoUnderlay(config.video_source, config.video_fps)
+
+
+def open_geofence(path):
+    """
+    The geofence from the config for path: a cylinder of GEOFENCE_RADIUS
+    around home and the GEOFENCE_POLYGON, both up to GEOFENCE_CEILING. The
+    polygon is left out while home is unknown. None when neither is set.
+    """
+    fences = []
+    if config.geofence_radius > 0:
+        fences.append(
+            CylinderFence(
+                (0.0, 0.0), config.geofence_radius, ceiling=config.geofence_ceiling
+            )
+        )
+    if len(config.geofence_polygon) >= 3 and path.home is not None:
+        latitudes, longitudes = np.array(config.geofence_polygon).T
+        vertices = path.local(latitudes, longitudes, path.home[2])[:, :2]
+        fences.append(PolygonFence(vertices, ceiling=config.geofence_ceiling))
+    return Geofence(fences) if fences else None
 
 
-def status_text(renderer, textures, clock, connection=None):
+def wait_for_input(joystick_data, timeout):
+    """
+    Block until the joystick process publishes new data or timeout seconds
+    pass.
+    """
+    if joystick_data is None:
+        time.sleep(timeout)
+    else:
+        joystick_data.wait_for_update(timeout)
+
+
+def set_quality(level, renderer):
+    """
+    Apply a frame governor quality level to the drawing functions and the
+    retained HUD.
+    """
+    global quality
+    labels_changed = level.labels != quality.labels
+    quality = level
+    renderer.set_scale(level.scale)
+    if labels_changed:
+        renderer.invalidate()
+
+
+def resize(resolution, viewport, renderer, render_target, captures=()):
+    """
+    Apply a new window size. The layout for it is computed once and cached,
+    the viewport, HUD, render target and frame captures follow it.
+    """
+    resolution = tuple(resolution)
+    if resolution == tuple(config.resolution) or 0 in resolution:
+        return
+    print(DEBUG + f"Window resized to {resolution[0]}x{resolution[1]}")
+    config.resolution = resolution
+    viewport.resize(resolution)
+    renderer.resize(resolution)
+    render_target.resize(resolution)
+    for capture in captures:
+        capture.resize(resolution)
+
+
+def profile_overlay(rows, top):
+    """
+    Overlay entries for the frame profiler rows, one line per stage below
+    top. Columns are placed separately since the font is proportional.
+    """
+    entries = [(10, top, "Stage", (255, 255, 0))]
+    for column, percentile in enumerate(PERCENTILES):
+        entries.append((260 + 70 * column, top, f"p{percentile} ms", (255, 255, 0)))
+    for row, (name, values) in enumerate(rows, start=1):
+        y = top - 15 * row
+        entries.append((10, y, name, (255, 255, 255)))
+        for column, value in enumerate(values):
+            entries.append((260 + 70 * column, y, f"{value:.2f}", (255, 255, 255)))
+    return entries
+
+
+def status_entries(layout, path_status=None):
+    """
+    Text entries of the connection status block, followed by the flight
+    path figures when there is a path_status.
+    """
+
     def status_color(status):
         if status == "ERROR":
             return (255, 0, 0)  # Red
         return (0, 255, 0)  # Green
 
-    Status_X_Pos = int(0.35 * config.resolution[1]) + 37
+    Status_X_Pos = layout.status_y
     text_entries = [
         (10, Status_X_Pos - 0, "Launcher Connection:", (255, 255, 255)),
         (
@@ -613,74 +1153,477 @@ def status_text(renderer, textures, clock, connection=None):
         (10, Status_X_Pos - 45, "       Drone Connection:", (255, 255, 255)),
         (300, Status_X_Pos - 45, "OK", status_color("OK")),
     ]
+    if path_status is not None:
+        text_entries += path_entries(path_status, Status_X_Pos - 60)
+    return text_entries
 
-    text_entries.append(
-        (10, config.resolution[1] - 20, f"FPS: {clock.get_fps():.2f}", (0, 255, 0))
-    )
-    renderer.render(text_entries, textures)
 
+def path_entries(path_status, top):
+    """
+    Text entries of the flight path figures, from top down. Rounded, so the
+    cached status block is not redrawn for every small change.
+    """
+    white = (255, 255, 255)
+    green = (0, 255, 0)
+    distance = path_status.distance
+    if distance < 10000:
+        distance_text = f"{distance:.0f} m"
+    else:
+        distance_text = f"{distance / 1000:.1f} km"
+    entries = [
+        (10, top, "   Distance Flown:", white),
+        (300, top, distance_text, green),
+        (10, top - 15, f"   Lap {path_status.lap}, Previous Lap:", white),
+    ]
+    if path_status.lap_offset is None:
+        entries.append((300, top - 15, "-", white))
+    else:
+        entries.append((300, top - 15, f"{path_status.lap_offset:.1f} m", green))
+    if path_status.fence is not None:
+        allowed, margin = path_status.fence
+        # Metres to the fence, negative outside
+        entries += [
+            (10, top - 30, "   Geofence Margin:", white),
+            (300, top - 30, f"{margin:+.0f} m", green if allowed else (255, 0, 0)),
+        ]
+    return entries
+
+
+def status_text(
+    renderer,
+    textures,
+    clock,
+    connection=None,
+    governor=None,
+    profile_rows=(),
+    attitude=None,
+    capture=None,
+    compute=None,
+    path_status=None,
+):
+    text_entries = status_entries(renderer.layout, path_status)
 
-def main(configuration=None, joystick_data=None):
-    
-    print(DEBUG + "Starting Visualizer")
-    pygame.init()
-    pygame.display.set_icon(pygame.image.load("assets/Visualizer_Icon.png"))
+    fps_text = f"FPS: {clock.get_fps():.2f}"
+    if governor is not None:
+        fps_text += (
+            f"  Scale: {governor.quality.scale:.2f}"
+            f"  Frame: {governor.frame_ms:.1f}/{governor.budget_ms:.1f} ms"
+        )
+    if compute is not None:
+        fps_text += f"  Compute: {compute.compute_ms:.2f} ms @ {compute.rate:.0f} Hz"
+        if compute.errors:
+            fps_text += f" ({compute.errors} errors)"
+    if capture is not None:
+        fps_text += f"  REC: {capture.captured} frames, {capture.dropped} dropped"
+    fps_x, fps_y = renderer.layout.fps_position
+    overlay = [(fps_x, fps_y, fps_text, (0, 255, 0))]
+    if profile_rows:
+        overlay += profile_overlay(profile_rows, fps_y - 20)
+    renderer.render(text_entries, textures, overlay=overlay, attitude=attitude)
+
+
+class OffscreenHud:
+    """
+    Renders HUD states into image arrays, without a window.
 
-    if configuration is not None:
-        config = configuration
-    else:
-        config = Config()
+    Needs a current GL context; see render_recordings.py for one without a
+    display. The atlas, glyph textures and cached HUD layers are reused
+    from frame to frame, so only the value-bound widgets are redrawn.
+    """
 
-    display = config.resolution
+    def __init__(self, resolution=(1920, 1200)):
+        self.resolution = tuple(resolution)
+        # The drawing functions read the module config
+        config.resolution = self.resolution
+        self.textures = load_atlas(HUD_ASSETS)
+        self.viewport = OpenGLViewport(self.resolution, DroneModel(DRONE_MODEL))
+        self.renderer = TextRenderer(self.resolution)
+        self.target = FramebufferLayer(*self.resolution)
+
+    @property
+    def chart(self):
+        return self.renderer.chart
+
+    @chart.setter
+    def chart(self, chart):
+        # Owned by the caller, who releases it
+        self.renderer.chart = chart
+
+    def render(self, attitude, label="", now=None):
+        """
+        Render the HUD at attitude (roll, pitch, yaw in degrees) with label
+        in place of the FPS line. Returns a (height, width, 3) uint8 array,
+        top row first. now is passed on to the strip chart, if one is set.
+        """
+        width, height = self.resolution
+        glBindFramebuffer(GL_FRAMEBUFFER, self.target.fbo)
+        glViewport(0, 0, width, height)
+        glClearColor(0, 0, 0, 1)
+        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT | GL_STENCIL_BUFFER_BIT)
 
-    pygame.display.gl_set_attribute(
-        pygame.GL_STENCIL_SIZE, 8
-    )  # Requesting 8-bit stencil buffer
+        self.viewport.render(attitude)
+        layout = self.renderer.layout
+        fps_x, fps_y = layout.fps_position
+        self.renderer.render(
+            status_entries(layout),
+            self.textures,
+            overlay=[(fps_x, fps_y, label, (0, 255, 0))] if label else (),
+            attitude=attitude,
+            now=now,
+        )
 
+        glPixelStorei(GL_PACK_ALIGNMENT, 1)
+        pixels = glReadPixels(0, 0, width, height, GL_RGB, GL_UNSIGNED_BYTE)
+        glBindFramebuffer(GL_FRAMEBUFFER, 0)
+        image = np.frombuffer(pixels, dtype=np.uint8).reshape(height, width, 3)
+        return image[::-1].copy()
+
+    def release(self):
+        self.renderer.release()
+        self.viewport.model.release()
+        self.target.delete()
+        release_atlas(self.textures)
+
+
+def open_window(resolution):
     if config.fullscreen:
         pygame.display.set_mode(
-            display,
+            resolution,
             DOUBLEBUF | OPENGL | FULLSCREEN | pygame.OPENGLBLIT | pygame.DOUBLEBUF,
         )
     else:
         pygame.display.set_mode(
-            display, DOUBLEBUF | OPENGL | pygame.OPENGLBLIT | pygame.DOUBLEBUF
+            resolution,
+            DOUBLEBUF | OPENGL | RESIZABLE | pygame.OPENGLBLIT | pygame.DOUBLEBUF,
         )
-    pygame.font.init()
 
-    # Load textures from the assets folder
-    textures = {
-        "Frame": load_texture("assets/Frame.png"),
-        "Interior": load_texture("assets/Interior.png"),
-        "Ring": load_texture("assets/Ring.png"),
-    }
 
-    opengl_viewport = OpenGLViewport(display)
+def stop_requested(event):
+    return event is not None and event.is_set()
+
+
+def render_loop(
+    joystick_data=None,
+    stop_event=None,
+    restart_event=None,
+    benchmark=None,
+    stream=None,
+):
+    """
+    Run the render loop until the window is closed or a stop or restart is
+    requested. Returns True for a restart.
+
+    With a stream (an MjpegStream), frames are published to it at
+    config.stream_fps.
+
+    With a benchmark (see benchmark.py) the loop renders as fast as it can,
+    takes the attitude from benchmark.attitude(), waits for the GPU after
+    every frame and ends when benchmark.done is set.
+
+    GPU resources are acquired through the resource manager and released
+    when the loop ends. Cached ones like the HUD atlas stay alive, so a
+    restarted loop reuses them without uploading again.
+    """
+    display = config.resolution
+
+    # Load the HUD images from the assets folder into one atlas texture
+    textures = load_atlas(HUD_ASSETS)
+
+    # The mesh was parsed or read from the cache here, at startup; frames
+    # only draw its vertex buffer
+    map_underlay = open_map_underlay()
+    # Path chunks are cut and simplified on the compute worker, the render
+    # loop only uploads them
+    processor = InputProcessor()
+    path_renderer = PathRenderer(processor.chunker)
+    opengl_viewport = OpenGLViewport(
+        display, DroneModel(DRONE_MODEL), map_underlay, path_renderer
+    )
     text_renderer = TextRenderer(display)
+    # The FPV feed is decoded on its own thread, frames are shown as they
+    # arrive; benchmarks render without it
+    video_underlay = None
+    if benchmark is None:
+        video_underlay = open_video_underlay()
 
     # Create a Clock object to limit and measure the frame rate
     clock = pygame.time.Clock()
     target_fps = config.fps
 
+    # Drop render quality when frames overrun the budget of the target FPS
+    governor = FrameGovernor(1000 / target_fps)
+    render_target = ScaledRenderTarget(display)
+    set_quality(governor.quality, text_renderer)
+
+    # In idle mode the HUD is only redrawn when input changed, a window event
+    # needs it, or the heartbeat interval has passed
+    idle_mode = config.idle_mode and benchmark is None
+    heartbeat = config.idle_heartbeat
+    last_draw = 0.0
+    needs_redraw = True
+
+    # Input is processed on a compute thread. Each frame takes the newest
+    # state it published; its samples are interpolated at the time the
+    # frame is presented, so uneven input rates do not cause judder
+    compute = ComputeWorker(
+        processor.initial_state(),
+        lambda: read_input(joystick_data),
+        lambda timeout: wait_for_input(joystick_data, timeout),
+        processor,
+        processor.idle,
+    )
+    state = compute.state
+    chart = StripChart(
+        CHART_CHANNELS, window=config.chart_window, start_time=time.monotonic()
+    )
+    chart_added = 0
+    text_renderer.chart = chart
+
+    # Timings of every frame stage, shown in an overlay and written out when
+    # the loop ends
+    profiler.enabled = config.profile
+    profile_rows = ()
+
+    # Frames are read back asynchronously and encoded on worker threads
+    capture = None
+    if config.capture and benchmark is None:
+        encoder, output = open_encoder(
+            config.capture_output, config.capture_format, display, target_fps
+        )
+        capture = FrameCapture(display, encoder)
+        print(DEBUG + f"Capturing frames to {output}")
+    # The stream has its own rate, frames in between are not read back
+    stream_capture = None
+    if stream is not None:
+        stream_capture = FrameCapture(display, stream, output=stream.resolution)
+        stream_interval = 1 / config.stream_fps
+        last_stream = 0.0
+    captures = [c for c in (capture, stream_capture) if c is not None]
+
     running = True
-    opengl_viewport.render()
+    restart = False
     while running:
+        if idle_mode and not needs_redraw:
+            # Wake up at least every IDLE_POLL seconds to service window events
+            remaining = heartbeat - (time.monotonic() - last_draw)
+            compute.wait(state.sequence, max(0.0, min(remaining, IDLE_POLL)))
+
+        profiler.begin_frame()
+        with profiler.stage("events"):
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    running = False
+                elif event.type == pygame.VIDEORESIZE:
+                    resize(
+                        event.size,
+                        opengl_viewport,
+                        text_renderer,
+                        render_target,
+                        captures,
+                    )
+                    needs_redraw = True
+                elif event.type in REDRAW_EVENTS:
+                    needs_redraw = True
+
+        if stop_requested(stop_event) or (benchmark is not None and benchmark.done):
+            running = False
+        elif stop_requested(restart_event):
+            restart_event.clear()
+            running = False
+            restart = True
+        if not running:
+            break
+
+        with profiler.stage("input"):
+            latest = compute.state
+            if latest is not state:
+                state = latest
+                chart_added = feed_chart(chart, state, processor, chart_added)
+                needs_redraw = True
+        # Interpolated values keep moving for a while after the last sample
+        if state.samples.settling(time.monotonic() - INPUT_DELAY):
+            needs_redraw = True
+        if time.monotonic() - last_draw >= heartbeat:
+            needs_redraw = True
+        # Map tiles arrive from the loader thread a few per frame
+        if map_underlay is not None and map_underlay.loading:
+            needs_redraw = True
+        if video_underlay is not None and video_underlay.pending:
+            needs_redraw = True
+        # Pass on read back frames as soon as they arrive, also while idle
+        for frame_capture in captures:
+            frame_capture.poll()
+
+        if idle_mode and not needs_redraw:
+            continue
+
+        governor.begin_frame()
+        # The frame shows up after it is rendered, estimated from the
+        # smoothed render time, with the input INPUT_DELAY late
+        if benchmark is not None:
+            attitude = benchmark.attitude()
+        else:
+            presented = time.monotonic() + governor.frame_ms / 1000 - INPUT_DELAY
+            attitude = input_attitude(state.samples, presented)
         glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT | GL_STENCIL_BUFFER_BIT)
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                running = False
 
-        status_text(text_renderer, textures, clock)
+        if config.adaptive_quality:
+            render_target.begin(governor.quality.scale)
+        if video_underlay is not None:
+            with profiler.stage("video"):
+                video_underlay.draw(config.resolution)
+        with profiler.stage("scene"):
+            path_renderer.update(state.path, state.path_chunks)
+            opengl_viewport.render(attitude, state.position)
+        status_text(
+            text_renderer,
+            textures,
+            clock,
+            governor=governor,
+            profile_rows=profile_rows,
+            attitude=attitude,
+            capture=capture,
+            compute=compute,
+            path_status=state.path_status,
+        )
+        with profiler.stage("render_target"):
+            render_target.end()
+        if capture is not None:
+            with profiler.stage("capture"):
+                capture.capture()
+        if stream_capture is not None and time.monotonic() >= last_stream + (
+            stream_interval
+        ):
+            last_stream = time.monotonic()
+            with profiler.stage("stream"):
+                stream_capture.capture()
+
+        with profiler.stage("flip"):
+            pygame.display.flip()
+        if benchmark is not None:
+            # Count the GPU work in the frame it was submitted in
+            with profiler.stage("finish"):
+                glFinish()
+        last_draw = time.monotonic()
+        needs_redraw = False
+
+        profiler.end_frame()
+        if benchmark is not None:
+            benchmark.frame_done()
+        elif profiler.enabled and profiler.frame_count % PROFILE_OVERLAY_INTERVAL == 0:
+            profile_rows = profiler.overlay_rows()
+
+        if governor.end_frame() and config.adaptive_quality:
+            print(DEBUG + f"Render quality changed to {governor.quality}")
+            set_quality(governor.quality, text_renderer)
+
+        # Limit the frame rate, benchmarks run unthrottled
+        if benchmark is None:
+            clock.tick(target_fps)
+        else:
+            clock.tick()
+
+    if profiler.enabled and config.profile_output:
+        try:
+            profiler.dump(config.profile_output)
+        except OSError as e:
+            print(DEBUG + f"Could not write frame profile: {e}")
+
+    compute.stop()
+    print(DEBUG + "Compute: " + compute.report())
+    print(DEBUG + "History: " + processor.history.report())
+    processor.history.close()
+
+    if capture is not None:
+        capture.close()
+        print(DEBUG + "Capture finished, " + capture.report())
+    if stream_capture is not None:
+        stream_capture.close()
+        print(DEBUG + "Stream frames: " + stream_capture.report())
+
+    text_renderer.release()
+    chart.release()
+    opengl_viewport.model.release()
+    path_renderer.release()
+    if map_underlay is not None:
+        map_underlay.release()
+    if video_underlay is not None:
+        video_underlay.release()
+        print(DEBUG + "Video: " + video_underlay.report())
+    render_target.release()
+    release_atlas(textures)
+    return restart
+
+
+def main(
+    configuration=None,
+    joystick_data=None,
+    stop_event=None,
+    restart_event=None,
+    benchmark=None,
+    stream=None,
+):
+    """
+    Run the visualizer. Setting stop_event shuts it down cleanly, setting
+    restart_event restarts the render loop with the settings from the config
+    file while keeping the window and the cached GPU resources. benchmark
+    runs a headless benchmark instead, see benchmark.py.
+
+    stream True or False overrides STREAM from the config: publish the HUD
+    as an MJPEG stream on a local HTTP server. The server keeps running
+    across restarts, so viewers stay connected.
+    """
+    # The drawing functions read the module config, resizing updates it
+    global config
 
-        pygame.display.flip()
+    print(DEBUG + "Starting Visualizer")
+    pygame.init()
+    pygame.display.set_icon(pygame.image.load("assets/Visualizer_Icon.png"))
 
-        # Limit the frame rate
-        clock.tick(target_fps)
-        
-        print(joystick_data)
-        joystick_data.get_data()
-        
-        
+    if configuration is not None:
+        config = configuration
+    else:
+        config = Config()
+
+    pygame.display.gl_set_attribute(
+        pygame.GL_STENCIL_SIZE, 8
+    )  # Requesting 8-bit stencil buffer
+
+    open_window(config.resolution)
+    pygame.font.init()
+
+    if stream is None:
+        stream = config.stream and benchmark is None
+    mjpeg_stream = None
+    if stream:
+        try:
+            mjpeg_stream = MjpegStream(
+                config.stream_host,
+                config.stream_port,
+                config.stream_resolution,
+                config.stream_quality,
+            )
+        except OSError as e:
+            print(DEBUG + f"Could not start the stream server: {e}")
+
+    try:
+        while render_loop(
+            joystick_data, stop_event, restart_event, benchmark, mjpeg_stream
+        ):
+            mode = (tuple(config.resolution), config.fullscreen)
+            config = Config()
+            print(DEBUG + "Restarting render loop, " + resources.report())
+            if (tuple(config.resolution), config.fullscreen) != mode:
+                # Changing the mode keeps the GL context and its resources
+                open_window(config.resolution)
+    finally:
+        if mjpeg_stream is not None:
+            mjpeg_stream.shutdown()
+        release_text_atlases()
+        release_horizon_shader()
+        print(DEBUG + "Releasing GPU resources, " + resources.report())
+        resources.shutdown()
+        pygame.quit()
 
 
 if __name__ == "__main__":